@@ -13,4 +13,18 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported after django is setup.
+from app_notifications.streams import notification_stream  # noqa: E402
+
+# long lived streams are served without the django request cycle.
+streams = {
+    "/api/v1/notifications/stream": notification_stream,
+}
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] in streams:
+        return await streams[scope["path"]](scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,482 @@
+from collections import OrderedDict
+from importlib import import_module
+from threading import Lock
+from typing import Dict, List, Tuple
+import hashlib
+import pickle
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from app.core.metrics import register_metrics
+from app.core.plans import get_query_plan
+from utils.helpers import log
+
+
+_local_caches = {}
+_local_stats = {}
+_local_journals = {}
+_local_locks = {}
+
+JOURNAL_SEQ_KEY = "tiered:journal:seq"
+JOURNAL_KEY = "tiered:journal:{}"
+JOURNAL_CLEAR = "__clear__"
+# shared caches whose `incr` is not atomic, journal sequences would collide.
+NON_ATOMIC_CACHES = (DatabaseCache, DummyCache, FileBasedCache)
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with TTL, shared by all threads of a worker.
+    """
+
+    def __init__(self, max_entries: int, stats: dict) -> None:
+        self._data = OrderedDict()
+        self._max_entries = max_entries
+        self._stats = stats
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+        return True, pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(BaseCache):
+    """
+    Two level cache, an in-process LRU (L1) in front of a shared cache (L2)
+    such as Redis or Memcached.
+
+    Writes go to both levels and are broadcasted to other workers through
+    a journal stored in L2, every worker replays the journal at most once per
+    `SYNC_INTERVAL` seconds and evicts changed keys from its L1. `LOCAL_TIMEOUT`
+    bounds how long L1 can serve a value without looking at L2, the expiry of
+    each value is kept next to it in L2 so L1 never outlives it.
+
+    The journal needs an atomic `incr` of L2, e.g. Redis or Memcached. Over
+    other caches (e.g. FileBasedCache) it has to be turned off with `JOURNAL`,
+    changes are then seen by other workers once their L1 entries expire, so
+    `LOCAL_TIMEOUT` is the bound of staleness.
+
+    `OPTIONS`:
+        SHARED:[str] - alias of the L2 cache, defaults to `shared`.
+        MAX_ENTRIES:[int] - maximum entries of L1.
+        LOCAL_TIMEOUT:[int] - maximum seconds a value lives in L1.
+        SYNC_INTERVAL:[float] - seconds between journal syncs.
+        JOURNAL_TIMEOUT:[int] - seconds a journal entry lives in L2.
+        JOURNAL:[bool] - broadcast changes through the journal, defaults to True.
+    """
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._name = name
+        self._shared_alias = options.get("SHARED", "shared")
+        self._local_timeout = int(options.get("LOCAL_TIMEOUT", 30))
+        self._sync_interval = float(options.get("SYNC_INTERVAL", 1))
+        self._journal_timeout = int(options.get("JOURNAL_TIMEOUT", 5 * 60))
+        self._journal = bool(options.get("JOURNAL", True))
+        self._stats = _local_stats.setdefault(
+            name,
+            dict(
+                local_hits=0,
+                local_misses=0,
+                shared_hits=0,
+                shared_misses=0,
+                evictions=0,
+                invalidations=0,
+                journal_seq=None,
+                synced_at=0.0,
+            ),
+        )
+        self._local = _local_caches.setdefault(
+            name, LocalCache(self._max_entries, self._stats)
+        )
+        # journal entries written by this worker, skipped while syncing.
+        self._own_journal = _local_journals.setdefault(name, set())
+        self._sync_lock = _local_locks.setdefault(name, Lock())
+        if self._journal and isinstance(self.shared, NON_ATOMIC_CACHES):
+            raise ImproperlyConfigured(
+                f"Journal of TieredCache `{name}` needs a shared cache with an "
+                f"atomic `incr`, `{type(self.shared).__name__}` isn't one, "
+                "set `JOURNAL` to False."
+            )
+        register_metrics(f"cache.{name}", self.get_stats)
+
+    @property
+    def shared(self) -> BaseCache:
+        return caches[self._shared_alias]
+
+    def get_stats(self) -> dict:
+        stats = {
+            k: v
+            for k, v in self._stats.items()
+            if k not in ("synced_at", "journal_seq")
+        }
+        stats["local_entries"] = len(self._local)
+        return stats
+
+    def _local_ttl(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def _shared_timeout(self, timeout):
+        return self.default_timeout if timeout == DEFAULT_TIMEOUT else timeout
+
+    def _expiry_key(self, key) -> str:
+        return f"{key}:expires"
+
+    def _expiry(self, timeout) -> float:
+        """
+        Wall clock expiry of a shared value, `0` if it never expires.
+        """
+        return 0 if timeout is None else time.time() + timeout
+
+    def _remaining_ttl(self, expires_at):
+        """
+        L1 timeout of a value read from L2, capped at its remaining L2 timeout.
+        """
+        if not expires_at:
+            # never expires, or written before expiries were kept.
+            return self._local_timeout
+        return min(self._local_timeout, expires_at - time.time())
+
+    def _set_local(self, key, value, timeout):
+        if timeout is None or timeout > 0:
+            self._local.set(key, value, timeout)
+
+    def _broadcast(self, key):
+        """
+        Append the changed key to the journal so other workers evict it.
+        """
+        if not self._journal:
+            return
+        try:
+            try:
+                seq = self.shared.incr(JOURNAL_SEQ_KEY)
+            except ValueError:
+                self.shared.add(JOURNAL_SEQ_KEY, 0, None)
+                seq = self.shared.incr(JOURNAL_SEQ_KEY)
+            self.shared.set(JOURNAL_KEY.format(seq), key, self._journal_timeout)
+            self._own_journal.add(seq)
+        except Exception as e:
+            log(f"TieredCache broadcast failed: {e}")
+
+    def _sync(self):
+        """
+        Replay the journal entries written by other workers since last sync.
+        """
+        if not self._journal:
+            return
+        now = time.monotonic()
+        if now - self._stats["synced_at"] < self._sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._stats["synced_at"] = now
+            seq = self.shared.get(JOURNAL_SEQ_KEY, 0)
+            seen = self._stats["journal_seq"]
+            self._stats["journal_seq"] = seq
+            if seen is None:
+                self._own_journal.clear()
+                return
+            if seq == seen:
+                return
+            journal_keys = []
+            for i in range(seen + 1, seq + 1):
+                if i in self._own_journal:
+                    self._own_journal.discard(i)
+                else:
+                    journal_keys.append(JOURNAL_KEY.format(i))
+            changed = self.shared.get_many(journal_keys) if journal_keys else {}
+            if (
+                seq < seen
+                or len(changed) < len(journal_keys)
+                or JOURNAL_CLEAR in changed.values()
+            ):
+                # journal is incomplete or expired, start over.
+                self._local.clear()
+                self._stats["invalidations"] += 1
+                return
+            for key in changed.values():
+                if self._local.delete(key):
+                    self._stats["invalidations"] += 1
+        except Exception as e:
+            log(f"TieredCache sync failed: {e}")
+        finally:
+            self._sync_lock.release()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shared_timeout = self._shared_timeout(timeout)
+        added = self.shared.add(key, value, shared_timeout)
+        if added:
+            self.shared.set(
+                self._expiry_key(key), self._expiry(shared_timeout), shared_timeout
+            )
+            self._local.set(key, value, self._local_ttl(timeout))
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        hit, value = self._local.get(key)
+        if hit:
+            self._stats["local_hits"] += 1
+            return value
+        self._stats["local_misses"] += 1
+        found = self.shared.get_many([key, self._expiry_key(key)])
+        if key not in found:
+            self._stats["shared_misses"] += 1
+            return default
+        self._stats["shared_hits"] += 1
+        value = found[key]
+        self._set_local(
+            key, value, self._remaining_ttl(found.get(self._expiry_key(key)))
+        )
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        made_keys = {self.make_and_validate_key(k, version=version): k for k in keys}
+        data, missing = {}, []
+        for key, original in made_keys.items():
+            hit, value = self._local.get(key)
+            if hit:
+                self._stats["local_hits"] += 1
+                data[original] = value
+            else:
+                self._stats["local_misses"] += 1
+                missing.append(key)
+        if missing:
+            found = self.shared.get_many(
+                missing + [self._expiry_key(key) for key in missing]
+            )
+            for key in missing:
+                if key not in found:
+                    self._stats["shared_misses"] += 1
+                    continue
+                self._stats["shared_hits"] += 1
+                value = found[key]
+                self._set_local(
+                    key, value, self._remaining_ttl(found.get(self._expiry_key(key)))
+                )
+                data[made_keys[key]] = value
+        return data
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shared_timeout = self._shared_timeout(timeout)
+        self.shared.set_many(
+            {key: value, self._expiry_key(key): self._expiry(shared_timeout)},
+            shared_timeout,
+        )
+        self._local.set(key, value, self._local_ttl(timeout))
+        self._broadcast(key)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        shared_timeout = self._shared_timeout(timeout)
+        touched = self.shared.touch(key, shared_timeout)
+        if touched:
+            self.shared.set(
+                self._expiry_key(key), self._expiry(shared_timeout), shared_timeout
+            )
+        return touched
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._local.delete(key)
+        deleted = self.shared.delete(key)
+        self.shared.delete(self._expiry_key(key))
+        self._broadcast(key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        hit, _ = self._local.get(key)
+        return hit or self.shared.has_key(key)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        value = self.shared.incr(key, delta)
+        self._local.delete(key)
+        self._broadcast(key)
+        return value
+
+    def clear(self):
+        self.shared.clear()
+        self._local.clear()
+        # journal is wiped with the shared cache, so it is followed from scratch.
+        self._own_journal.clear()
+        self._stats["journal_seq"] = None
+        self._broadcast(JOURNAL_CLEAR)
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class CacheRegistry:
+    """
+    Ties cached views to the models they read. A generation is kept per model
+    in the cache and bumped whenever the model changes, the generations are
+    part of the cache key of a view so its cached pages can live long and are
+    still never served stale.
+    """
+
+    generation_key = "cachegen:{}"
+
+    def __init__(self) -> None:
+        self._views = {}
+        self._models = set()
+        self._discovered = False
+
+    def _resolve_models(self, view_class) -> Tuple[str]:
+        model = view_class.model
+        labels = [model._meta.concrete_model._meta.label]
+        paths = [*view_class.related_fields, *view_class.related_many_fields]
+        serializer_class = getattr(view_class, "serializer_view_class", None)
+        if serializer_class is not None:
+            # relations inferred from the serializer, see `app.core.plans`.
+            plan = get_query_plan(serializer_class)
+            paths += plan["select_related"] + plan["prefetch_related"]
+        for path in paths:
+            current = model
+            for part in path.split("__"):
+                current = current._meta.get_field(part).related_model
+                labels.append(current._meta.concrete_model._meta.label)
+        return tuple(dict.fromkeys(labels))
+
+    def register(self, view_class):
+        """
+        Register a view class which has `model` attribute.
+        """
+        try:
+            labels = self._resolve_models(view_class)
+        except Exception as e:
+            log(f"CacheRegistry can't register `{view_class.__name__}`: {e}")
+            return
+        self._views[view_class] = labels
+        self._models.update(labels)
+
+    def discover(self):
+        """
+        Load the URLconf once so every cached view is registered, even in
+        processes (jobs, workers) which never serve a request.
+        """
+        if self._discovered:
+            return
+        self._discovered = True
+        try:
+            import_module(settings.ROOT_URLCONF)
+        except Exception as e:
+            log(f"CacheRegistry discovery failed: {e}")
+
+    def get_models(self, view_class) -> Tuple[str]:
+        return self._views.get(view_class, ())
+
+    def is_registered(self, label: str) -> bool:
+        self.discover()
+        return label in self._models
+
+    def get_generations(self, labels) -> Dict[str, str]:
+        keys = {self.generation_key.format(label): label for label in labels}
+        generations = cache.get_many(keys.keys())
+        for key in keys.keys() - generations.keys():
+            # a lost generation must never fall back to an old value.
+            cache.add(key, uuid.uuid4().hex, None)
+            generations[key] = cache.get(key)
+        return {keys[key]: value for key, value in generations.items()}
+
+    def get_key_prefix(self, view_class) -> str:
+        generations = self.get_generations(self.get_models(view_class))
+        return "{}:{}".format(
+            view_class.__name__,
+            hashlib.md5(
+                repr(sorted(generations.items())).encode(), usedforsecurity=False
+            ).hexdigest(),
+        )
+
+    def bump(self, *labels: str):
+        """
+        Bump generations of the given models, so their cached pages expire.
+        """
+        for label in labels:
+            cache.set(self.generation_key.format(label), uuid.uuid4().hex, None)
+
+    def purge(self, labels) -> List[str]:
+        """
+        Purge by surrogate keys (model labels), unknown keys are ignored.
+        """
+        self.discover()
+        labels = [label for label in labels if label in self._models]
+        self.bump(*labels)
+        return labels
+
+
+cache_registry = CacheRegistry()
+
+
+def _model_label(model) -> str:
+    return model._meta.concrete_model._meta.label
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_model_generation(sender, **kwargs):
+    label = _model_label(sender)
+    if cache_registry.is_registered(label):
+        cache_registry.bump(label)
+
+
+@receiver(m2m_changed)
+def bump_m2m_generation(sender, instance, action, model, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    labels = [
+        label
+        for label in (_model_label(type(instance)), _model_label(model))
+        if cache_registry.is_registered(label)
+    ]
+    cache_registry.bump(*labels)
@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import QuerySet
+from typing import Tuple, Union
+import hashlib
+import json
+
+from utils.helpers import log
+
+
+EXACT = "exact"
+CACHED = "cached"
+ESTIMATE = "estimate"
+CAPPED = "capped"
+
+
+def exact_count(queryset: QuerySet) -> int:
+    """
+    `Description`:
+        Used to count the rows with `COUNT(*)`.
+    """
+    return queryset.count()
+
+
+def cached_count(queryset: QuerySet, timeout: int = settings.CACHE_FOR_1MIN) -> int:
+    """
+    `Description`:
+        Used to count the rows with `COUNT(*)` and cache it for a short time,
+        key is the normalized SQL of the queryset (filters without ordering).
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = "count:{}".format(
+        hashlib.md5(
+            "{}:{}:{!r}".format(queryset.db, sql, params).encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+    )
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def reltuples_count(queryset: QuerySet) -> Union[int, None]:
+    """
+    `Description`:
+        Used to estimate the rows of an unfiltered queryset from
+        `pg_class.reltuples`, which is constant time.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql" or queryset.query.where:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 for a table which has never been analyzed.
+    return int(row[0]) if row and row[0] >= 0 else None
+
+
+def planner_count(queryset: QuerySet) -> Union[int, None]:
+    """
+    `Description`:
+        Used to estimate the rows with the query planner (`EXPLAIN`),
+        unfiltered querysets are estimated from `pg_class.reltuples`.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return None
+    if not queryset.query.where:
+        return reltuples_count(queryset)
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def capped_count(queryset: QuerySet, cap: int = 10000) -> int:
+    """
+    `Description`:
+        Used to count the rows up to `cap`, database stops scanning as soon
+        as `cap + 1` rows are found.
+    """
+    return queryset.order_by()[: cap + 1].count()
+
+
+def get_count(
+    queryset: QuerySet,
+    strategy: str = EXACT,
+    cap: int = 10000,
+    timeout: int = settings.CACHE_FOR_1MIN,
+) -> Tuple[int, str]:
+    """
+    `Description`:
+        Used to count the rows of a queryset with the given strategy.
+    `Arguments`:
+        queryset:[QuerySet]
+        strategy:[str] - one of `exact`, `cached`, `estimate` or `capped`.
+        cap:[int] - maximum rows counted by `capped` strategy.
+        timeout:[int] - seconds a count is cached by `cached` strategy.
+    `Returns`:
+        count:[int] - number of rows, in case of `capped` at most `cap`.
+        strategy:[str] - strategy which is actually used, `estimate` falls back
+            to `exact` and `capped` is reported only when the cap is reached.
+    """
+    if strategy == CACHED:
+        return cached_count(queryset, timeout), CACHED
+    if strategy == ESTIMATE:
+        try:
+            count = planner_count(queryset)
+            if count is not None:
+                return count, ESTIMATE
+        except Exception as e:
+            log(str(e))
+    if strategy == CAPPED:
+        count = capped_count(queryset, cap)
+        if count > cap:
+            return cap, CAPPED
+        return count, EXACT
+    return exact_count(queryset), EXACT
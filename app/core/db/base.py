@@ -0,0 +1,245 @@
+"""
+PostgreSQL backend with connection health checks and an optional in-process
+connection pool, use it with `ENGINE = "app.core.db"`.
+
+`DATABASES` keys:
+    CONN_HEALTH_CHECKS:[bool] - check a persistent connection is usable before
+        it is reused by a new request.
+    POOL:[dict|None] - enables the pool, `CONN_MAX_AGE` should be 0 so
+        connections are returned to the pool at the end of each request.
+        MIN_SIZE:[int] - idle connections which are never closed as idle.
+        MAX_SIZE:[int] - maximum open connections.
+        TIMEOUT:[float] - seconds to wait for a free connection.
+        MAX_IDLE:[float] - seconds after which an idle connection is closed.
+        CHECK_AFTER:[float] - seconds of idleness after which a connection is
+            checked with `SELECT 1` before it is handed out.
+"""
+from collections import deque
+from threading import BoundedSemaphore, Lock
+import time
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from app.core.metrics import register_metrics
+from utils.helpers import log
+
+
+_pools = {}
+_pools_lock = Lock()
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections, blocks up to `timeout` seconds
+    when all connections are in use.
+    """
+
+    def __init__(
+        self,
+        alias: str,
+        max_size: int = 10,
+        min_size: int = 0,
+        timeout: float = 10,
+        max_idle: float = 10 * 60,
+        check_after: float = 30,
+    ) -> None:
+        self.alias = alias
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self._idle = deque()
+        self._slots = BoundedSemaphore(max_size)
+        self._lock = Lock()
+        self._in_use = 0
+        self._stats = dict(
+            requests=0,
+            waits=0,
+            wait_time_total=0.0,
+            wait_time_max=0.0,
+            timeouts=0,
+            opened=0,
+            closed=0,
+        )
+
+    def _close(self, connection):
+        self._stats["closed"] += 1
+        try:
+            connection.close()
+        except Exception as e:
+            log(f"ConnectionPool[{self.alias}] close failed: {e}")
+
+    def _is_usable(self, connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, connect):
+        """
+        Hand out an idle connection or open a new one with `connect`.
+        """
+        started_at = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            self._stats["timeouts"] += 1
+            raise PoolTimeout(
+                f"ConnectionPool[{self.alias}] timed out after {self.timeout} secs."
+            )
+        waited = time.monotonic() - started_at
+        self._stats["requests"] += 1
+        self._stats["wait_time_total"] += waited
+        self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+        if waited > 0.001:
+            self._stats["waits"] += 1
+
+        try:
+            connection = None
+            while connection is None:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    connection, released_at = self._idle.pop()
+                idle_for = time.monotonic() - released_at
+                if connection.closed or (
+                    idle_for > self.check_after and not self._is_usable(connection)
+                ):
+                    self._close(connection)
+                    connection = None
+            if connection is None:
+                connection = connect()
+                self._stats["opened"] += 1
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+        return connection
+
+    def putconn(self, connection, discard: bool = False):
+        """
+        Take back a connection, it is closed if `discard` or it is broken.
+        """
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if not discard and not connection.closed:
+                status = connection.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+        except Exception:
+            discard = True
+
+        if discard or connection.closed:
+            self._close(connection)
+        else:
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+        self._slots.release()
+        self._prune()
+
+    def _prune(self):
+        """
+        Close connections which are idle for longer than `max_idle`.
+        """
+        expired = []
+        now = time.monotonic()
+        with self._lock:
+            # oldest connections are on the left side.
+            while (
+                len(self._idle) > self.min_size
+                and now - self._idle[0][1] > self.max_idle
+            ):
+                expired.append(self._idle.popleft()[0])
+        for connection in expired:
+            self._close(connection)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_use, idle = self._in_use, len(self._idle)
+        return dict(
+            max_size=self.max_size,
+            size=in_use + idle,
+            in_use=in_use,
+            idle=idle,
+            **self._stats,
+        )
+
+
+def get_pool(alias: str, options: dict) -> ConnectionPool:
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                alias,
+                max_size=int(options.get("MAX_SIZE", 10)),
+                min_size=int(options.get("MIN_SIZE", 0)),
+                timeout=float(options.get("TIMEOUT", 10)),
+                max_idle=float(options.get("MAX_IDLE", 10 * 60)),
+                check_after=float(options.get("CHECK_AFTER", 30)),
+            )
+            register_metrics(f"db.{alias}", _pools[alias].stats)
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get("POOL")
+        if not options:
+            return None
+        return get_pool(self.alias, options)
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        connection = pool.getconn(
+            lambda: super(DatabaseWrapper, self).get_new_connection(conn_params)
+        )
+        if "isolation_level" not in self.settings_dict["OPTIONS"]:
+            self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # a connection closed inside an atomic block stays referenced by this
+        # wrapper, so it is discarded instead of being handed out again.
+        pool.putconn(
+            self.connection,
+            discard=self.in_atomic_block or self.errors_occurred,
+        )
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        # persistent connection is checked again before it is used by the
+        # next request.
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.settings_dict.get("CONN_HEALTH_CHECKS")
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            if not self.is_usable():
+                log(f"Database connection [{self.alias}] is unusable, reconnecting.")
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
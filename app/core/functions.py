@@ -1,12 +1,10 @@
 from django.db import connection, IntegrityError, transaction
 from django.conf import settings
 from django.core import mail
-from django.template.loader import render_to_string
 from types import FunctionType
-from typing import Any, Tuple, Union, Dict, List
-from asgiref.sync import async_to_sync, sync_to_async
-import asyncio
+from typing import Any, Iterable, Tuple, Union, Dict, List
 
+from app.core.mails import MailComposer
 from app_accounts.authentication import SafeJWTAuthentication
 
 from utils.helpers import log
@@ -88,25 +86,22 @@ def call_store_proc(sp_name: str, values: Union[List[Any], Tuple[Any]]):
     return results
 
 
-@async_to_sync
-async def send_mails_async(emails):
-    def send_mails(emails):
-        connection = mail.get_connection()
-        # Manually open the connection
-        connection.open()
-        try:
-            # Send all emails in a single call
-            connection.send_messages(emails)
-        except Exception as e:
-            log(str(e))
-        # The connection was already open so send_messages() doesn't close it.
-        # We need to manually close the connection.
-        connection.close()
-
-    if not emails or not settings.EMAIL_ENABLE:
+def queue_mails(emails: Iterable[mail.EmailMessage]):
+    """
+    `Description`:
+        Used to queue emails in outbox, those are delivered by
+        `send_queued_mails` command so request never waits on SMTP.
+    `Arguments`:
+        emails:[Iterable[EmailMessage]] - emails, consumed lazily.
+    `Returns`:
+        None
+    """
+    from app_notifications.models import EmailOutbox
+
+    if not settings.EMAIL_ENABLE:
         return
 
-    asyncio.create_task(sync_to_async(send_mails)(emails))
+    EmailOutbox.objects.enqueue(emails)
 
 
 def call_send_mail(
@@ -117,69 +112,55 @@ def call_send_mail(
     template: str = None,
     template_kwargs: Union[Dict[str, Any], List[Dict[str, Any]]] = {},
     send: bool = True,
-) -> List[mail.EmailMultiAlternatives]:
+    bcc: bool = False,
+) -> Union[List[mail.EmailMultiAlternatives], None]:
     """
     `Description`:
-        Send Emails Asynchronously
+        Send Emails through the outbox queue
     `Arguments`:
         subject:[str] - subject of email.
         from_:[dict] - email *from*.
         to_:[list|tuple] - email *to*, can be one or multiple.
         body:[str] - message to write in body of email.
         template:[str|None] - email template.
-        template_kwargs:[dict] - email template arguments.
+        template_kwargs:[dict|list] - email template arguments, one per recipient if list.
+        send:[bool] - if False, emails are only returned, not queued.
+        bcc:[bool] - send identical emails to recipients as BCC.
     `Returns`:
-        None
+        emails:[list|None] - list of EmailMultiAlternatives if not `send`.
     """
+    recipients = [*to_, *filter(None, settings.EMAILS_DEFAULT)]
+    composer = MailComposer(subject, from_, body=body, template=template, bcc=bcc)
+    emails = composer.compose(recipients, template_kwargs)
 
-    to_ += settings.EMAILS_DEFAULT
-
-    # Construct an emails for each recipient
-    emails = []
-    for i, recipient in enumerate(to_):
-        email = mail.EmailMultiAlternatives(
-            subject,
-            body,
-            from_,
-            [recipient],
-        )
-        if template:
-            html_content = render_to_string(
-                template,
-                template_kwargs
-                if isinstance(template_kwargs, dict)
-                else template_kwargs[i if i < len(template_kwargs) else 0],
-            )
-            email.attach_alternative(html_content, "text/html")
-        emails.append(email)
-
-    if send:
-        # send emails asynchronously
-        send_mails_async(emails)
-    return emails
+    if not send:
+        return list(emails)
+    # streamed to the outbox in batches, delivered later by the outbox worker
+    queue_mails(emails)
 
 
-def call_send_notification(type, payload, text, recipients: list, with_bulk=True):
+def call_send_notification(
+    type, payload, text, recipients: list, with_bulk=True, key: str = None
+):
     """
     `Description`:
-        Send Notifications Synchronously
-        TODO: update this method to handle Asynchronously
+        Send Notifications Asynchronously, the fan-out is queued and done by
+        `dispatch_notifications` command.
     `Arguments`:
         type:[str] - NotificationTypes enum.
         payload:[dict] - payload to send with notification.
         text:[str] - message to write in notification.
-        recipients:[list] - list of recipients email.
+        recipients:[list|dict] - list of recipient ids or lookups of users,
+            see `NotificationDispatchManager.enqueue`.
+        key:[str|None] - idempotency key, same key is never dispatched twice.
     `Returns`:
-        None
+        dispatch:[NotificationDispatch]
     """
-    from app_notifications.handlers import NotificationHandler
-
-    def send_notification(handler: NotificationHandler):
-        handler.send(with_bulk=with_bulk)
+    from app_notifications.models import NotificationDispatch
 
-    handler = NotificationHandler(type, payload, text)
-    handler.add_recipients_list(recipients)
-    send_notification(handler)
+    return NotificationDispatch.objects.enqueue(
+        type, payload, text, recipients, with_bulk=with_bulk, key=key
+    )
 
 
 def authenticate_token(token: str):
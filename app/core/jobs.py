@@ -1,8 +1,10 @@
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Tuple, Union
 from types import FunctionType
+from django.db import connection, transaction
 from django.db.models import QuerySet
 from django_extensions.management import jobs
 from datetime import datetime, timedelta
+import time
 
 from utils.helpers import log, not_naive_datetime
 
@@ -45,21 +47,77 @@ class AppJob(jobs.BaseJob):
         )
         return job_result
 
-    def records_with_log(self, records: QuerySet):
+    def records_with_log(
+        self,
+        records: QuerySet,
+        action: str = "found",
+        count: int = None,
+        size: int = None,
+    ):
         """
-        Log the number of records.
+        Log the number of records, and the bytes they took if known.
         """
-        records_len = 0
-        if records:
-            records_len = len(records)
+        records_len = count
+        if records_len is None:
+            records_len = len(records) if records else 0
         log(
-            "{} Records were found from {} model.".format(
-                records_len, records.model.__name__
+            "{} Records were {} from {} model{}.".format(
+                records_len,
+                action,
+                records.model.__name__,
+                f" ({size} bytes)" if size is not None else "",
             ),
             "info",
         )
         return records
 
+    def records_size(self, records: QuerySet) -> Union[int, None]:
+        """
+        Size of the records in bytes, only known on PostgreSQL.
+        """
+        if connection.vendor != "postgresql":
+            return None
+        table = records.model._meta.db_table
+        sql, params = records.values("pk").order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COALESCE(SUM(pg_column_size(t.*)), 0) FROM {table} t "
+                f"WHERE t.{records.model._meta.pk.column} IN ({sql})",
+                params,
+            )
+            return cursor.fetchone()[0]
+
+    def delete_in_batches(
+        self,
+        records: QuerySet,
+        batch_size: int = 1000,
+        sleep: float = 0,
+        before_delete: FunctionType = None,
+    ) -> Tuple[int, Union[int, None]]:
+        """
+        Delete the records batch by batch, each batch in its own transaction
+        followed by a pause, so locks are short and replicas can keep up.
+        `before_delete` is called with the queryset of each batch.
+        Returns the number of deleted records and their bytes.
+        """
+        deleted, size = 0, None
+        while True:
+            pks = list(records.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                break
+            batch = records.model._default_manager.filter(pk__in=pks)
+            with transaction.atomic():
+                batch_size_bytes = self.records_size(batch)
+                if batch_size_bytes is not None:
+                    size = (size or 0) + batch_size_bytes
+                if callable(before_delete):
+                    before_delete(batch)
+                deleted += batch.delete()[0]
+            if sleep:
+                time.sleep(sleep)
+        self.records_with_log(records, "deleted", deleted, size)
+        return deleted, size
+
     def execute(self):
         """
         Executing the job.
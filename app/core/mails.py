@@ -0,0 +1,118 @@
+from django.core import mail
+from django.db import models
+from django.template.loader import get_template
+from typing import Any, Dict, Iterator, List, Tuple, Union
+import json
+
+
+class MailComposer:
+    """
+    Composes the emails of a mass mailing, template is compiled once and
+    rendered once per distinct context instead of once per recipient.
+    """
+
+    bcc_batch_size = 50
+
+    def __init__(
+        self,
+        subject: str,
+        from_: str,
+        body: str = "",
+        template: str = None,
+        bcc: bool = False,
+    ) -> None:
+        self._subject = subject
+        self._from = from_
+        self._body = body
+        self._template = get_template(template) if template else None
+        self._bcc = bcc
+        self.renders = 0
+
+    @classmethod
+    def key_value(cls, value: Any) -> Any:
+        """
+        JSON-native copy of a context value, model instances are keyed by
+        `label:pk`, raises `TypeError` for anything else.
+        """
+        if value is None or type(value) in (str, bool, int, float):
+            return value
+        if type(value) is list:
+            return [cls.key_value(item) for item in value]
+        if type(value) is dict and all(type(key) is str for key in value):
+            return {key: cls.key_value(item) for key, item in value.items()}
+        if isinstance(value, models.Model) and value.pk is not None:
+            return {"__model__": "{}:{}".format(value._meta.label, value.pk)}
+        raise TypeError(f"{type(value).__name__} can't be part of a context key.")
+
+    @classmethod
+    def context_key(cls, context: Dict[str, Any]) -> Union[str, None]:
+        """
+        Key of identical contexts, `None` if the context can't be compared.
+        """
+        try:
+            return json.dumps(cls.key_value(context), sort_keys=True)
+        except TypeError:
+            return None
+
+    def render(self, context: Dict[str, Any]) -> Union[str, None]:
+        if self._template is None:
+            return None
+        self.renders += 1
+        return self._template.render(context)
+
+    def group(
+        self,
+        to_: Union[List[str], Tuple[str]],
+        template_kwargs: Union[Dict[str, Any], List[Dict[str, Any]]] = {},
+    ) -> List[Tuple[Dict[str, Any], List[str]]]:
+        """
+        `Description`:
+            Used to group the recipients by their template context, a list of
+            contexts is matched by position and falls back to the first one.
+            Recipients of a context which has no key are never grouped.
+        `Returns`:
+            groups:[list] - list of (context, recipients) in recipients order.
+        """
+        groups = {}
+        for i, recipient in enumerate(to_):
+            if isinstance(template_kwargs, dict):
+                context = template_kwargs
+            else:
+                context = template_kwargs[i if i < len(template_kwargs) else 0]
+            key = self.context_key(context)
+            if key is None:
+                key = (i,)
+            groups.setdefault(key, (context, []))[1].append(recipient)
+        return list(groups.values())
+
+    def compose(
+        self,
+        to_: Union[List[str], Tuple[str]],
+        template_kwargs: Union[Dict[str, Any], List[Dict[str, Any]]] = {},
+    ) -> Iterator[mail.EmailMultiAlternatives]:
+        """
+        `Description`:
+            Used to lazily build the emails, one per recipient or one per
+            `bcc_batch_size` recipients when BCC fan-out is enabled.
+        `Arguments`:
+            to_:[list|tuple] - email *to*, can be one or multiple.
+            template_kwargs:[dict|list] - email template arguments.
+        `Returns`:
+            emails:[Iterator[EmailMultiAlternatives]]
+        """
+        for context, recipients in self.group(to_, template_kwargs):
+            html_content = self.render(context)
+            if self._bcc:
+                batches = [
+                    dict(to=[], bcc=recipients[i : i + self.bcc_batch_size])
+                    for i in range(0, len(recipients), self.bcc_batch_size)
+                ]
+            else:
+                batches = [dict(to=[recipient]) for recipient in recipients]
+            for batch in batches:
+                email = mail.EmailMultiAlternatives(
+                    self._subject, self._body, self._from, **batch
+                )
+                if html_content is not None:
+                    email.attach_alternative(html_content, "text/html")
+                yield email
@@ -0,0 +1,37 @@
+from types import FunctionType
+from typing import Any, Dict
+
+from utils.helpers import call_func
+
+
+_providers: Dict[str, FunctionType] = {}
+
+
+def register_metrics(name: str, provider: FunctionType = None):
+    """
+    `Description`:
+        Used to register a metrics provider, can be used as a decorator.
+    `Arguments`:
+        name:[str] - name under which metrics are reported.
+        provider:[FunctionType] - method which returns the metrics.
+    `Returns`:
+        provider:[FunctionType]
+    """
+
+    def inner(func: FunctionType):
+        _providers[name] = func
+        return func
+
+    if provider is not None:
+        return inner(provider)
+    return inner
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """
+    `Description`:
+        Used to collect the metrics of all registered providers.
+    `Returns`:
+        metrics:[dict] - metrics by provider name.
+    """
+    return {name: call_func(provider) for name, provider in _providers.items()}
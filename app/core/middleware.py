@@ -0,0 +1,145 @@
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+import random
+import re
+
+from app.core.metrics import register_metrics
+from utils.helpers import log
+
+
+_placeholders = re.compile(r"%s(, %s)+")
+
+stats = dict(sampled=0, exceeded=0, duplicated=0)
+register_metrics("db.queries", lambda: dict(stats))
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """
+    `execute_wrapper` which counts the queries per SQL shape.
+    """
+
+    def __init__(self) -> None:
+        self.queries = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries[sql] += 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self) -> int:
+        return sum(self.queries.values())
+
+    def duplicates(self) -> Counter:
+        """
+        `Returns`:
+            shapes:[Counter] - times of each SQL shape which ran more than once,
+            `IN` lists of any length are the same shape.
+        """
+        shapes = Counter()
+        for sql, count in self.queries.items():
+            shapes[_placeholders.sub("%s", sql)] += count
+        return Counter({sql: count for sql, count in shapes.items() if count > 1})
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+
+def get_view_budget(view_class) -> dict:
+    """
+    `Description`:
+        Used to get the query budget of a view, `query_budget` is the max
+        number of queries and `duplicate_query_budget` the max number of runs
+        of one SQL shape, settings are used if the view doesn't set them.
+    `Arguments`:
+        view_class:[APIView] - class of view.
+    `Returns`:
+        budget:[dict] - `queries` and `duplicates`, `None` is unlimited.
+    """
+    queries = getattr(view_class, "query_budget", None)
+    duplicates = getattr(view_class, "duplicate_query_budget", None)
+    return dict(
+        queries=settings.QUERY_BUDGET if queries is None else queries,
+        duplicates=(
+            settings.QUERY_BUDGET_DUPLICATES if duplicates is None else duplicates
+        ),
+    )
+
+
+def check_budget(name: str, budget: dict, counter: QueryCounter):
+    """
+    `Description`:
+        Used to log, or raise `QueryBudgetExceeded` if `QUERY_BUDGET_MODE` is
+        `raise`, when the queries of a request exceed the budget.
+    `Arguments`:
+        name:[str] - name of view.
+        budget:[dict] - budget of `get_view_budget`.
+        counter:[QueryCounter] - queries of the request.
+    `Returns`:
+        None
+    """
+    errors = []
+    if budget["queries"] and counter.count > budget["queries"]:
+        stats["exceeded"] += 1
+        errors.append(f"{counter.count} queries, budget is {budget['queries']}")
+    if budget["duplicates"]:
+        for sql, count in counter.duplicates().items():
+            if count > budget["duplicates"]:
+                stats["duplicated"] += 1
+                errors.append(f"{count} times `{sql}`")
+    if not errors:
+        return
+    message = f"Query budget of {name} exceeded: " + "; ".join(errors)
+    if settings.QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    log(message, "warn")
+
+
+class QueryBudgetMiddleware:
+    """
+    Counts the queries of `QUERY_BUDGET_SAMPLE_RATE` of the requests, without
+    `DEBUG`, and reports the ones which exceed the budget of their view or
+    run the same SQL shape too many times (N+1).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.QUERY_BUDGET_MODE == "off" or (
+            random.random() >= settings.QUERY_BUDGET_SAMPLE_RATE
+        ):
+            return self.get_response(request)
+
+        stats["sampled"] += 1
+        counter = QueryCounter()
+        with counter.record():
+            response = self.get_response(request)
+        view_class = getattr(request, "_query_budget_view", None)
+        if view_class is None:
+            return response
+        if response.streaming:
+            # rows of streaming responses are read while being sent.
+            response.streaming_content = self._stream(
+                response.streaming_content, view_class, counter
+            )
+            return response
+        check_budget(view_class.__name__, get_view_budget(view_class), counter)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget_view = getattr(view_func, "view_class", None)
+
+    def _stream(self, content, view_class, counter):
+        with counter.record():
+            yield from content
+        check_budget(view_class.__name__, get_view_budget(view_class), counter)
@@ -0,0 +1,27 @@
+from app.core.metrics import register_metrics
+from utils.helpers import log
+
+
+stats = dict(deferred_loads=0)
+register_metrics("db.projection", lambda: dict(stats))
+
+
+class ProjectionMixin:
+    """
+    Mixin of models which are loaded with `only()`/`defer()`, a deferred
+    field read later costs one query per field, which is logged so the
+    projection (see `app.core.plans`) can be fixed.
+    """
+
+    def refresh_from_db(self, using=None, fields=None):
+        if fields is not None:
+            loaded = self.get_deferred_fields().intersection(fields)
+            if loaded:
+                stats["deferred_loads"] += 1
+                log(
+                    "Deferred field(s) {} of {} [{}] loaded from database.".format(
+                        ", ".join(sorted(loaded)), type(self).__name__, self.pk
+                    ),
+                    "warn",
+                )
+        return super().refresh_from_db(using=using, fields=fields)
@@ -0,0 +1,28 @@
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently as PostgresAddIndexConcurrently,
+)
+from django.db.migrations import AddIndex
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    """
+    Builds the index with `CREATE INDEX CONCURRENTLY` on PostgreSQL, so writes
+    to the table are never blocked, and as a plain `AddIndex` on other
+    databases (e.g. sqlite of tests). Only used in non-atomic migrations.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state
+            )
+        return super().database_backwards(
+            app_label, schema_editor, from_state, to_state
+        )
@@ -1,5 +1,52 @@
-from rest_framework.pagination import PageNumberPagination
-from .response import APIResponse
+from django.conf import settings
+from django.core import signing
+from django.core.paginator import (
+    EmptyPage,
+    InvalidPage,
+    Page,
+    PageNotAnInteger,
+    Paginator as DjangoPaginator,
+)
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from .counting import EXACT, get_count
+from .response import APIResponse, StreamingAPIResponse
+
+
+CURSOR_SALT = "app.core.pagination.cursor"
+
+
+def encode_cursor(position: list, reverse: bool = False) -> str:
+    """
+    `Description`:
+        Used to encode the position of a row into an opaque signed cursor.
+    `Arguments`:
+        position:[list] - values of ordering fields.
+        reverse:[bool] - True if cursor points backwards.
+    `Returns`:
+        cursor:[str]
+    """
+    return signing.dumps({"p": position, "r": reverse}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    `Description`:
+        Used to decode a signed cursor, raises `NotFound` if it is tampered.
+    `Arguments`:
+        cursor:[str]
+    `Returns`:
+        cursor:[dict] - `p` position and `r` reverse.
+    """
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        assert isinstance(data.get("p"), list)
+        return data
+    except Exception:
+        raise NotFound("Invalid cursor.")
 
 
 class StandardPagination(PageNumberPagination):
@@ -8,14 +55,365 @@ class StandardPagination(PageNumberPagination):
     max_page_size = 1000
 
 
-class Pagination(StandardPagination):
+class UncountedPage(Page):
+    """
+    Page whose next page is known from the rows read, not from the count.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next: bool):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CountingPaginator(DjangoPaginator):
+    """
+    Django paginator which counts the rows with a counting strategy. Unless
+    the count is exact, it is only reported, pages are never validated
+    against it and the next page is looked up by reading one more row.
+    """
+
+    def __init__(self, *args, count_strategy=EXACT, count_cap=10000, **kwargs):
+        self.count_strategy = count_strategy
+        self.count_cap = count_cap
+        super().__init__(*args, **kwargs)
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        count, self.count_strategy = get_count(
+            self.object_list, self.count_strategy, self.count_cap
+        )
+        return count
+
+    @property
+    def is_counted(self) -> bool:
+        # strategy is resolved by counting, e.g. `capped` below the cap is exact.
+        self.count
+        return self.count_strategy == EXACT or not isinstance(
+            self.object_list, QuerySet
+        )
+
+    def validate_number(self, number):
+        if self.is_counted:
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger("That page number is not an integer")
+        if number < 1:
+            raise EmptyPage("That page number is less than 1")
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.is_counted:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage("That page contains no results")
+        return UncountedPage(
+            rows[: self.per_page], number, self, len(rows) > self.per_page
+        )
+
+
+class CountStrategyMixin:
+    """
+    Counting strategy is taken from the view (`count_strategy`, `count_cap`)
+    and falls back to the pagination defaults.
+    """
+
+    count_strategy = EXACT
+    count_cap = settings.PAGINATION_COUNT_CAP
+
+    def set_count_strategy(self, view):
+        self.count_strategy = (
+            getattr(view, "count_strategy", None) or self.count_strategy
+        )
+        self.count_cap = getattr(view, "count_cap", None) or self.count_cap
+
+
+class Pagination(CountStrategyMixin, StandardPagination):
+    def django_paginator_class(self, queryset, page_size):
+        return CountingPaginator(
+            queryset,
+            page_size,
+            count_strategy=self.count_strategy,
+            count_cap=self.count_cap,
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.set_count_strategy(view)
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def paginate_queryset_lazy(self, queryset, request, view=None):
+        """
+        Same as `paginate_queryset` but rows of the page are returned as an
+        unevaluated queryset, used to stream the response. Unless the count is
+        exact, the rows are already read to know if there is a next page.
+        """
+        self.set_count_strategy(view)
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(
+                self.invalid_page_message.format(
+                    page_number=page_number, message=str(exc)
+                )
+            )
+        self.request = request
+        return self.page.object_list
+
+    def get_envelope(self, other_data={}):
+        return {
+            "count": self.page.paginator.count,
+            "count_strategy": self.page.paginator.count_strategy,
+            "next": self.page.has_next(),
+            "previous": self.page.has_previous(),
+            **other_data,
+        }
+
     def get_paginated_response(self, data, other_data={}):
-        return APIResponse(
-            payload=data,
-            other_data={
-                "count": self.page.paginator.count,
-                "next": self.page.has_next(),
-                "previous": self.page.has_previous(),
-                **other_data,
+        return APIResponse(payload=data, other_data=self.get_envelope(other_data))
+
+    def get_streaming_response(self, rows, serializer_class, other_data={}, **kwargs):
+        return StreamingAPIResponse(
+            rows, serializer_class, other_data=self.get_envelope(other_data), **kwargs
+        )
+
+
+class CursorPagination(CountStrategyMixin, BasePagination):
+    """
+    Keyset pagination on the model `Meta.ordering` with primary key as the
+    tie-breaker, rows are located by `WHERE` instead of `OFFSET` and no
+    `COUNT(*)` is run unless the view sets `count_strategy`, so deep pages
+    cost the same as the first one.
+    """
+
+    page_size = 100
+    page_size_query_param = "size"
+    max_page_size = 1000
+    cursor_query_param = "cursor"
+    # defaults to the model `Meta.ordering`.
+    ordering = None
+    # count is skipped unless the view asks for a counting strategy.
+    count_strategy = None
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, queryset: QuerySet):
+        ordering = [
+            field
+            for field in (
+                self.ordering
+                or queryset.query.order_by
+                or queryset.model._meta.ordering
+            )
+            if isinstance(field, str)
+        ]
+        pk_name = queryset.model._meta.pk.name
+        if not any(field.lstrip("-") in (pk_name, "pk") for field in ordering):
+            descending = bool(ordering) and ordering[0].startswith("-")
+            ordering.append(f"-{pk_name}" if descending else pk_name)
+        return ordering
+
+    def _get_field(self, name: str):
+        name = name.lstrip("-")
+        if name == "pk":
+            return self._model._meta.pk
+        return self._model._meta.get_field(name)
+
+    def _get_position(self, obj) -> list:
+        return [self._get_field(field).value_to_string(obj) for field in self._ordering]
+
+    def _get_filter(self, ordering, position) -> Q:
+        """
+        Rows after the position, e.g. for (-created_at, -id):
+        created_at < x OR (created_at = x AND id < y)
+        """
+        if len(position) != len(ordering):
+            raise NotFound("Invalid cursor.")
+        values = [
+            self._get_field(field).to_python(value)
+            for field, value in zip(ordering, position)
+        ]
+        filters = Q()
+        for i, field in enumerate(ordering):
+            lookup = "lt" if field.startswith("-") else "gt"
+            condition = Q(**{f"{field.lstrip('-')}__{lookup}": values[i]})
+            for prev_field, prev_value in zip(ordering[:i], values[:i]):
+                condition &= Q(**{prev_field.lstrip("-"): prev_value})
+            filters |= condition
+        return filters
+
+    def _prepare(self, queryset, request, view=None):
+        """
+        Order and filter the queryset from the cursor, returns the queryset
+        and if the page is read backwards.
+        """
+        self.request = request
+        self._model = queryset.model
+        self._ordering = self.get_ordering(queryset)
+        self.set_count_strategy(view)
+        self.count = None
+        if self.count_strategy:
+            self.count, self.count_strategy = get_count(
+                queryset, self.count_strategy, self.count_cap
+            )
+        page_size = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        cursor = decode_cursor(cursor) if cursor else None
+        reverse = bool(cursor and cursor["r"])
+        ordering = self._ordering
+        if reverse:
+            ordering = [
+                field[1:] if field.startswith("-") else f"-{field}"
+                for field in ordering
+            ]
+
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            queryset = queryset.filter(self._get_filter(ordering, cursor["p"]))
+        self._page_size = page_size
+        self._cursor = cursor
+        return queryset, reverse
+
+    def _set_page(self, rows, has_more, reverse):
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else self._cursor is not None
+        self.page = rows
+
+    def _read_page(self, queryset, reverse):
+        rows = list(queryset[: self._page_size + 1])
+        has_more = len(rows) > self._page_size
+        rows = rows[: self._page_size]
+        if reverse:
+            rows.reverse()
+        self._set_page(rows, has_more, reverse)
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self._read_page(*self._prepare(queryset, request, view))
+
+    def paginate_queryset_lazy(self, queryset, request, view=None):
+        """
+        Same as `paginate_queryset` but rows are yielded while they are read,
+        links are known once the page is consumed. Backward pages are read in
+        reverse order, so they are loaded as a list.
+        """
+        lookups = queryset._prefetch_related_lookups
+        queryset, reverse = self._prepare(queryset, request, view)
+        if reverse:
+            return self._read_page(queryset, reverse)
+
+        def rows():
+            first, last, count = None, None, 0
+            for row in queryset[: self._page_size + 1].iterator(
+                chunk_size=min(self._page_size + 1, 1000)
+            ):
+                count += 1
+                if count > self._page_size:
+                    break
+                first, last = first or row, row
+                yield row
+            self._set_page(
+                [row for row in (first, last) if row], count > self._page_size, False
+            )
+
+        self._prefetch_lookups = lookups
+        return rows()
+
+    def get_envelope(self, other_data={}):
+        return {
+            "count": self.count,
+            "count_strategy": self.count_strategy,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            **other_data,
+        }
+
+    def get_streaming_response(self, rows, serializer_class, other_data={}, **kwargs):
+        # links depend on the last row, so they follow `data`.
+        head = {
+            "count": self.count,
+            "count_strategy": self.count_strategy,
+            **other_data,
+        }
+        kwargs.setdefault("prefetch_lookups", getattr(self, "_prefetch_lookups", None))
+        return StreamingAPIResponse(
+            rows,
+            serializer_class,
+            other_data=head,
+            trailer=lambda: {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
             },
+            **kwargs,
         )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encode_cursor(self._get_position(self.page[-1])),
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            encode_cursor(self._get_position(self.page[0]), reverse=True),
+        )
+
+    def get_paginated_response(self, data, other_data={}):
+        return APIResponse(payload=data, other_data=self.get_envelope(other_data))
+
+
+def get_paginator(view):
+    """
+    `Description`:
+        Used to get the paginator of a view, cursor pagination is used when
+        the view has `cursor_pagination_class` and request asks for it with
+        `?cursor=` or `?pagination=cursor`.
+    `Arguments`:
+        view:[APIView]
+    `Returns`:
+        paginator:[BasePagination|None]
+    """
+    pagination_class = view.pagination_class
+    cursor_pagination_class = getattr(view, "cursor_pagination_class", None)
+    request = getattr(view, "request", None)
+    if cursor_pagination_class and request is not None:
+        params = getattr(request, "query_params", request.GET)
+        if (
+            cursor_pagination_class.cursor_query_param in params
+            or params.get("pagination") == "cursor"
+        ):
+            pagination_class = cursor_pagination_class
+    return pagination_class() if pagination_class else None
@@ -0,0 +1,192 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from rest_framework import serializers
+from typing import Dict, List, Union
+
+from utils.helpers import log
+
+
+_plans: Dict[type, dict] = {}
+
+
+def _depends_on(model, attr: str) -> Union[List[str], None]:
+    """
+    Fields declared by `depends_on` of a model property.
+    """
+    value = getattr(model, attr, None)
+    if isinstance(value, property):
+        return getattr(value.fget, "depends_on", None)
+    return None
+
+
+class QueryPlanner:
+    """
+    Works out the relations and columns which a serializer reads, nested
+    serializers are walked with their source paths.
+    """
+
+    def __init__(self) -> None:
+        self.select_related: List[str] = []
+        self.prefetch_related: List[str] = []
+        # `None` if any field reads something which is not declared.
+        self.only: Union[List[str], None] = []
+
+    def add(self, lookups: list, lookup: str):
+        if lookups is not None and lookup not in lookups:
+            lookups.append(lookup)
+
+    def add_columns(self, model, path: str, names):
+        for name in names:
+            self.add(self.only, path + (model._meta.pk.name if name == "pk" else name))
+
+    def walk(self, serializer, path: str = ""):
+        model = serializer.Meta.model
+        self.add_columns(model, path, ["pk"])
+        for field in serializer._readable_fields:
+            if isinstance(field, serializers.SerializerMethodField):
+                method = getattr(type(serializer), field.method_name)
+                sources = getattr(method, "depends_on", None)
+                if sources is None:
+                    self.only = None
+                else:
+                    self.add_columns(model, path, sources)
+            elif field.source == "*":
+                self.only = None
+            else:
+                self.walk_source(model, path, field)
+
+    def walk_source(self, model, path: str, field):
+        attrs = field.source_attrs
+        for i, attr in enumerate(attrs):
+            last = i == len(attrs) - 1
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                sources = _depends_on(model, attr) if last else None
+                if sources is None:
+                    self.only = None
+                else:
+                    self.add_columns(model, path, sources)
+                return
+
+            if not model_field.is_relation:
+                if last:
+                    self.add_columns(model, path, [attr])
+                else:
+                    self.only = None
+                return
+
+            lookup = path + attr
+            if model_field.many_to_many or model_field.one_to_many:
+                self.add(self.prefetch_related, lookup)
+                child = getattr(field, "child", None)
+                if last and isinstance(child, serializers.ModelSerializer):
+                    # relations of the prefetched rows are prefetched as well.
+                    planner = QueryPlanner()
+                    planner.walk(child)
+                    for related in planner.select_related + planner.prefetch_related:
+                        self.add(self.prefetch_related, f"{lookup}__{related}")
+                elif not last:
+                    self.only = None
+                return
+
+            if model_field.concrete:
+                # the foreign key column.
+                self.add(self.only, lookup)
+            if last and not isinstance(field, serializers.ModelSerializer):
+                # e.g. `PrimaryKeyRelatedField` reads the key column only.
+                if not isinstance(field, serializers.PrimaryKeyRelatedField):
+                    self.only = None
+                return
+            self.add(self.select_related, lookup)
+            model, path = model_field.related_model, lookup + "__"
+        self.walk(field, path)
+
+    def as_dict(self) -> dict:
+        return dict(
+            select_related=self.select_related,
+            prefetch_related=self.prefetch_related,
+            only=self.only,
+        )
+
+
+def get_query_plan(serializer_class) -> dict:
+    """
+    `Description`:
+        Used to get the minimal `select_related`, `prefetch_related` and
+        `only` lookups of a serializer class, built once per class and logged
+        in `DEBUG`. `only` is `None` if a field reads something which is not
+        a column, e.g. a property or a `SerializerMethodField` without
+        `depends_on`.
+    `Arguments`:
+        serializer_class:[ModelSerializer]
+    `Returns`:
+        plan:[dict] - `select_related`, `prefetch_related` and `only`.
+    """
+    if serializer_class not in _plans:
+        planner = QueryPlanner()
+        planner.walk(serializer_class())
+        _plans[serializer_class] = planner.as_dict()
+        if settings.DEBUG:
+            log(
+                f"Query plan of {serializer_class.__name__}: "
+                f"{_plans[serializer_class]}",
+                "info",
+            )
+    return _plans[serializer_class]
+
+
+def apply_query_plan(
+    queryset: QuerySet,
+    plan: dict,
+    select_related=(),
+    prefetch_related=(),
+    ordering=(),
+) -> QuerySet:
+    """
+    `Description`:
+        Used to apply a query plan with extra relations to a queryset, the
+        columns of extra `select_related` relations and of the ordering are
+        loaded too.
+    `Arguments`:
+        queryset:[QuerySet]
+        plan:[dict] - plan of `get_query_plan`.
+        select_related:[tuple] - extra relations to join.
+        prefetch_related:[tuple] - extra relations to prefetch.
+        ordering:[tuple] - ordering of the rows, e.g. the cursor of
+            `CursorPagination` is read from its columns.
+    `Returns`:
+        queryset:[QuerySet]
+    """
+    select = [*plan["select_related"]]
+    for lookup in select_related:
+        if lookup not in select:
+            select.append(lookup)
+    prefetch = [*plan["prefetch_related"]]
+    for lookup in prefetch_related:
+        if lookup not in prefetch:
+            prefetch.append(lookup)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if plan["only"] is not None:
+        only = [*plan["only"]]
+        for lookup in select_related:
+            # every column of extra relations.
+            parts = lookup.split("__")
+            for i in range(len(parts)):
+                if "__".join(parts[: i + 1]) not in only:
+                    only.append("__".join(parts[: i + 1]))
+        for field in ordering:
+            # columns of the model itself, e.g. `-created_at`.
+            if not isinstance(field, str) or field == "?" or "__" in field:
+                continue
+            field = field.lstrip("-")
+            if field == "pk":
+                field = queryset.model._meta.pk.name
+            if field not in only:
+                only.append(field)
+        queryset = queryset.only(*only)
+    return queryset
@@ -0,0 +1,39 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson, UUIDs, datetimes and dicts of
+    `JSONField` are encoded natively and the rest (e.g. `Decimal`, lazy
+    strings) by DRF's encoder. Falls back to `JSONRenderer` if orjson is not
+    installed or can't encode the data.
+    """
+
+    options = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+    def __init__(self) -> None:
+        self._default = encoders.JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        options = self.options
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        try:
+            ret = orjson.dumps(data, default=self._default, option=options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # same as `JSONRenderer`, these are valid JSON but not valid javascript.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
@@ -3,6 +3,14 @@ from rest_framework import (
     response,
 )
 from django.conf import settings
+from django.db.models import QuerySet, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from itertools import islice
+import csv
+from rest_framework.utils import encoders
+
+from app.core.renderers import ORJSONRenderer
+from app.core.serializers import compile_serializer
 
 
 class APIResponse(response.Response):
@@ -40,3 +48,151 @@ class APIResponse(response.Response):
             data.update(detail=detail)
         data.update(payload)
         return data
+
+
+class StreamingAPIResponse(StreamingHttpResponse):
+    """
+    Streams the `APIResponse` envelope, rows are pulled from the database and
+    serialized chunk by chunk so memory is bound to one chunk.
+    """
+
+    def __init__(
+        self,
+        rows,
+        serializer_class,
+        other_data={},
+        trailer=None,
+        chunk_size=100,
+        context=None,
+        prefetch_lookups=None,
+        status=res_status.HTTP_200_OK,
+    ):
+        self._encoder = encoders.JSONEncoder()
+        if prefetch_lookups is None and isinstance(rows, QuerySet):
+            prefetch_lookups = rows._prefetch_related_lookups
+        self._prefetch_lookups = prefetch_lookups or ()
+        super().__init__(
+            self._stream(
+                rows, serializer_class, other_data, trailer, chunk_size, context
+            ),
+            status=status,
+            content_type="application/json",
+        )
+
+    def _encode_items(self, data: dict) -> bytes:
+        return "".join(
+            f"{self._encoder.encode(key)}:{self._encoder.encode(value)},"
+            for key, value in data.items()
+        ).encode()
+
+    def _chunks(self, rows, chunk_size):
+        if isinstance(rows, QuerySet):
+            rows = rows.iterator(chunk_size=chunk_size)
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            if self._prefetch_lookups:
+                # `iterator` skips `prefetch_related`, it is done per chunk.
+                prefetch_related_objects(chunk, *self._prefetch_lookups)
+            yield chunk
+
+    def _stream(self, rows, serializer_class, other_data, trailer, chunk_size, context):
+        compiled = compile_serializer(serializer_class)
+        if (
+            isinstance(rows, QuerySet)
+            and compiled is not None
+            and compiled.columns is not None
+        ):
+            # rows are serialized from `values()`, without model instances.
+            rows, self._prefetch_lookups = compiled.values(rows), ()
+            serialize = compiled.many_values
+        else:
+            serialize = lambda chunk: serializer_class(
+                chunk, many=True, context=context
+            ).data
+
+        yield b"{" + self._encode_items(other_data) + b'"data":['
+        separator = b""
+        for chunk in self._chunks(rows, chunk_size):
+            data = serialize(chunk)
+            # items of the chunk list without its brackets.
+            yield separator + self._encoder.encode(data)[1:-1].encode()
+            separator = b","
+        tail = self._encode_items(trailer() if callable(trailer) else {})
+        yield b"]" + (b"," + tail[:-1] if tail else b"") + b"}"
+
+
+class _Echo:
+    """
+    File-like object of `csv.writer` which returns the written line.
+    """
+
+    def write(self, value):
+        return value
+
+
+class ExportResponse(StreamingHttpResponse):
+    """
+    Streams `values_list` rows as CSV or NDJSON, rows are pulled from the
+    database by `iterator` so memory is bound to one chunk.
+    """
+
+    content_types = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+    # cells which spreadsheets would evaluate as formulas.
+    formula_prefixes = ("=", "+", "-", "@", "\t", "\r")
+
+    def __init__(
+        self,
+        rows,
+        fields,
+        output="csv",
+        filename="export",
+        chunk_size=2000,
+        status=res_status.HTTP_200_OK,
+    ):
+        assert output in self.content_types, f"`{output}` is not an export format"
+        self._encoder = encoders.JSONEncoder()
+        self._renderer = ORJSONRenderer()
+        stream = self._csv if output == "csv" else self._ndjson
+        super().__init__(
+            stream(self._chunks(rows, chunk_size), fields),
+            status=status,
+            content_type=self.content_types[output],
+        )
+        self["Content-Disposition"] = f'attachment; filename="{filename}.{output}"'
+
+    def _chunks(self, rows, chunk_size):
+        if isinstance(rows, QuerySet):
+            rows = rows.iterator(chunk_size=chunk_size)
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _csv_value(self, value):
+        if isinstance(value, str):
+            return "'" + value if value.startswith(self.formula_prefixes) else value
+        if value is None or isinstance(value, (int, float)):
+            return value
+        if isinstance(value, (dict, list)):
+            return self._encoder.encode(value)
+        return self._encoder.default(value)
+
+    def _csv(self, chunks, fields):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields).encode()
+        for chunk in chunks:
+            yield "".join(
+                writer.writerow([self._csv_value(value) for value in row])
+                for row in chunk
+            ).encode()
+
+    def _ndjson(self, chunks, fields):
+        for chunk in chunks:
+            yield b"".join(
+                self._renderer.render(dict(zip(fields, row))) + b"\n" for row in chunk
+            )
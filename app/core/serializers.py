@@ -1,8 +1,40 @@
-from rest_framework import serializers
+from datetime import datetime
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+from typing import Dict, Union
+import operator
 
 from utils.helpers import log
 
 
+# converters of fields whose `to_representation` is a plain cast, `None`
+# means the value is returned as it is.
+CONVERTERS = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.IntegerField: int,
+    serializers.BooleanField: bool,
+    serializers.ReadOnlyField: None,
+}
+# fields which don't depend on context, their `to_representation` is used.
+BOUND_FIELDS = (
+    serializers.DateTimeField,
+    serializers.DateField,
+    serializers.TimeField,
+    serializers.DecimalField,
+    serializers.FloatField,
+    serializers.ChoiceField,
+    serializers.JSONField,
+    serializers.UUIDField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
 def list_to_key_value(payload):
     if isinstance(payload, dict):
         item = dict()
@@ -51,6 +83,15 @@ class AppSerializer(serializers.Serializer):
 
 
 class AppModelSerializer(serializers.ModelSerializer, AppSerializer):
+    # `many=True` data is serialized by `CompiledSerializer`.
+    compile_many = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, "Meta", None)
+        if meta is not None and not hasattr(meta, "list_serializer_class"):
+            meta.list_serializer_class = AppListSerializer
+
     def check_change(self, instance, data: dict):
         fields = self.Meta.fields
         return [
@@ -73,3 +114,277 @@ class AppModelSerializer(serializers.ModelSerializer, AppSerializer):
         if save:
             instance.save()
         return instance
+
+
+class CompiledSerializer:
+    """
+    Read only serialization of a serializer class, its fields are resolved
+    once into a flat list of (name, getter, converter) which serializes a row
+    with no per field dispatch. Rows are instances or `values()` dicts, the
+    latter only if every field is a column or a property of columns declared
+    by `depends_on`. Serializers which override `to_representation`, or have
+    nested serializers which do, can't be compiled.
+    """
+
+    FIELD, DATETIME, METHOD, NESTED, MANY = range(5)
+
+    def __init__(self, serializer_class):
+        assert (
+            serializer_class.to_representation
+            is serializers.Serializer.to_representation
+        ), "`to_representation` is overridden"
+        serializer = serializer_class()
+        self.model = serializer.Meta.model
+        self.fields = []
+        # `values()` columns, `None` if rows can't be read by `values()`.
+        self.columns = []
+        self.properties = []
+        for field in serializer._readable_fields:
+            self.fields.append(self._compile_field(field))
+
+    def _compile_field(self, field):
+        name = field.field_name
+        if isinstance(field, serializers.SerializerMethodField):
+            self.columns = None
+            return name, self.METHOD, getattr(type(field.parent), field.method_name)
+        if isinstance(field, AppModelSerializer):
+            child = compile_serializer(type(field))
+            assert child is not None, f"`{name}` can't be compiled"
+            self.columns = None
+            return name, self.NESTED, (self._getter(field), child)
+        if isinstance(field, serializers.ListSerializer) and isinstance(
+            field.child, AppModelSerializer
+        ):
+            child = compile_serializer(type(field.child))
+            assert child is not None, f"`{name}` can't be compiled"
+            self.columns = None
+            return name, self.MANY, (self._getter(field), child)
+
+        if self._is_iso_datetime(field):
+            self._add_column(field)
+            return name, self.DATETIME, (self._getter(field), field, field.source)
+        if type(field) in CONVERTERS:
+            convert = CONVERTERS[type(field)]
+        elif type(field) in BOUND_FIELDS:
+            convert = field.to_representation
+        else:
+            raise AssertionError(f"`{type(field).__name__}` can't be compiled")
+        if isinstance(field, serializers.UUIDField) and field.uuid_format == (
+            "hex_verbose"
+        ):
+            convert = str
+        self._add_column(field)
+        return name, self.FIELD, (self._getter(field), convert, field.source)
+
+    def _is_iso_datetime(self, field) -> bool:
+        output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+        return (
+            type(field) is serializers.DateTimeField
+            and not hasattr(field, "timezone")
+            and isinstance(output_format, str)
+            and output_format.lower() == ISO_8601
+        )
+
+    @staticmethod
+    def _datetime(value, field, tz):
+        # same as `DateTimeField.to_representation` with the timezone which
+        # is looked up once per call instead of once per value.
+        if tz is None or not isinstance(value, datetime) or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    @staticmethod
+    def current_timezone():
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def _model_attr(self, field):
+        if len(field.source_attrs) != 1:
+            return None
+        return getattr(self.model, field.source_attrs[0], None)
+
+    def _getter(self, field):
+        attr = self._model_attr(field)
+        if isinstance(attr, property) or (
+            getattr(attr, "field", None) is not None
+            and not getattr(attr.field, "is_relation", True)
+        ):
+            return operator.attrgetter(field.source)
+        # related objects, dotted sources and methods are resolved by DRF.
+        return field.get_attribute
+
+    def _add_column(self, field):
+        if self.columns is None:
+            return
+        attr = self._model_attr(field)
+        if isinstance(attr, property):
+            sources = getattr(attr.fget, "depends_on", None)
+            if sources is None:
+                self.columns = None
+                return
+            self.properties.append((field.source, attr.fget))
+            self.columns.extend(
+                source for source in sources if source not in self.columns
+            )
+        elif (
+            getattr(attr, "field", None) is not None
+            and not attr.field.is_relation
+            and field.source not in self.columns
+        ):
+            self.columns.append(field.source)
+        elif field.source not in self.columns:
+            self.columns = None
+
+    def to_dict(self, instance, serializer=None, tz=None) -> dict:
+        """
+        `Description`:
+            Used to serialize an instance, same as `serializer.to_representation`.
+        `Arguments`:
+            instance:[Model] - model instance.
+            serializer:[AppModelSerializer] - serializer instance, needed by
+                `SerializerMethodField` and nested serializers.
+            tz:[tzinfo] - current timezone, datetimes are converted by DRF
+                if it is not given.
+        `Returns`:
+            data:[dict]
+        """
+        ret = {}
+        for name, kind, compiled in self.fields:
+            try:
+                if kind == self.FIELD:
+                    getter, convert, _ = compiled
+                    value = getter(instance)
+                    if value is None or (
+                        isinstance(value, PKOnlyObject) and value.pk is None
+                    ):
+                        ret[name] = None
+                    else:
+                        ret[name] = value if convert is None else convert(value)
+                elif kind == self.DATETIME:
+                    getter, field, _ = compiled
+                    value = getter(instance)
+                    ret[name] = (
+                        None if value is None else self._datetime(value, field, tz)
+                    )
+                elif kind == self.METHOD:
+                    ret[name] = compiled(serializer, instance)
+                else:
+                    getter, child = compiled
+                    value = getter(instance)
+                    field = serializer.fields[name] if serializer else None
+                    if value is None:
+                        ret[name] = None
+                    elif kind == self.NESTED:
+                        ret[name] = child.to_dict(value, field, tz)
+                    else:
+                        if isinstance(value, models.Manager):
+                            value = value.all()
+                        field = field.child if field else None
+                        ret[name] = [child.to_dict(item, field, tz) for item in value]
+            except SkipField:
+                continue
+        return ret
+
+    def from_values(self, row: dict, tz=None) -> dict:
+        """
+        `Description`:
+            Used to serialize a `values(*self.columns)` row.
+        `Arguments`:
+            row:[dict] - row of `values()`.
+            tz:[tzinfo] - current timezone, same as of `to_dict`.
+        `Returns`:
+            data:[dict]
+        """
+        if self.properties:
+            # properties are evaluated on an instance without model state.
+            instance = self.model.__new__(self.model)
+            instance.__dict__.update(row)
+            for name, fget in self.properties:
+                row[name] = fget(instance)
+        ret = {}
+        for name, kind, (_, convert, source) in self.fields:
+            value = row[source]
+            if value is None:
+                ret[name] = None
+            elif kind == self.DATETIME:
+                ret[name] = self._datetime(value, convert, tz)
+            else:
+                ret[name] = value if convert is None else convert(value)
+        return ret
+
+    def many(self, data, serializer=None) -> list:
+        """
+        `Description`:
+            Used to serialize many rows, an unevaluated queryset is read by
+            `values()` if it can be.
+        `Arguments`:
+            data:[QuerySet|Manager|list] - rows.
+            serializer:[AppModelSerializer] - child serializer instance.
+        `Returns`:
+            data:[list]
+        """
+        if isinstance(data, models.Manager):
+            data = data.all()
+        if (
+            isinstance(data, models.QuerySet)
+            and data._result_cache is None
+            and self.columns is not None
+        ):
+            return self.many_values(self.values(data))
+        tz = self.current_timezone()
+        return [self.to_dict(instance, serializer, tz) for instance in data]
+
+    def many_values(self, rows) -> list:
+        """
+        `Description`:
+            Used to serialize many `values(*self.columns)` rows.
+        `Arguments`:
+            rows:[QuerySet|list] - rows of `values()`.
+        `Returns`:
+            data:[list]
+        """
+        tz = self.current_timezone()
+        return [self.from_values(row, tz) for row in rows]
+
+    def values(self, queryset: models.QuerySet) -> models.QuerySet:
+        # there is nothing to prefetch for `values()` rows.
+        return queryset.prefetch_related(None).values(*self.columns)
+
+
+_compiled: Dict[type, Union[CompiledSerializer, None]] = {}
+
+
+def compile_serializer(serializer_class) -> Union[CompiledSerializer, None]:
+    """
+    `Description`:
+        Used to get the compiled version of a serializer class, built once per
+        class. `None` if any field needs DRF (e.g. hyperlinked or file fields),
+        the class or a nested serializer overrides `to_representation`, or
+        the class sets `compile_many = False`.
+    `Arguments`:
+        serializer_class:[AppModelSerializer]
+    `Returns`:
+        compiled:[CompiledSerializer|None]
+    """
+    if serializer_class not in _compiled:
+        compiled = None
+        if getattr(serializer_class, "compile_many", False):
+            try:
+                compiled = CompiledSerializer(serializer_class)
+            except AssertionError as e:
+                log(f"{serializer_class.__name__} is not compiled: {e}", "info")
+        _compiled[serializer_class] = compiled
+    return _compiled[serializer_class]
+
+
+class AppListSerializer(serializers.ListSerializer):
+    """
+    List serializer of `AppModelSerializer`, uses the compiled child
+    serializer if there is one.
+    """
+
+    def to_representation(self, data):
+        compiled = compile_serializer(type(self.child))
+        if compiled is None:
+            return super().to_representation(data)
+        return compiled.many(data, self.child)
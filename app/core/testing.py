@@ -0,0 +1,78 @@
+from django.test import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from typing import Dict, List, Tuple
+
+from app.core.middleware import QueryCounter, get_view_budget
+
+
+def get_url_views(urlconf: str, prefix: str = "") -> List[Tuple[str, object]]:
+    """
+    `Description`:
+        Used to list the class based views of an urlconf.
+    `Arguments`:
+        urlconf:[str] - dotted path of urlconf module, e.g. `app_accounts.urls`.
+        prefix:[str] - path under which the urlconf is included.
+    `Returns`:
+        views:[list] - list of (route, view class).
+    """
+    views = []
+
+    def walk(patterns, route):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, route + str(pattern.pattern))
+            elif isinstance(pattern, URLPattern):
+                view_class = getattr(pattern.callback, "view_class", None)
+                if view_class is not None:
+                    views.append((route + str(pattern.pattern), view_class))
+
+    walk(get_resolver(urlconf).url_patterns, prefix)
+    return views
+
+
+class QueryBudgetTestMixin:
+    """
+    Mixin of `TestCase` which requests every `GET` url of an urlconf and
+    asserts the query budget of its view, e.g.
+
+        class BudgetTestCase(QueryBudgetTestMixin, TestCase):
+            def test_budgets(self):
+                self.assertUrlBudgets("app_accounts.urls", "/api/v1/", {"pk": pk})
+    """
+
+    def assertUrlBudgets(self, urlconf: str, prefix: str = "", kwargs: Dict = {}):
+        views = [
+            (route, view_class)
+            for route, view_class in get_url_views(urlconf, prefix)
+            if hasattr(view_class, "get")
+            and "get" in getattr(view_class, "http_method_names", ())
+        ]
+        self.assertTrue(views, f"`{urlconf}` has no `GET` urls.")
+        for route, view_class in views:
+            budget = get_view_budget(view_class)
+            with self.subTest(route=route):
+                self.assertTrue(
+                    budget["queries"],
+                    f"`{view_class.__name__}` doesn't set `query_budget`.",
+                )
+                path = route
+                for name, value in kwargs.items():
+                    path = path.replace(f"<uuid:{name}>", str(value)).replace(
+                        f"<{name}>", str(value)
+                    )
+                counter = QueryCounter()
+                # the middleware is kept out, queries are counted here.
+                with override_settings(QUERY_BUDGET_MODE="off"), counter.record():
+                    response = self.client.get(path)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                self.assertLess(response.status_code, 400, path)
+                self.assertLessEqual(
+                    counter.count,
+                    budget["queries"],
+                    f"`{view_class.__name__}` ran {counter.count} queries.",
+                )
+                for sql, count in counter.duplicates().items():
+                    self.assertLessEqual(
+                        count, budget["duplicates"] or count, f"N+1 of `{sql}`"
+                    )
@@ -1,6 +1,6 @@
-from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter
@@ -11,17 +11,120 @@ from rest_framework.generics import (
     RetrieveUpdateDestroyAPIView,
 )
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework import exceptions, status
 
 from utils.helpers import log
 
-from app.core.response import APIResponse
-from app.core.permissions import IsNotSuperUser
-from app.core.pagination import Pagination
+from app.core.response import APIResponse, ExportResponse
+from app.core.permissions import IsNotSuperUser, OnlyAdmin
+from app.core.pagination import CursorPagination, Pagination, get_paginator
+from app.core.metrics import collect_metrics
+from app.core.plans import apply_query_plan, get_query_plan
+from app.core.cache import cache_registry
+
+
+EMPTY_PLAN = dict(select_related=[], prefetch_related=[], only=None)
+
+
+class StreamingMixin:
+    """
+    Streams list responses with `stream_response = True` or `?stream=true`,
+    rows are read and serialized `stream_chunk_size` at a time.
+    """
+
+    stream_response = False
+    stream_chunk_size = 100
+
+    def should_stream(self) -> bool:
+        request = getattr(self, "request", None)
+        if request is None:
+            return False
+        # django 4.0 iterates streaming content on the event loop under ASGI,
+        # where database queries are not allowed.
+        if isinstance(getattr(request, "_request", request), ASGIRequest):
+            return False
+        return self.stream_response or request.query_params.get("stream") in (
+            "1",
+            "true",
+        )
+
+    def streaming_response(self, queryset, serializer_class, other_data={}):
+        rows = self.paginator.paginate_queryset_lazy(queryset, self.request, view=self)
+        return self.paginator.get_streaming_response(
+            rows,
+            serializer_class,
+            other_data=other_data,
+            chunk_size=self.stream_chunk_size,
+            context={"request": self.request, "view": self},
+        )
+
+
+class ExportMixin:
+    """
+    Exports the filtered queryset with `?output=csv` or `?output=ndjson`, rows
+    are read by `values_list` of `export_fields` and streamed without
+    serializers or a count query. `?limit=` is capped by `export_max_rows`.
+    """
+
+    export_param = "output"
+    export_formats = ("csv", "ndjson")
+    # used when `export_param` is not given, `None` means no export.
+    export_default_format = None
+    export_fields = ()
+    export_filename = None
+    export_chunk_size = None
+    export_max_rows = None
+
+    def get_export_format(self):
+        request = getattr(self, "request", None)
+        if request is None or not self.export_fields:
+            return None
+        output = request.query_params.get(self.export_param)
+        if output is None:
+            output = self.export_default_format
+        return output if output in self.export_formats else None
+
+    def get_export_limit(self):
+        max_rows = self.export_max_rows or settings.EXPORT_MAX_ROWS
+        try:
+            limit = int(self.request.query_params.get("limit", 0))
+        except ValueError:
+            limit = 0
+        if limit > 0:
+            return min(limit, max_rows) if max_rows else limit
+        return max_rows or None
+
+    def get_export_queryset(self):
+        assert self.export_fields, f"`{type(self).__name__}` has no `export_fields`"
+        # `values_list` rows have nothing to prefetch.
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .prefetch_related(None)
+            .values_list(*self.export_fields)
+        )
+        limit = self.get_export_limit()
+        return queryset[:limit] if limit else queryset
+
+    def export_response(self, output: str):
+        # same as `StreamingMixin`, database can't be read on the event loop.
+        if isinstance(getattr(self.request, "_request", None), ASGIRequest):
+            return APIResponse(
+                detail="Export is not available on this server.",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # server side cursors are used on postgres unless
+        # `DISABLE_SERVER_SIDE_CURSORS` is set (pgbouncer).
+        return ExportResponse(
+            self.get_export_queryset(),
+            self.export_fields,
+            output=output,
+            filename=self.export_filename or self.model._meta.db_table,
+            chunk_size=self.export_chunk_size or settings.EXPORT_CHUNK_SIZE,
+        )
 
 
-class AppBaseView(GenericAPIView):
+class AppBaseView(ExportMixin, StreamingMixin, GenericAPIView):
     permission_classes = [IsAuthenticated, IsNotSuperUser]
     related_fields = ()
     related_many_fields = ()
@@ -37,6 +140,15 @@ class AppBaseView(GenericAPIView):
     filters = {"is_hidden": False}
     excludes = {}
     return_data = True
+    # used instead of `pagination_class` with `?cursor=` or `?pagination=cursor`.
+    cursor_pagination_class = CursorPagination
+    # `exact`, `cached`, `estimate` or `capped`, see `app.core.counting`,
+    # defaults to `exact` for page number and no count for cursor pagination.
+    count_strategy = None
+    # max queries of a request and max runs of one SQL shape, see
+    # `app.core.middleware`, `None` uses the settings.
+    query_budget = None
+    duplicate_query_budget = None
 
     def __init__(self, **kwargs):
         # http_method_names into lower
@@ -64,17 +176,51 @@ class AppBaseView(GenericAPIView):
             return None
         return getattr(self, attr)
 
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            self._paginator = get_paginator(self)
+        return self._paginator
+
     def get_queryset(self):
         if not self.request:
             return self.model.objects.none()
 
         return (
-            self.model.objects.prefetch_related(*self.related_many_fields)
-            .select_related(*self.related_fields)
+            apply_query_plan(
+                self.model.objects.all(),
+                self.get_query_plan(),
+                select_related=self.related_fields,
+                prefetch_related=self.related_many_fields,
+                ordering=self.get_ordering_fields(),
+            )
             .exclude(**self.excludes)
             .filter(**self.filters)
         )
 
+    def get_ordering_fields(self) -> list:
+        """
+        Fields the rows are ordered by, the model `Meta.ordering` and the
+        ordering of the paginator.
+        """
+        return [
+            *self.model._meta.ordering,
+            *(getattr(self.paginator, "ordering", None) or ()),
+        ]
+
+    def get_query_plan(self) -> dict:
+        """
+        Relations and columns read by `serializer_view_class`, columns are
+        only restricted for reads, writes may touch any column.
+        """
+        serializer_class = self.get_attr("serializer_view_class", False)
+        if serializer_class is None:
+            return EMPTY_PLAN
+        plan = get_query_plan(serializer_class)
+        if self.request.method not in SAFE_METHODS:
+            return dict(plan, only=None)
+        return plan
+
     def get_serializer_class(self):
         if hasattr(self, "request") and hasattr(self.request, "method"):
             current_method = self.request.method.lower()
@@ -106,6 +252,20 @@ class AppView(
     filter_backends = [DjangoFilterBackend, SearchFilter]
     success_msg = "Created Successfully."
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if hasattr(cls, "model"):
+            # cached pages are invalidated whenever `model` or its relations change.
+            cache_registry.register(cls)
+
+    def _cached_list(self, timeout: int, request, *args, **kwargs):
+        key_prefix = cache_registry.get_key_prefix(type(self))
+        response = cache_page(timeout, key_prefix=key_prefix)(self._list)(
+            request, *args, **kwargs
+        )
+        response["Surrogate-Key"] = " ".join(cache_registry.get_models(type(self)))
+        return response
+
     def _list(self, request, *args, **kwargs):
         try:
             return super().get(request, *args, **kwargs)
@@ -116,13 +276,22 @@ class AppView(
     def get(self, request, *args, **kwargs):
         return self._list(request, *args, **kwargs)
 
-    @method_decorator(cache_page(settings.CACHE_FOR_DAY))
+    def list(self, request, *args, **kwargs):
+        output = self.get_export_format()
+        if output is not None:
+            return self.export_response(output)
+        if self.paginator is not None and self.should_stream():
+            return self.streaming_response(
+                self.filter_queryset(self.get_queryset()),
+                self.get_serializer_class(),
+            )
+        return super().list(request, *args, **kwargs)
+
     def get_for_day(self, request, *args, **kwargs):
-        return self._list(request, *args, **kwargs)
+        return self._cached_list(settings.CACHE_FOR_DAY, request, *args, **kwargs)
 
-    @method_decorator(cache_page(settings.CACHE_FOR_1H))
     def get_for_hour(self, request, *args, **kwargs):
-        return self._list(request, *args, **kwargs)
+        return self._cached_list(settings.CACHE_FOR_1H, request, *args, **kwargs)
 
     def post(self, request: Request):
         serializer = self.get_serializer(data=request.data)
@@ -193,23 +362,22 @@ class AppAPIView(APIView):
     filter_backends = [DjangoFilterBackend]
     permission_classes = [IsAuthenticated]
     http_method_names = ["get", "post", "put", "patch", "delete"]
+    query_budget = None
+    duplicate_query_budget = None
 
     def get_queryset(self):
         return None
 
 
-class AppListView(AppAPIView):
+class AppListView(StreamingMixin, AppAPIView):
     pagination_class = Pagination
+    cursor_pagination_class = CursorPagination
+    count_strategy = None
 
     @property
     def paginator(self):
         if not hasattr(self, "_paginator"):
-            if self.pagination_class is None:
-                self._paginator = None
-            else:
-                self._paginator = self.pagination_class()
-        else:
-            pass
+            self._paginator = get_paginator(self)
         return self._paginator
 
     def paginate_queryset(self, queryset):
@@ -224,6 +392,10 @@ class AppListView(AppAPIView):
         ), "`serializer_view_class` is not defined"
         assert self.paginator is not None
 
+        if self.should_stream():
+            return self.streaming_response(
+                queryset, self.serializer_view_class, other_data
+            )
         page = self.paginate_queryset(queryset)
 
         if page is not None:
@@ -234,3 +406,35 @@ class AppListView(AppAPIView):
         else:
             serializer = self.serializer_class(queryset, many=True)
         return APIResponse(payload=serializer.data, other_data=other_data)
+
+
+class MetricsView(AppAPIView):
+    """
+    Runtime metrics (cache, database, queues) of the serving worker.
+    """
+
+    permission_classes = [IsAuthenticated, OnlyAdmin]
+    http_method_names = ["get"]
+
+    def get(self, request: Request):
+        return APIResponse(collect_metrics())
+
+
+class CachePurgeView(AppAPIView):
+    """
+    Purge cached pages by surrogate keys (model labels).
+    """
+
+    permission_classes = [IsAuthenticated, OnlyAdmin]
+    http_method_names = ["post"]
+
+    def post(self, request: Request):
+        keys = request.data.get("keys") or []
+        if not isinstance(keys, list):
+            return APIResponse(
+                detail="`keys` should be a list.",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return APIResponse(
+            {"keys": cache_registry.purge(keys)}, detail="Cache is purged."
+        )
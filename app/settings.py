@@ -57,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "app.core.middleware.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -89,14 +90,36 @@ TEMPLATES = [
 WSGI_APPLICATION = "app.wsgi.application"
 
 
+DATABASE_ENGINE = env("DATABASE_ENGINE", default="postgresql")
+DATABASE_POOL = env("DATABASE_POOL", bool, False)
 DATABASES = {
     "default": {
-        "ENGINE": f'django.db.backends.{env("DATABASE_ENGINE", default="postgresql")}',
+        "ENGINE": (
+            "app.core.db"
+            if DATABASE_ENGINE == "postgresql"
+            else f"django.db.backends.{DATABASE_ENGINE}"
+        ),
         "NAME": env("DATABASE_NAME", default=""),
         "USER": env("DATABASE_USER", default=""),
         "PASSWORD": env("DATABASE_PASSWORD", default=""),
         "HOST": env("DATABASE_HOST", default=""),
         "PORT": env("DATABASE_PORT", default=""),
+        # pooled connections are returned to the pool at the end of request.
+        "CONN_MAX_AGE": 0 if DATABASE_POOL else env("DATABASE_CONN_MAX_AGE", int, 60),
+        "CONN_HEALTH_CHECKS": env("DATABASE_CONN_HEALTH_CHECKS", bool, True),
+        # transaction pooling of PgBouncer can't keep the named cursors open.
+        "DISABLE_SERVER_SIDE_CURSORS": env("DATABASE_PGBOUNCER", bool, False),
+        "POOL": (
+            {
+                "MIN_SIZE": env("DATABASE_POOL_MIN_SIZE", int, 0),
+                "MAX_SIZE": env("DATABASE_POOL_MAX_SIZE", int, 10),
+                "TIMEOUT": env("DATABASE_POOL_TIMEOUT", float, 10),
+                "MAX_IDLE": env("DATABASE_POOL_MAX_IDLE", float, 10 * 60),
+                "CHECK_AFTER": env("DATABASE_POOL_CHECK_AFTER", float, 30),
+            }
+            if DATABASE_POOL and DATABASE_ENGINE == "postgresql"
+            else None
+        ),
     }
 }
 
@@ -197,15 +220,36 @@ REST_FRAMEWORK = {
     # Generic view behavior
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
     "DEFAULT_PAGINATION_CLASS": "app.core.pagination.Pagination",
+    # Rendering and parsing
+    "DEFAULT_PARSER_CLASSES": [
+        "app.core.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
     # Filtering
     "SEARCH_PARAM": "q",
 }
+# maximum rows counted by `capped` counting strategy of pagination.
+PAGINATION_COUNT_CAP = env("PAGINATION_COUNT_CAP", int, 10000)
+# off|log|raise, budgets are set on views by `query_budget` and
+# `duplicate_query_budget`, these are the defaults, 0 for no limit.
+QUERY_BUDGET_MODE = env("QUERY_BUDGET_MODE", default="log")
+QUERY_BUDGET_SAMPLE_RATE = env(
+    "QUERY_BUDGET_SAMPLE_RATE", float, 1.0 if DEBUG else 0.01
+)
+QUERY_BUDGET = env("QUERY_BUDGET", int, 0)
+QUERY_BUDGET_DUPLICATES = env("QUERY_BUDGET_DUPLICATES", int, 10)
+# rows fetched per database round trip and max rows of an export.
+EXPORT_CHUNK_SIZE = env("EXPORT_CHUNK_SIZE", int, 2000)
+EXPORT_MAX_ROWS = env("EXPORT_MAX_ROWS", int, 0)
 
 if not DEBUG:
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = ("app.core.renderers.ORJSONRenderer",)
+else:
     REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"] = (
-        "rest_framework.renderers.JSONRenderer",
+        "app.core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     )
-else:
     REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"].append(
         "rest_framework.authentication.SessionAuthentication"
     )
@@ -238,8 +282,21 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
+    # claim which carries the group names of user.
+    "ROLES_CLAIM": "groups",
+    # copy groups of `request.user` from the claim instead of database.
+    "TRUST_ROLES_CLAIM": env("TRUST_ROLES_CLAIM", bool, False),
+    # authenticate from token claims and a cached snapshot of user (in seconds).
+    "STATELESS_AUTHENTICATION": env("STATELESS_AUTHENTICATION", bool, False),
+    "USER_SNAPSHOT_LIFETIME": env("USER_SNAPSHOT_LIFETIME", int, 60),
 }
 
+if SIMPLE_JWT["STATELESS_AUTHENTICATION"]:
+    REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"] = [
+        "app_accounts.authentication.StatelessJWTAuthentication",
+        *REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"][1:],
+    ]
+
 
 LANGUAGE_CODE = "en-us"
 
@@ -300,6 +357,36 @@ EMAIL_HOST = env("EMAIL_HOST", default="")
 EMAIL_HOST_USER = env("EMAIL_HOST_USER", default="")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD", default="")
 EMAIL_PORT = env("EMAIL_PORT", default="")
+EMAIL_OUTBOX_BATCH_SIZE = env("EMAIL_OUTBOX_BATCH_SIZE", int, 100)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env("EMAIL_OUTBOX_MAX_ATTEMPTS", int, 5)
+# in seconds, doubled on every failed attempt
+EMAIL_OUTBOX_RETRY_DELAY = env("EMAIL_OUTBOX_RETRY_DELAY", int, 60)
+
+# Notification configurations
+NOTIFICATION_BATCH_SIZE = env("NOTIFICATION_BATCH_SIZE", int, 1000)
+NOTIFICATION_DISPATCH_WORKERS = env("NOTIFICATION_DISPATCH_WORKERS", int, 4)
+NOTIFICATION_DISPATCH_MAX_ATTEMPTS = env("NOTIFICATION_DISPATCH_MAX_ATTEMPTS", int, 5)
+# in seconds, doubled on every failed attempt
+NOTIFICATION_DISPATCH_RETRY_DELAY = env("NOTIFICATION_DISPATCH_RETRY_DELAY", int, 30)
+# in seconds, a dispatch is claimed again if not processed within it
+NOTIFICATION_DISPATCH_LEASE = env("NOTIFICATION_DISPATCH_LEASE", int, 5 * 60)
+# postgres: LISTEN/NOTIFY across processes, e.g. from `dispatch_notifications`
+# to the ASGI workers, local: publisher and clients in one process only.
+NOTIFICATION_STREAM_BACKEND = env(
+    "NOTIFICATION_STREAM_BACKEND",
+    default="postgres" if DATABASE_ENGINE == "postgresql" else "local",
+)
+# in seconds
+NOTIFICATION_STREAM_HEARTBEAT = env("NOTIFICATION_STREAM_HEARTBEAT", int, 15)
+# in days
+NOTIFICATION_RETENTION_DAYS = env("NOTIFICATION_RETENTION_DAYS", int, 365)
+# in days, for hidden notifications
+NOTIFICATION_HIDDEN_RETENTION_DAYS = env("NOTIFICATION_HIDDEN_RETENTION_DAYS", int, 30)
+# copy expired rows to archive tables before they are deleted
+NOTIFICATION_RETENTION_ARCHIVE = env("NOTIFICATION_RETENTION_ARCHIVE", bool, False)
+NOTIFICATION_RETENTION_BATCH_SIZE = env("NOTIFICATION_RETENTION_BATCH_SIZE", int, 1000)
+# in seconds, pause between deleted batches
+NOTIFICATION_RETENTION_SLEEP = env("NOTIFICATION_RETENTION_SLEEP", float, 0.1)
 
 # Cache Settings
 # in seconds
@@ -322,13 +409,38 @@ if not os.path.exists(CACHE_FILEDIR):
         print(
             f"[{APP_NAME}::initialization] creating path ({CACHE_FILEDIR}), Exception - {e} ({type(e)})"
         )
+CACHE_BACKEND = env(
+    "CACHE_BACKEND", default="django.core.cache.backends.filebased.FileBasedCache"
+)
+CACHE_LOCATION = env("CACHE_LOCATION", default=CACHE_FILEDIR)
+# shared by all workers, e.g. `django.core.cache.backends.redis.RedisCache`.
+SHARED_CACHE = {
+    "BACKEND": CACHE_BACKEND,
+    "LOCATION": CACHE_LOCATION,
+    "TIMEOUT": 60 * 60,
+}
+# `incr` of files isn't atomic, which the journal of `TieredCache` needs, so
+# without it other workers see changes once their L1 entries expire.
+CACHE_JOURNAL = not CACHE_BACKEND.endswith("FileBasedCache")
+if not CACHE_JOURNAL:
+    SHARED_CACHE["OPTIONS"] = {"MAX_ENTRIES": 1000}
 CACHES = {
+    # in-process LRU (L1) in front of the shared cache (L2).
     "default": {
-        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        "LOCATION": CACHE_FILEDIR,
+        "BACKEND": "app.core.cache.TieredCache",
+        "LOCATION": "default",
         "TIMEOUT": 60 * 60,
-        "OPTIONS": {"MAX_ENTRIES": 1000},
-    }
+        "OPTIONS": {
+            "SHARED": "shared",
+            "MAX_ENTRIES": env("CACHE_LOCAL_MAX_ENTRIES", int, 1000),
+            "LOCAL_TIMEOUT": env(
+                "CACHE_LOCAL_TIMEOUT", int, 30 if CACHE_JOURNAL else 5
+            ),
+            "SYNC_INTERVAL": env("CACHE_SYNC_INTERVAL", float, 1),
+            "JOURNAL": CACHE_JOURNAL,
+        },
+    },
+    "shared": SHARED_CACHE,
 }
 
 # Server Configurations
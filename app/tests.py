@@ -0,0 +1,523 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from io import BytesIO
+from rest_framework.exceptions import NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+import json
+import time
+import uuid
+
+from app.core.cache import JOURNAL_SEQ_KEY, cache_registry
+from app.core.counting import CACHED, CAPPED, ESTIMATE, EXACT, get_count
+from app.core.db.base import ConnectionPool, PoolTimeout
+from app.core.middleware import QueryBudgetExceeded, QueryBudgetMiddleware
+from app.core.mails import MailComposer
+from app.core.pagination import CursorPagination, Pagination
+from app.core.plans import apply_query_plan, get_query_plan
+from app.core.parsers import ORJSONParser
+from app.core.renderers import ORJSONRenderer
+from app.core.views import AppListView, AppView
+from app.core.serializers import compile_serializer
+from app_accounts.models import Group, User, UserProfile
+from app_accounts.serializers import (
+    UserDetailViewSerializer,
+    UserViewSerializer,
+    WhoAmISerializer,
+)
+from app_notifications.models import Notification, NotificationRecipient
+from app_notifications.serializers import NotificationRecipientSerializer
+from utils.enums import Gender, Roles
+from app_accounts.views import UserView
+from utils.helpers import invalidate_cache, memoize
+
+
+TIERED_CACHES = {
+    "default": {
+        "BACKEND": "app.core.cache.TieredCache",
+        "LOCATION": "tests",
+        "OPTIONS": {"SHARED": "shared", "SYNC_INTERVAL": 0},
+    },
+    "shared": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches["default"]
+        self.cache.clear()
+
+    def test_reads_are_served_locally(self):
+        self.cache.set("key", [1, 2])
+        caches["shared"].delete(self.cache.make_key("key"))
+        self.assertEqual(self.cache.get("key"), [1, 2])
+
+    def test_remote_changes_are_evicted(self):
+        self.cache.set("key", "old")
+        self.cache.get("key")
+        # another worker writes the key and appends it to the journal.
+        shared = caches["shared"]
+        shared.set(self.cache.make_key("key"), "new")
+        seq = shared.incr("tiered:journal:seq")
+        shared.set(f"tiered:journal:{seq}", self.cache.make_key("key"))
+        self.assertEqual(self.cache.get("key"), "new")
+
+    def test_local_copy_expires_with_shared(self):
+        self.cache.set("key", "value", 1)
+        # served from L2, e.g. after another worker wrote it.
+        self.cache._local.delete(self.cache.make_key("key"))
+        self.cache.get("key")
+        key = self.cache.make_key("key")
+        _, expires_at = self.cache._local._data[key]
+        self.assertLessEqual(expires_at, time.monotonic() + 1)
+
+    def test_non_atomic_shared_cache_is_refused(self):
+        with self.settings(
+            CACHES={
+                **TIERED_CACHES,
+                "shared": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": settings.CACHE_FILEDIR,
+                },
+            }
+        ):
+            with self.assertRaises(ImproperlyConfigured):
+                caches["default"]
+
+    def test_non_atomic_shared_cache_without_journal(self):
+        with self.settings(
+            CACHES={
+                "default": {
+                    **TIERED_CACHES["default"],
+                    "OPTIONS": {"SHARED": "shared", "JOURNAL": False},
+                },
+                "shared": {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": settings.CACHE_FILEDIR,
+                },
+            }
+        ):
+            cache = caches["default"]
+            cache.clear()
+            cache.set("key", "value")
+            self.assertIsNone(caches["shared"].get(JOURNAL_SEQ_KEY))
+            # served by L1 without reading the files.
+            caches["shared"].delete(cache.make_key("key"))
+            self.assertEqual(cache.get("key"), "value")
+            cache.delete("key")
+            self.assertIsNone(cache.get("key"))
+
+    def test_versioning(self):
+        self.cache.set("key", 1, version=1)
+        self.cache.set("key", 2, version=2)
+        self.assertEqual(self.cache.get("key", version=1), 1)
+        self.assertEqual(self.cache.get("key", version=2), 2)
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class MemoizeTestCase(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.calls = []
+
+        @memoize(timeout=60)
+        def square(value):
+            self.calls.append(value)
+            return value * value if value else None
+
+        self.square = square
+
+    def test_calls_are_keyed_on_arguments(self):
+        self.assertEqual(self.square(2), 4)
+        self.assertEqual(self.square(3), 9)
+        self.assertEqual(self.square(2), 4)
+        self.assertEqual(self.calls, [2, 3])
+
+    def test_empty_results_are_cached(self):
+        self.assertIsNone(self.square(0))
+        self.assertIsNone(self.square(0))
+        self.assertEqual(self.calls, [0])
+
+    def test_invalidate(self):
+        self.square(2)
+        invalidate_cache(self.square, 2)
+        self.square(2)
+        self.assertEqual(self.calls, [2, 2])
+
+    def test_objects_without_stable_repr(self):
+        class Box:
+            def __init__(self, value):
+                self.value = value
+
+        @memoize(timeout=60)
+        def unbox(box):
+            return box.value
+
+        @memoize(timeout=60, key=lambda box: box.value)
+        def unbox_by_value(box):
+            self.calls.append(box.value)
+            return box.value
+
+        self.assertEqual(unbox(Box(1)), 1)
+        self.assertEqual(unbox(Box(2)), 2)
+        self.assertEqual(unbox_by_value(Box(1)), 1)
+        self.assertEqual(unbox_by_value(Box(2)), 2)
+        self.assertEqual(unbox_by_value(Box(1)), 1)
+        self.assertEqual(self.calls, [1, 2])
+
+
+class CacheRegistryTestCase(TestCase):
+    def test_generation_is_bumped_on_change(self):
+        class UserListView(UserView):
+            related_many_fields = ("groups",)
+
+        cache_registry.register(UserListView)
+        self.assertEqual(
+            cache_registry.get_models(UserListView),
+            ("app_accounts.User", "auth.Group"),
+        )
+        key_prefix = cache_registry.get_key_prefix(UserListView)
+        self.assertEqual(key_prefix, cache_registry.get_key_prefix(UserListView))
+        User.objects.create_user("user@example.com", "password")
+        self.assertNotEqual(key_prefix, cache_registry.get_key_prefix(UserListView))
+
+
+class CursorPaginationTestCase(TestCase):
+    def setUp(self):
+        for i in range(5):
+            User.objects.create_user(f"user{i}@example.com", "password")
+        self.users = list(User.objects.order_by("-created_at", "-id"))
+
+    def paginate(self, url):
+        paginator = CursorPagination()
+        paginator.page_size = 2
+        request = Request(APIRequestFactory().get(url))
+        return paginator, paginator.paginate_queryset(User.objects.all(), request)
+
+    def test_pages_forward_and_backward(self):
+        paginator, page = self.paginate("/users")
+        self.assertEqual(page, self.users[:2])
+        self.assertIsNone(paginator.get_previous_link())
+
+        paginator, page = self.paginate(paginator.get_next_link())
+        self.assertEqual(page, self.users[2:4])
+
+        next_link = paginator.get_next_link()
+        paginator, page = self.paginate(paginator.get_previous_link())
+        self.assertEqual(page, self.users[:2])
+
+        paginator, page = self.paginate(next_link)
+        self.assertEqual(page, self.users[4:])
+        self.assertIsNone(paginator.get_next_link())
+
+    def test_tampered_cursor_is_rejected(self):
+        with self.assertRaises(NotFound):
+            self.paginate("/users?cursor=invalid")
+
+    def test_cursor_columns_are_loaded_by_plan(self):
+        class UserCursorView(AppView):
+            model = User
+            serializer_view_class = UserViewSerializer
+            http_method_names = ["get"]
+            filters = {}
+
+        def get(url):
+            request = APIRequestFactory().get(url)
+            force_authenticate(request, self.users[0])
+            return UserCursorView.as_view()(request).render()
+
+        with self.assertNumQueries(1):
+            response = get("/users?pagination=cursor&size=2")
+        self.assertEqual(len(response.data["data"]), 2)
+        with self.assertNumQueries(1):
+            response = get(response.data["next"])
+        self.assertEqual(
+            [row["id"] for row in response.data["data"]],
+            [str(user.pk) for user in self.users[2:4]],
+        )
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class CountStrategyTestCase(TestCase):
+    def setUp(self):
+        caches["default"].clear()
+        for i in range(5):
+            User.objects.create_user(f"user{i}@example.com", "password")
+
+    def test_capped_count(self):
+        self.assertEqual(get_count(User.objects.all(), CAPPED, cap=3), (3, CAPPED))
+        self.assertEqual(get_count(User.objects.all(), CAPPED, cap=10), (5, EXACT))
+
+    def paginate(self, page, count_strategy):
+        view = type("View", (), {"count_strategy": count_strategy, "count_cap": 2})
+        paginator = Pagination()
+        paginator.page_size = 2
+        request = Request(APIRequestFactory().get(f"/users?page={page}"))
+        rows = paginator.paginate_queryset(User.objects.all(), request, view)
+        return paginator, rows
+
+    def test_pages_beyond_capped_count(self):
+        paginator, rows = self.paginate(2, CAPPED)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(paginator.page.paginator.count, 2)
+        self.assertTrue(paginator.page.has_next())
+        paginator, rows = self.paginate(3, CAPPED)
+        self.assertEqual(len(rows), 1)
+        self.assertFalse(paginator.page.has_next())
+        with self.assertRaises(NotFound):
+            self.paginate(4, CAPPED)
+
+    def test_cached_count(self):
+        queryset = User.objects.filter(is_active=True)
+        self.assertEqual(get_count(queryset, CACHED), (5, CACHED))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_count(queryset, CACHED), (5, CACHED))
+
+    def test_estimate_falls_back_to_exact(self):
+        self.assertEqual(get_count(User.objects.all(), ESTIMATE), (5, EXACT))
+
+
+class PooledConnection:
+    closed = 0
+
+    def get_transaction_status(self):
+        return 0
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def test_connections_are_reused_and_bounded(self):
+        pool = ConnectionPool("tests", max_size=1, timeout=0.01)
+        connection = pool.getconn(PooledConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn(PooledConnection)
+        pool.putconn(connection)
+        self.assertIs(pool.getconn(PooledConnection), connection)
+        stats = pool.stats()
+        self.assertEqual(
+            (stats["in_use"], stats["opened"], stats["timeouts"]), (1, 1, 1)
+        )
+
+    def test_discarded_connection_is_closed(self):
+        pool = ConnectionPool("tests", max_size=1)
+        connection = pool.getconn(PooledConnection)
+        pool.putconn(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+
+class MailComposerTestCase(SimpleTestCase):
+    recipients = ["a@example.com", "b@example.com", "c@example.com"]
+
+    def compose(self, template_kwargs, bcc=False):
+        composer = MailComposer(
+            "Subject",
+            "from@example.com",
+            template="emails/reset_password.html",
+            bcc=bcc,
+        )
+        return composer, list(composer.compose(self.recipients, template_kwargs))
+
+    def test_renders_once_per_distinct_context(self):
+        composer, emails = self.compose([{"link": "a"}, {"link": "b"}, {"link": "a"}])
+        self.assertEqual(composer.renders, 2)
+        self.assertEqual(sorted(email.to[0] for email in emails), self.recipients)
+
+    def test_bcc_fan_out(self):
+        composer, emails = self.compose({"link": "a"}, bcc=True)
+        self.assertEqual(composer.renders, 1)
+        self.assertEqual(len(emails), 1)
+        self.assertEqual((emails[0].to, emails[0].bcc), ([], self.recipients))
+
+    def test_contexts_with_objects_are_not_grouped(self):
+        class Name:
+            def __str__(self):
+                return "same"
+
+        users = [User(pk=uuid.uuid4()), User(pk=uuid.uuid4()), Name()]
+        composer, emails = self.compose(
+            [{"link": users[0]}, {"link": users[1]}, {"link": users[2]}], bcc=True
+        )
+        self.assertEqual(composer.renders, 3)
+        self.assertEqual(len(emails), 3)
+
+
+class UserListView(AppListView):
+    serializer_view_class = UserViewSerializer
+    stream_chunk_size = 2
+
+    def get(self, request):
+        return self.paginated_response(User.objects.prefetch_related("groups"))
+
+
+class StreamingResponseTestCase(TestCase):
+    def setUp(self):
+        for i in range(5):
+            User.objects.create_user(f"user{i}@example.com", "password")
+
+    def get(self, url):
+        request = APIRequestFactory().get(url)
+        force_authenticate(request, User.objects.first())
+        response = UserListView.as_view()(request)
+        if response.streaming:
+            return json.loads(b"".join(response.streaming_content))
+        return json.loads(response.render().content)
+
+    def test_streamed_envelope_matches(self):
+        for url in ("/users?size=3&page=2", "/users?pagination=cursor&size=3"):
+            streamed = self.get(url + "&stream=true")
+            # links keep the `stream` param.
+            streamed = json.loads(json.dumps(streamed).replace("&stream=true", ""))
+            self.assertEqual(streamed, self.get(url))
+            self.assertEqual(len(streamed["data"]), 3 if "cursor" in url else 2)
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data = {
+            "id": uuid.uuid4(),
+            "created_at": timezone.now(),
+            "payload": {"id": "", "tags": ["a", "\u2028"], "count": 1},
+        }
+
+    def test_output_matches_json_renderer(self):
+        rendered = ORJSONRenderer().render(self.data)
+        self.assertEqual(
+            json.loads(rendered), json.loads(JSONRenderer().render(self.data))
+        )
+        self.assertNotIn("\u2028".encode(), rendered)
+
+    def test_parser_round_trip(self):
+        rendered = ORJSONRenderer().render(self.data)
+        self.assertEqual(ORJSONParser().parse(BytesIO(rendered)), json.loads(rendered))
+
+
+class CompiledSerializerTestCase(TestCase):
+    def setUp(self):
+        group = Group.objects.create(name=Roles.ADMIN.value)
+        for i in range(3):
+            user = User.objects.create_user(f"user{i}@example.com", "password")
+            user.first_name = f"First {i}"
+            user.save()
+            user.groups.add(group)
+        UserProfile.objects.create(
+            user=user, gender=Gender.MALE, dob=timezone.now().date()
+        )
+        notification = Notification.objects.create(
+            type="message", payload={"id": str(user.pk), "count": 1}
+        )
+        NotificationRecipient.objects.create(user=user, notification=notification)
+
+    def render(self, data):
+        return json.loads(JSONRenderer().render(data))
+
+    def assertParity(self, serializer_class, queryset):
+        self.assertIsNotNone(compile_serializer(serializer_class))
+        expected = self.render([serializer_class(row).data for row in queryset])
+        # from instances and, when all fields are columns, from `values()`.
+        for rows in (list(queryset), queryset.all()):
+            data = serializer_class(rows, many=True).data
+            self.assertEqual(self.render(data), expected)
+
+    def test_parity(self):
+        users = User.objects.order_by("email")
+        self.assertParity(UserViewSerializer, users)
+        self.assertParity(UserDetailViewSerializer, users)
+        self.assertParity(WhoAmISerializer, users)
+        self.assertParity(
+            NotificationRecipientSerializer, NotificationRecipient.objects.all()
+        )
+
+    def test_to_representation_overrides_are_not_compiled(self):
+        class UpperSerializer(UserViewSerializer):
+            def to_representation(self, instance):
+                data = super().to_representation(instance)
+                data["email"] = data["email"].upper()
+                return data
+
+        class NestedSerializer(UserDetailViewSerializer):
+            profile = UpperSerializer(source="*", read_only=True)
+
+        self.assertIsNone(compile_serializer(UpperSerializer))
+        self.assertIsNone(compile_serializer(NestedSerializer))
+        data = UpperSerializer(User.objects.order_by("email"), many=True).data
+        self.assertEqual(data[0]["email"], "USER0@EXAMPLE.COM")
+
+    def test_values_are_read_without_instances(self):
+        compiled = compile_serializer(UserViewSerializer)
+        self.assertIn("first_name", compiled.columns)
+        with self.assertNumQueries(1):
+            data = UserViewSerializer(User.objects.order_by("email"), many=True).data
+        self.assertEqual(
+            data[0]["full_name"], User.objects.order_by("email")[0].full_name
+        )
+
+
+@override_settings(QUERY_BUDGET_MODE="raise", QUERY_BUDGET_SAMPLE_RATE=1)
+class QueryBudgetMiddlewareTestCase(TestCase):
+    class BudgetView:
+        query_budget = 5
+        duplicate_query_budget = 2
+
+    def request(self, queries: int, view_class=BudgetView):
+        def view():
+            pass
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            for _ in range(queries):
+                # same SQL shape on every run.
+                User.objects.filter(pk=uuid.uuid4()).exists()
+            return HttpResponse()
+
+        view.view_class = view_class
+        middleware = QueryBudgetMiddleware(get_response)
+        return middleware(APIRequestFactory().get("/"))
+
+    def test_within_budget(self):
+        self.assertEqual(self.request(2).status_code, 200)
+
+    def test_duplicates_exceed_budget(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "3 times"):
+            self.request(3)
+
+    def test_log_mode(self):
+        with self.settings(QUERY_BUDGET_MODE="log"):
+            with self.assertLogs("django", "WARNING"):
+                self.assertEqual(self.request(3).status_code, 200)
+
+    def test_queries_exceed_budget(self):
+        class View(self.BudgetView):
+            duplicate_query_budget = 0
+
+        with self.assertRaisesMessage(QueryBudgetExceeded, "6 queries"):
+            self.request(6, View)
+
+
+class QueryPlanTestCase(TestCase):
+    def test_plan_of_nested_serializer(self):
+        plan = get_query_plan(UserDetailViewSerializer)
+        self.assertEqual(plan["select_related"], ["profile"])
+        self.assertEqual(plan["prefetch_related"], [])
+        self.assertIn("profile__gender", plan["only"])
+        self.assertNotIn("refresh_token", plan["only"])
+        # `get_groups` declares what it reads.
+        self.assertEqual(get_query_plan(WhoAmISerializer)["only"][0], "id")
+
+    def test_plan_reads_in_one_query(self):
+        user = User.objects.create_user("user@example.com", "password")
+        UserProfile.objects.create(user=user, gender=Gender.MALE)
+        queryset = apply_query_plan(
+            User.objects.all(), get_query_plan(UserDetailViewSerializer)
+        )
+        with self.assertNumQueries(1):
+            data = UserDetailViewSerializer(queryset, many=True).data
+        self.assertEqual(data[0]["profile"]["gender"], Gender.MALE)
@@ -7,6 +7,8 @@ from django.views.generic.base import RedirectView
 from rest_framework.documentation import include_docs_urls
 import debug_toolbar
 
+from app.core.views import CachePurgeView, MetricsView
+
 urlpatterns = (
     [
         # adminsite
@@ -25,8 +27,12 @@ urlpatterns = (
             "favicon.ico",
             RedirectView.as_view(url=staticfiles_storage.url("img/favicon.ico")),
         ),
+        # core
+        path("api/v1/metrics", MetricsView.as_view()),
+        path("api/v1/cache/purge", CachePurgeView.as_view()),
         # custom apps
         path("api/v1/", include("app_accounts.urls")),
+        path("api/v1/", include("app_notifications.urls")),
     ]
     + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.settings import api_settings
@@ -8,6 +11,158 @@ from app_accounts.exceptions import (
     InvalidToken,
     InvalidUser,
 )
+from app_accounts.models import User
+from app_accounts.roles import (
+    get_user_group_names,
+    prime_user_groups,
+    roles_claim,
+    trust_roles_claim,
+)
+
+
+# columns which authentication and permissions read from `user`, groups are
+# read by `app_accounts.roles`.
+AUTH_USER_FIELDS = ("id", "is_active", "is_superuser")
+SNAPSHOT_USER_FIELDS = ("id", "email", "is_active", "is_staff", "is_superuser")
+
+
+def user_snapshot_key(user_id) -> str:
+    return "auth:user:{}".format(user_id)
+
+
+def get_user_snapshot(user_id):
+    """
+    `Description`:
+        Used to get the cached snapshot of the `user` row which is needed
+        to authenticate a request, database is only hit on a cache miss.
+    `Arguments`:
+        user_id:[str|UUID] - user id.
+    `Returns`:
+        snapshot:[dict|None] - None if user does not exist.
+    """
+    key = user_snapshot_key(user_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        user = User.objects.only(*SNAPSHOT_USER_FIELDS).filter(pk=user_id).first()
+        if not user:
+            return None
+        snapshot = dict(
+            id=str(user.id),
+            email=user.email,
+            groups=get_user_group_names(user),
+            is_active=user.is_active,
+            is_staff=user.is_staff,
+            is_superuser=user.is_superuser,
+        )
+        cache.set(key, snapshot, settings.SIMPLE_JWT.get("USER_SNAPSHOT_LIFETIME"))
+    return snapshot
+
+
+def invalidate_user_snapshot(user_id):
+    """
+    `Description`:
+        Used to remove the cached snapshot of `user`.
+    `Arguments`:
+        user_id:[str|UUID] - user id.
+    `Returns`:
+        None
+    """
+    cache.delete(user_snapshot_key(user_id))
+
+
+class TokenUser:
+    """
+    Lightweight user which is backed by the access token claims and the
+    cached snapshot of `user`. Attributes outside of the snapshot raise
+    `AttributeError`, views which need more of `user` load it by `pk`.
+    Permissions API of `PermissionsMixin` is kept, permissions are loaded
+    on the first check (never for a superuser) and memoized per request.
+    """
+
+    is_anonymous = False
+    is_authenticated = True
+
+    group = User.group
+    group_name = User.group_name
+    is_admin = User.is_admin
+
+    def __init__(self, validated_token, snapshot: dict) -> None:
+        self.token = validated_token
+        self.id = self.pk = User._meta.pk.to_python(snapshot["id"])
+        self.email = snapshot.get("email", validated_token.get("email"))
+        self.is_active = snapshot.get("is_active", validated_token.get("is_active"))
+        self.is_staff = snapshot.get("is_staff", False)
+        self.is_superuser = snapshot.get("is_superuser", False)
+        self._perm_cache = {}
+        prime_user_groups(
+            self, snapshot.get("groups", validated_token.get(roles_claim()))
+        )
+
+    def __str__(self):
+        return self.email
+
+    def __eq__(self, other):
+        return getattr(other, "pk", None) == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def _get_permissions(self, obj, from_name: str) -> set:
+        """
+        `Description`:
+            Used to load the permissions of user like `ModelBackend`, only
+            model level permissions are supported so `obj` has none.
+        `Arguments`:
+            obj:[Model|None] - object to check the permissions of.
+            from_name:[str] - `user` or `group`.
+        `Returns`:
+            permissions:[set] - set of "<app_label>.<codename>".
+        """
+        if not self.is_active or obj is not None:
+            return set()
+        if from_name not in self._perm_cache:
+            if self.is_superuser:
+                permissions = Permission.objects.all()
+            else:
+                permissions = Permission.objects.filter(
+                    **{"user" if from_name == "user" else "group__users": self.pk}
+                )
+            self._perm_cache[from_name] = {
+                f"{app_label}.{codename}"
+                for app_label, codename in permissions.values_list(
+                    "content_type__app_label", "codename"
+                ).order_by()
+            }
+        return self._perm_cache[from_name]
+
+    def get_user_permissions(self, obj=None) -> set:
+        return self._get_permissions(obj, "user")
+
+    def get_group_permissions(self, obj=None) -> set:
+        return self._get_permissions(obj, "group")
+
+    def get_all_permissions(self, obj=None) -> set:
+        return {*self.get_user_permissions(obj), *self.get_group_permissions(obj)}
+
+    def has_perm(self, perm: str, obj=None) -> bool:
+        if self.is_active and self.is_superuser:
+            return True
+        return perm in self.get_all_permissions(obj)
+
+    def has_perms(self, perm_list, obj=None) -> bool:
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+    def has_module_perms(self, app_label: str) -> bool:
+        if self.is_active and self.is_superuser:
+            return True
+        return any(
+            perm[: perm.index(".")] == app_label for perm in self.get_all_permissions()
+        )
+
+    def __getattr__(self, attr):
+        raise AttributeError(
+            f"`{attr}` is not in the snapshot of user, load it by `pk` instead."
+        )
 
 
 class SafeJWTAuthentication(JWTAuthentication):
@@ -25,10 +180,49 @@ class SafeJWTAuthentication(JWTAuthentication):
         raise InvalidToken()
 
     def get_user(self, validated_token):
+        """
+        Loads only `AUTH_USER_FIELDS` of user, views which need more of it
+        load it again with their own projection.
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken()
+
+        user = (
+            User.objects.only(*AUTH_USER_FIELDS)
+            .filter(**{api_settings.USER_ID_FIELD: user_id})
+            .first()
+        )
+        if user is None or not user.is_active:
+            raise InvalidUser()
+
+        if trust_roles_claim():
+            # groups are copied from the signed claim instead of database.
+            prime_user_groups(user, validated_token.get(roles_claim()))
+        return user
+
+
+class StatelessJWTAuthentication(SafeJWTAuthentication):
+    """
+    Authenticates without selecting the `user` row on every request,
+    `request.user` is a `TokenUser` backed by the token claims and a short
+    lived cached snapshot which is invalidated whenever `user` is saved.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken()
 
         try:
-            return super().get_user(validated_token)
+            snapshot = get_user_snapshot(user_id)
         except Exception as e:
             log(e)
+            snapshot = None
+
+        if not snapshot or not snapshot.get("is_active"):
+            raise InvalidUser()
 
-        raise InvalidUser()
+        return TokenUser(validated_token, snapshot)
@@ -3,13 +3,16 @@ from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, Group
 import uuid
 
 from .managers import UserManager
+from .roles import clear_user_groups, get_user_groups
+from app.core.models import ProjectionMixin
 from utils.enums import (
     Gender,
     Roles,
 )
+from utils.helpers import depends_on
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(ProjectionMixin, AbstractBaseUser, PermissionsMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     email = models.EmailField(verbose_name="Email Address", max_length=255, unique=True)
     username = models.CharField(
@@ -60,6 +63,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.full_name
 
     @property
+    @depends_on("title", "first_name", "last_name")
     def full_name(self):
         _name = "{} {} {}".format(self.title, self.first_name, self.last_name)
         return _name.strip()
@@ -68,9 +72,15 @@ class User(AbstractBaseUser, PermissionsMixin):
     def short_name(self):
         return self.email
 
+    def refresh_from_db(self, using=None, fields=None):
+        if fields is None:
+            # loads of deferred fields keep the memoized groups.
+            clear_user_groups(self)
+        return super().refresh_from_db(using=using, fields=fields)
+
     @property
     def group(self):
-        groups = self.groups.all()
+        groups = get_user_groups(self)
         if len(groups):
             return groups[0]
         return None
@@ -87,7 +97,7 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.group_name == Roles.ADMIN.value
 
 
-class UserProfile(models.Model):
+class UserProfile(ProjectionMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(
         to="app_accounts.User",
@@ -0,0 +1,157 @@
+from typing import Dict, List, Union
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.db.models import Case, Subquery, When
+
+from utils.enums import Roles
+from utils.helpers import invalidate_cache, memoize
+
+
+ROLES_CACHE_ATTR = "_roles_cache"
+
+# model of role profiles, which have `user` and `is_hidden` fields, by role.
+# `admin` has no profile, its id is the user id.
+RolesMap = {
+    Roles.ADMIN: "app_accounts.User",
+}
+
+
+def get_user_groups(user) -> List[Group]:
+    """
+    `Description`:
+        Used to get the groups of a user, loaded once and memoized on the
+        user instance so every role check after the first one is query free.
+    `Arguments`:
+        user:[User] - user instance.
+    `Returns`:
+        groups:[list] - list of Group instances.
+    """
+    groups = getattr(user, ROLES_CACHE_ATTR, None)
+    if groups is None:
+        # uses the prefetched groups if there are any.
+        groups = list(user.groups.all())
+        setattr(user, ROLES_CACHE_ATTR, groups)
+    return groups
+
+
+def get_user_group_names(user) -> List[str]:
+    """
+    `Description`:
+        Used to get the group names of a user.
+    `Arguments`:
+        user:[User] - user instance.
+    `Returns`:
+        names:[list] - list of group names.
+    """
+    return [group.name for group in get_user_groups(user)]
+
+
+def prime_user_groups(user, group_names: Union[List[str], None]):
+    """
+    `Description`:
+        Used to fill the roles cache of a user from the group names carried
+        by a signed JWT claim, so the groups are never loaded from database.
+    `Arguments`:
+        user:[User] - user instance.
+        group_names:[list|None] - group names, `None` is ignored.
+    `Returns`:
+        user:[User] - same user instance.
+    """
+    if group_names is not None:
+        setattr(user, ROLES_CACHE_ATTR, [Group(name=name) for name in group_names])
+    return user
+
+
+def clear_user_groups(user):
+    """
+    `Description`:
+        Used to invalidate the roles cache of a user.
+    `Arguments`:
+        user:[User] - user instance.
+    `Returns`:
+        None
+    """
+    user.__dict__.pop(ROLES_CACHE_ATTR, None)
+
+
+def roles_claim() -> str:
+    """
+    `Returns`:
+        claim:[str] - name of the JWT claim which carries the group names.
+    """
+    return settings.SIMPLE_JWT.get("ROLES_CLAIM", "groups")
+
+
+def trust_roles_claim() -> bool:
+    """
+    `Returns`:
+        truthy:[bool] - True if the roles claim of access token is trusted.
+    """
+    return bool(settings.SIMPLE_JWT.get("TRUST_ROLES_CLAIM", False))
+
+
+def get_role_model(role: Roles):
+    """
+    `Returns`:
+        model:[Model] - profile model of the role.
+    """
+    return apps.get_model(RolesMap[role])
+
+
+def get_profile_models() -> Dict[Roles, object]:
+    """
+    `Returns`:
+        models:[dict] - profile models by role, except `admin`.
+    """
+    return {role: get_role_model(role) for role in RolesMap if role != Roles.ADMIN}
+
+
+@memoize(settings.CACHE_FOR_DAY)
+def get_user_roles(user_id) -> List[dict]:
+    """
+    `Description`:
+        Used to get the groups of a user with the id of their role profile,
+        e.g. `[{"name": "admin", "admin_id": <user id>}]`, read by one query
+        with a subquery per profile model. Invalidated by `clear_user_roles`
+        whenever groups or profiles of the user change.
+    `Arguments`:
+        user_id:[UUID] - id of user.
+    `Returns`:
+        roles:[list] - list of dicts.
+    """
+    profiles = {
+        role.value: Subquery(
+            model.objects.filter(user_id=user_id, is_hidden=False).values("pk")[:1]
+        )
+        for role, model in get_profile_models().items()
+    }
+    groups = Group.objects.filter(users=user_id).order_by("pk")
+    if profiles:
+        groups = groups.annotate(
+            profile_id=Case(
+                *[When(name=name, then=query) for name, query in profiles.items()]
+            )
+        )
+    roles = []
+    for group in groups.values("name", *(["profile_id"] if profiles else [])):
+        name = group["name"]
+        role = dict(name=name)
+        if name == Roles.ADMIN.value:
+            role[f"{name}_id"] = user_id
+        elif name in profiles:
+            role[f"{name}_id"] = group["profile_id"]
+        roles.append(role)
+    return roles
+
+
+def clear_user_roles(user_id):
+    """
+    `Description`:
+        Used to invalidate the cached roles of a user.
+    `Arguments`:
+        user_id:[UUID] - id of user.
+    `Returns`:
+        None
+    """
+    invalidate_cache(get_user_roles, user_id)
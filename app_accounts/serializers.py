@@ -5,6 +5,7 @@ from django.db import models
 
 from rest_framework import exceptions, serializers, validators
 from rest_framework_simplejwt.state import token_backend
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.serializers import (
     TokenRefreshSerializer as BaseTokenRefreshSerializer,
     TokenObtainPairSerializer as BaseTokenObtainPairSerializer,
@@ -17,17 +18,14 @@ from .models import (
     Group,
     UserProfile,
 )
+from .roles import get_user_group_names, get_user_roles, roles_claim
 from app.core.serializers import (
     AppSerializer,
     AppModelSerializer,
 )
 
 from utils.enums import Roles, Gender
-from utils.helpers import log
-
-RolesMap = {
-    Roles.ADMIN: User,
-}
+from utils.helpers import depends_on
 
 
 class TokenObtainPairSerializer(BaseTokenObtainPairSerializer, AppSerializer):
@@ -38,6 +36,14 @@ class TokenObtainPairSerializer(BaseTokenObtainPairSerializer, AppSerializer):
 
     default_error_messages = {"no_active_account": _("No active account.")}
 
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["email"] = user.email
+        token["is_active"] = user.is_active
+        token[roles_claim()] = get_user_group_names(user)
+        return token
+
     def verify_user(self):
         truthy = [
             self.user.is_active,
@@ -47,13 +53,11 @@ class TokenObtainPairSerializer(BaseTokenObtainPairSerializer, AppSerializer):
         group_name = self.user.group_name
 
         if group_name and group_name != Roles.ADMIN.value:
-            try:
-                filters = {"is_hidden": False, "user": self.user}
-                truthy.append(
-                    RolesMap[Roles(group_name)].objects.filter(**filters).exists()
-                )
-            except Exception as e:
-                log(str(e))
+            # user must have a visible profile of a role which has profiles.
+            key = f"{group_name}_id"
+            for role in get_user_roles(self.user.pk):
+                if role["name"] == group_name and key in role:
+                    truthy.append(role[key] is not None)
         return all(truthy)
 
     def validate_email(self, email):
@@ -118,6 +122,11 @@ class TokenRefreshSerializer(BaseTokenRefreshSerializer, AppSerializer):
         if user.refresh_token != attrs.get("refresh"):
             raise exceptions.NotAcceptable(self.token_error, "invalid_or_expired_token")
 
+        # re-issue the roles claim so the new access token carries fresh groups.
+        refresh = RefreshToken(attrs["refresh"])
+        refresh[roles_claim()] = get_user_group_names(user)
+        attrs["refresh"] = str(refresh)
+
         tokens = super().validate(attrs)
         user.refresh_token = tokens.get("refresh")
         user.save(update_fields=["refresh_token"])
@@ -341,27 +350,10 @@ class WhoAmISerializer(AppModelSerializer):
 
     groups = serializers.SerializerMethodField()
 
+    @depends_on("pk")
     def get_groups(self, obj):
-        groups = GroupSerializer(obj.groups.all(), many=True).data
-        try:
-            for group in groups:
-                role = Roles(group.get("name"))
-                if role == Roles.ADMIN:
-                    group[f"{role.value}_id"] = obj.id
-                    continue
-                group[f"{role.value}_id"] = (
-                    RolesMap[role]
-                    .objects.filter(
-                        user__id=obj.id,
-                        is_hidden=False,
-                    )
-                    .first()
-                    .pk
-                )
-
-        except Exception as e:
-            log(str(e))
-        return groups
+        # groups and role profile ids are read by one cached query.
+        return get_user_roles(obj.pk)
 
     class Meta:
         model = User
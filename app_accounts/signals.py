@@ -0,0 +1,64 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_snapshot
+from .models import Group, User
+from .roles import clear_user_groups, clear_user_roles, get_profile_models
+from utils.helpers import invalidate_cache
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_groups(sender, instance, action, reverse, **kwargs):
+    """
+    Invalidate the memoized groups of user whenever `User.groups` changes.
+    """
+    if reverse and action == "pre_clear":
+        # `pk_set` of `group.users.clear()` is None, keep the users to clear.
+        instance._cleared_user_ids = list(instance.users.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    invalidate_cache(User.objects.get_admins)
+    if not reverse:
+        clear_user_groups(instance)
+        clear_user_roles(instance.pk)
+        invalidate_user_snapshot(instance.pk)
+    else:
+        if action == "post_clear":
+            user_ids = instance.__dict__.pop("_cleared_user_ids", ())
+        else:
+            user_ids = kwargs.get("pk_set") or ()
+        for user_id in user_ids:
+            clear_user_roles(user_id)
+            invalidate_user_snapshot(user_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """
+    Invalidate the cached authentication snapshot of saved/deleted user.
+    """
+    invalidate_user_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_roles(sender, instance, **kwargs):
+    """
+    Invalidate the cached roles of the users of renamed/deleted group.
+    """
+    for user_id in instance.users.values_list("id", flat=True):
+        clear_user_roles(user_id)
+
+
+def invalidate_profile_roles(sender, instance, **kwargs):
+    """
+    Invalidate the cached roles of user whenever their role profile changes.
+    """
+    clear_user_roles(instance.user_id)
+
+
+for model in get_profile_models().values():
+    post_save.connect(invalidate_profile_roles, sender=model)
+    post_delete.connect(invalidate_profile_roles, sender=model)
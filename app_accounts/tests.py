@@ -1,3 +1,238 @@
+from django.contrib.auth.models import Permission
 from django.test import TestCase
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory
+import csv
+import io
+import json
 
-# Create your tests here.
+from .authentication import SafeJWTAuthentication, StatelessJWTAuthentication
+from .exceptions import InvalidUser
+from .models import User, Group
+from .serializers import TokenObtainPairSerializer
+from .views import UserActivateView, UserExportView
+from app.core.testing import QueryBudgetTestMixin
+from utils.enums import Roles
+
+
+class UserRolesTestCase(TestCase):
+    def setUp(self):
+        self.group = Group.objects.create(name=Roles.ADMIN.value)
+        self.user = User.objects.create_user("admin@example.com", "password")
+        self.user.groups.add(self.group)
+
+    def test_roles_are_loaded_once(self):
+        user = User.objects.filter(pk=self.user.pk).first()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.group, self.group)
+            self.assertEqual(user.group_name, Roles.ADMIN.value)
+            self.assertTrue(user.is_admin)
+
+    def test_roles_are_kept_on_deferred_loads(self):
+        user = User.objects.only("id").get(pk=self.user.pk)
+        self.assertTrue(user.is_admin)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+            self.assertTrue(user.is_admin)
+
+    def test_roles_are_invalidated_on_change(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(user.is_admin)
+        user.groups.remove(self.group)
+        self.assertIsNone(user.group)
+
+
+class StatelessAuthenticationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+
+    def get_token(self):
+        return TokenObtainPairSerializer.get_token(self.user).access_token
+
+    def test_warm_path_hits_no_database(self):
+        auth = StatelessJWTAuthentication()
+        token = self.get_token()
+        auth.get_user(token)
+        with self.assertNumQueries(0):
+            user = auth.get_user(token)
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertFalse(user.is_admin)
+
+    def test_attributes_outside_snapshot_are_not_loaded(self):
+        auth = StatelessJWTAuthentication()
+        token = self.get_token()
+        auth.get_user(token)
+        with self.assertNumQueries(0):
+            user = auth.get_user(token)
+            self.assertEqual(user.email, self.user.email)
+            with self.assertRaises(AttributeError):
+                user.last_login
+            with self.assertRaises(AttributeError):
+                user.first_name
+
+    def test_inactive_user_is_rejected(self):
+        auth = StatelessJWTAuthentication()
+        token = self.get_token()
+        auth.get_user(token)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(InvalidUser):
+            auth.get_user(token)
+
+
+class StatelessUserActivateView(UserActivateView):
+    authentication_classes = [StatelessJWTAuthentication]
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+
+
+class StatelessPermissionsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+        self.target = User.objects.create_user("target@example.com", "password")
+        self.view = StatelessUserActivateView.as_view()
+
+    def patch(self, user):
+        token = TokenObtainPairSerializer.get_token(user).access_token
+        request = APIRequestFactory().patch(
+            f"/api/v1/user/{self.target.pk}/active",
+            {"is_active": False},
+            format="json",
+            HTTP_AUTHORIZATION=f"Bearer {token}",
+        )
+        return self.view(request, pk=self.target.pk)
+
+    def test_write_without_permission_is_forbidden(self):
+        self.assertEqual(self.patch(self.user).status_code, 403)
+
+    def test_write_with_group_permission(self):
+        group = Group.objects.create(name="editors")
+        group.permissions.add(Permission.objects.get(codename="change_user"))
+        self.user.groups.add(group)
+        self.assertEqual(self.patch(self.user).status_code, 200)
+        self.target.refresh_from_db()
+        self.assertFalse(self.target.is_active)
+
+    def test_superuser_permissions_are_not_loaded(self):
+        auth = StatelessJWTAuthentication()
+        self.user.is_superuser = True
+        self.user.save()
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        auth.get_user(token)
+        with self.assertNumQueries(0):
+            user = auth.get_user(token)
+            self.assertTrue(user.has_perms(["app_accounts.change_user"]))
+            self.assertTrue(user.has_module_perms("app_accounts"))
+
+    def test_permissions_are_memoized(self):
+        self.user.user_permissions.add(Permission.objects.get(codename="view_user"))
+        user = StatelessJWTAuthentication().get_user(
+            TokenObtainPairSerializer.get_token(self.user).access_token
+        )
+        with self.assertNumQueries(2):
+            self.assertTrue(user.has_perm("app_accounts.view_user"))
+            self.assertFalse(user.has_perm("app_accounts.change_user"))
+        self.assertEqual(user.get_all_permissions(), {"app_accounts.view_user"})
+
+
+class UserExportTestCase(TestCase):
+    url = "/api/v1/user/export"
+
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@example.com", "password")
+        self.admin.groups.add(Group.objects.create(name=Roles.ADMIN.value))
+        for i in range(3):
+            User.objects.create_user(f"user{i}@example.com", "password")
+        User.objects.filter(email="user0@example.com").update(is_active=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, query=""):
+        response = self.client.get(f"{self.url}{query}")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        rows = list(csv.reader(io.StringIO(self.export())))
+        self.assertEqual(rows[0], list(UserExportView.export_fields))
+        self.assertEqual(len(rows), 5)
+
+    def test_ndjson_export_respects_filters_and_limit(self):
+        lines = self.export("?output=ndjson&is_active=false").splitlines()
+        self.assertEqual(
+            [json.loads(line)["email"] for line in lines], ["user0@example.com"]
+        )
+        self.assertEqual(len(self.export("?output=ndjson&limit=2").splitlines()), 2)
+
+    def test_export_is_admin_only(self):
+        self.client.force_authenticate(User.objects.get(email="user1@example.com"))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class WhoAmITestCase(TestCase):
+    url = "/api/v1/whoami"
+
+    def setUp(self):
+        self.group = Group.objects.create(name=Roles.ADMIN.value)
+        self.user = User.objects.create_user("admin@example.com", "password")
+        self.user.groups.add(self.group)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_groups(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["data"]["groups"]
+
+    def test_roles_are_read_once(self):
+        # projected `user` row and roles.
+        with self.assertNumQueries(2):
+            groups = self.get_groups()
+        self.assertEqual(groups, [{"name": "admin", "admin_id": str(self.user.pk)}])
+        with self.assertNumQueries(1):
+            self.get_groups()
+
+    def test_roles_are_kept_on_deferred_loads(self):
+        user = User.objects.only("id").get(pk=self.user.pk)
+        self.assertTrue(user.is_admin)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
+            self.assertTrue(user.is_admin)
+
+    def test_roles_are_invalidated_on_change(self):
+        self.get_groups()
+        self.user.groups.remove(self.group)
+        self.assertEqual(self.get_groups(), [])
+
+    def test_roles_are_invalidated_on_group_clear(self):
+        self.get_groups()
+        self.group.users.clear()
+        self.assertEqual(self.get_groups(), [])
+
+
+class QueryBudgetTestCase(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("admin@example.com", "password")
+        self.user.groups.add(Group.objects.create(name=Roles.ADMIN.value))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_url_budgets(self):
+        self.assertUrlBudgets("app_accounts.urls", "/api/v1/", {"pk": self.user.pk})
+
+
+class ProjectionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+
+    def test_authentication_loads_auth_columns(self):
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        with self.assertNumQueries(1):
+            user = SafeJWTAuthentication().get_user(token)
+        self.assertIn("refresh_token", user.get_deferred_fields())
+        self.assertNotIn("is_active", user.get_deferred_fields())
+
+    def test_deferred_field_load_is_logged(self):
+        user = User.objects.only("id").get(pk=self.user.pk)
+        with self.assertLogs("django", "WARNING") as logs:
+            self.assertEqual(user.email, "user@example.com")
+        self.assertIn("Deferred field(s) email of User", logs.output[0])
@@ -6,6 +6,7 @@ from .views import (
     TokenObtainPairView,
     WhoAmIView,
     UserView,
+    UserExportView,
     UserActivateView,
     ChangePasswordView,
     ForgotPasswordView,
@@ -19,6 +20,7 @@ urlpatterns = [
     path("whoami", WhoAmIView.as_view()),
     path("forgot-password", ForgotPasswordView.as_view()),
     path("reset-password", ResetPasswordView.as_view()),
+    path("user/export", UserExportView.as_view()),
     path("user/<uuid:pk>/", UserView.as_view()),
     path("user/<uuid:pk>/active", UserActivateView.as_view()),
     path("user/<uuid:pk>/change-password", ChangePasswordView.as_view()),
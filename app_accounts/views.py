@@ -1,5 +1,6 @@
 from django.conf import settings
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework_simplejwt.views import (
     TokenRefreshView as BaseTokenRefreshView,
@@ -21,6 +22,7 @@ from .models import (
     User,
 )
 
+from app.core.permissions import OnlyAdmin
 from app.core.response import APIResponse
 from app.core.views import (
     AppView,
@@ -62,9 +64,12 @@ class WhoAmIView(AppDetailView):
     model = User
     serializer_view_class = WhoAmISerializer
     http_method_names = ["get"]
+    filters = {}
+    query_budget = 3
 
     def get_object(self):
-        return self.request.user
+        # `request.user` has the columns of authentication only.
+        return self.get_queryset().get(pk=self.request.user.pk)
 
     def get(self, request):
         return super().get(request, None)
@@ -78,14 +83,36 @@ class UserView(AppDetailView):
     model = User
     serializer_update_class = UserUpdateSerizlizer
     serializer_view_class = UserViewSerializer
-    related_many_fields = ("groups",)
     http_method_names = ["get", "put"]
+    query_budget = 2
+    filters = {"is_superuser": False, "is_staff": False}
 
-    def get_queryset(self):
-        return self.model.objects.prefetch_related(*self.related_many_fields).filter(
-            is_superuser=False,
-            is_staff=False,
-        )
+
+class UserExportView(AppView):
+    """
+    Export `user` table as `?output=csv` (default) or `?output=ndjson`.
+    """
+
+    model = User
+    permission_classes = [IsAuthenticated, OnlyAdmin]
+    serializer_view_class = UserViewSerializer
+    http_method_names = ["get"]
+    query_budget = 3
+    filters = {"is_hidden": False, "is_superuser": False}
+    filterset_fields = ["is_active", "is_email_verified"]
+    search_fields = ["email", "username", "first_name", "last_name"]
+    export_default_format = "csv"
+    export_fields = (
+        "id",
+        "email",
+        "username",
+        "title",
+        "first_name",
+        "last_name",
+        "is_active",
+        "is_email_verified",
+        "created_at",
+    )
 
 
 class UserActivateView(AppDetailView):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AppNotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app_notifications'
+
+    def ready(self):
+        from . import handlers, signals  # noqa: F401
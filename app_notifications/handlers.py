@@ -1,32 +1,398 @@
-from .models import Notification, NotificationRecipient
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core import mail
+from django.db import connection, transaction
+from django.db.models import Count, Min, QuerySet
+from django.utils import timezone
+from itertools import islice
+import threading
+import time
+
+from .models import (
+    EmailOutbox,
+    Notification,
+    NotificationCounter,
+    NotificationDispatch,
+    NotificationRecipient,
+)
+from .streams import broker
+from app.core.metrics import register_metrics
+from utils.enums import DispatchStatus, MailStatus
+from utils.helpers import call_func, log
 
 
 class NotificationHandler:
+    """
+    Fans a notification out to its recipients in fixed-size batches, so
+    memory stays bounded whatever the number of recipients. Recipients can be
+    user ids, users or querysets of users, duplicates are written once.
+    """
+
     def __init__(self, type, payload, text) -> None:
         self._type = type
         self._payload = payload
         self._text = text
         self._recipients = []
+        self._querysets = []
+
+    def send(self, with_bulk=True, batch_size=None, notification=None):
+        """
+        `Description`:
+            Used to create the notification and its recipients.
+        `Arguments`:
+            with_bulk:[bool] - if False, each recipient is inserted one by one.
+            batch_size:[int] - recipients per insert.
+            notification:[Notification|None] - existing notification to fan out.
+        `Returns`:
+            notification:[Notification]
+        """
+        batch_size = batch_size if with_bulk else 1
+        batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+        started_at = time.monotonic()
+        if notification is None:
+            notification = Notification.objects.create(
+                type=self._type,
+                payload=self._payload,
+                text=self._text,
+            )
+
+        count = 0
+        for recipients in self._sources(batch_size):
+            if isinstance(recipients, QuerySet):
+                count += self.insert_select(notification, recipients)
+            else:
+                count += self.write_batch(notification, recipients, batch_size)
+
+        # pushed to the connected recipients once it is committed.
+        transaction.on_commit(lambda: broker.publish(notification.id))
+
+        elapsed = time.monotonic() - started_at
+        log(
+            "Notification [{}] sent to {} recipients in {:.6f} secs ({:.2f} rows/sec).".format(
+                notification.id, count, elapsed, count / elapsed if elapsed else count
+            ),
+            "info",
+        )
+        return notification
+
+    def _sources(self, batch_size):
+        """
+        Yield the batches of recipient ids, querysets are yielded as they are
+        on PostgreSQL to be inserted server side.
+        """
+        for i in range(0, len(self._recipients), batch_size):
+            yield self._recipients[i : i + batch_size]
+        for queryset in self._querysets:
+            if batch_size > 1 and connection.vendor == "postgresql":
+                yield queryset
+                continue
+            ids = (
+                queryset.values_list("pk", flat=True)
+                .order_by()
+                .iterator(chunk_size=batch_size)
+            )
+            while True:
+                recipients = list(islice(ids, batch_size))
+                if not recipients:
+                    break
+                yield recipients
 
-    def send(self, with_bulk=True):
-        notification = Notification.objects.create(
-            type=self._type,
-            payload=self._payload,
-            text=self._text,
+    def write_batch(self, notification, recipients, batch_size) -> int:
+        """
+        Insert a batch of recipients and increment their unread counters.
+        """
+        to_python = NotificationRecipient._meta.get_field("user").target_field.to_python
+        user_ids = list(dict.fromkeys(map(to_python, recipients)))
+        existing = set(
+            NotificationRecipient.objects.filter(
+                notification=notification, user_id__in=user_ids
+            ).values_list("user_id", flat=True)
         )
-        for recipient in self._recipients:
-            recipient.notification = notification
-            if not with_bulk:
-                recipient.save()
-        if with_bulk:
-            NotificationRecipient.objects.bulk_create(self._recipients)
+        rows = [
+            NotificationRecipient(
+                user_id=user_id,
+                notification=notification,
+                created_at=notification.created_at,
+                type=notification.type,
+                is_hidden=notification.is_hidden,
+            )
+            for user_id in user_ids
+            if user_id not in existing
+        ]
+        with transaction.atomic():
+            NotificationRecipient.objects.bulk_create(
+                rows, batch_size=batch_size, ignore_conflicts=True
+            )
+            if not notification.is_hidden:
+                NotificationCounter.objects.adjust([row.user_id for row in rows], 1)
+        return len(rows)
+
+    def insert_select(self, notification, queryset) -> int:
+        """
+        Insert the recipients of a queryset and increment their unread
+        counters with one `INSERT ... SELECT` statement, ids are derived from
+        the notification and user (no `gen_random_uuid()` before PostgreSQL 13)
+        so a retried dispatch writes the same ids.
+        """
+        table = NotificationRecipient._meta.db_table
+        counter_table = NotificationCounter._meta.db_table
+        sql, params = (
+            queryset.values("pk").order_by().distinct().query.sql_with_params()
+        )
+        counters = (
+            ""
+            if notification.is_hidden
+            else f", counters AS (INSERT INTO {counter_table} (user_id, unread, updated_at) "
+            "SELECT user_id, 1, now() FROM inserted ON CONFLICT (user_id) DO UPDATE "
+            f"SET unread = {counter_table}.unread + 1, updated_at = now())"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH inserted AS (INSERT INTO {table} "
+                "(id, user_id, notification_id, created_at, type, is_hidden) "
+                "SELECT md5(%s || recipients.id::text)::uuid, recipients.id, "
+                f"%s, %s, %s, %s FROM ({sql}) recipients "
+                "ON CONFLICT DO NOTHING RETURNING user_id)"
+                f"{counters} SELECT count(*) FROM inserted",
+                (
+                    f"{notification.id}:",
+                    notification.id,
+                    notification.created_at,
+                    notification.type,
+                    notification.is_hidden,
+                    *params,
+                ),
+            )
+            return cursor.fetchone()[0]
 
     def add_recipient(self, recipient):
-        self._recipients.append(NotificationRecipient(user_id=recipient))
+        self._recipients.append(getattr(recipient, "pk", recipient))
 
     def add_recipients_list(self, recipients):
-        assert isinstance(
-            recipients, (list, tuple)
-        ), "`recipients` should be either tuple or list."
+        """
+        `Arguments`:
+            recipients:[Iterable|QuerySet] - user ids, users or a users queryset.
+        """
+        if isinstance(recipients, QuerySet):
+            self._querysets.append(recipients)
+            return
         for recipient in recipients:
             self.add_recipient(recipient)
+
+
+class MailOutboxHandler:
+    """
+    Delivers the queued emails in batches over one SMTP connection, failed
+    emails are retried with exponential backoff.
+    """
+
+    def __init__(self, batch_size=None, max_attempts=None, retry_delay=None) -> None:
+        self._batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+        self._max_attempts = max_attempts or settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        self._retry_delay = retry_delay or settings.EMAIL_OUTBOX_RETRY_DELAY
+        self._connection = None
+        self.stats = dict(batches=0, sent=0, retried=0, failed=0, elapsed=0.0)
+        register_metrics("mail.worker", lambda: dict(self.stats))
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = mail.get_connection()
+            self._connection.open()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            call_func(self._connection.close)
+            self._connection = None
+
+    def _mark_sent(self, row: EmailOutbox):
+        row.status = MailStatus.SENT
+        row.sent_at = timezone.now()
+        row.last_error = None
+        self.stats["sent"] += 1
+
+    def _mark_failed(self, row: EmailOutbox, error: Exception):
+        row.attempts += 1
+        row.last_error = str(error)
+        if row.attempts >= self._max_attempts:
+            row.status = MailStatus.FAILED
+            self.stats["failed"] += 1
+        else:
+            row.available_at = timezone.now() + timedelta(
+                seconds=self._retry_delay * 2 ** (row.attempts - 1)
+            )
+            self.stats["retried"] += 1
+        log(f"Email [{row.id}] failed, attempt {row.attempts}: {error}")
+
+    def send_batch(self) -> int:
+        """
+        Send one batch of queued emails, returns the number of processed rows.
+        """
+        with transaction.atomic():
+            rows = list(EmailOutbox.objects.claim(self._batch_size))
+            for row in rows:
+                try:
+                    self.connection.send_messages([row.to_message(self.connection)])
+                    self._mark_sent(row)
+                except Exception as e:
+                    self._mark_failed(row, e)
+                    # connection may be broken, a new one is opened for next.
+                    self.close()
+            EmailOutbox.objects.bulk_update(
+                rows,
+                ["status", "attempts", "last_error", "available_at", "sent_at"],
+            )
+        if rows:
+            self.stats["batches"] += 1
+        return len(rows)
+
+    def drain(self, max_batches: int = None) -> int:
+        """
+        Send batches until the queue is empty or `max_batches` are sent.
+        """
+        started_at = time.monotonic()
+        processed, batches = 0, 0
+        try:
+            while max_batches is None or batches < max_batches:
+                count = self.send_batch()
+                if not count:
+                    break
+                processed += count
+                batches += 1
+        finally:
+            self.close()
+        elapsed = time.monotonic() - started_at
+        self.stats["elapsed"] += elapsed
+        if processed:
+            log(
+                "{} emails processed in {:.6f} secs ({:.2f} emails/sec).".format(
+                    processed, elapsed, processed / elapsed if elapsed else processed
+                ),
+                "info",
+            )
+        return processed
+
+
+class NotificationDispatchHandler:
+    """
+    Processes the queued notification fan-outs concurrently, a retried
+    dispatch reuses its notification id so no duplicate is ever created.
+    """
+
+    def __init__(self, workers=None, batch_size=None, max_attempts=None) -> None:
+        self._workers = workers or settings.NOTIFICATION_DISPATCH_WORKERS
+        self._batch_size = batch_size or self._workers
+        self._max_attempts = max_attempts or settings.NOTIFICATION_DISPATCH_MAX_ATTEMPTS
+        self._retry_delay = settings.NOTIFICATION_DISPATCH_RETRY_DELAY
+        self._lease = settings.NOTIFICATION_DISPATCH_LEASE
+        self._lock = threading.Lock()
+        self.stats = dict(
+            done=0, retried=0, failed=0, latency_total=0.0, latency_max=0.0
+        )
+        register_metrics("notification.worker", lambda: dict(self.stats))
+
+    def _record(self, name, latency=None):
+        with self._lock:
+            self.stats[name] += 1
+            if latency is not None:
+                self.stats["latency_total"] += latency
+                self.stats["latency_max"] = max(self.stats["latency_max"], latency)
+
+    def process(self, dispatch: NotificationDispatch):
+        """
+        Fan out one dispatch, runs in a worker thread.
+        """
+        try:
+            with transaction.atomic():
+                notification, _ = Notification.objects.get_or_create(
+                    id=dispatch.notification_id,
+                    defaults=dict(
+                        type=dispatch.type,
+                        payload=dispatch.payload,
+                        text=dispatch.text,
+                    ),
+                )
+                handler = NotificationHandler(
+                    dispatch.type, dispatch.payload, dispatch.text
+                )
+                handler.add_recipients_list(dispatch.get_recipients())
+                handler.send(with_bulk=dispatch.with_bulk, notification=notification)
+                dispatch.status = DispatchStatus.DONE
+                dispatch.processed_at = timezone.now()
+                dispatch.save(update_fields=["status", "processed_at"])
+            self._record(
+                "done", (dispatch.processed_at - dispatch.created_at).total_seconds()
+            )
+        except Exception as e:
+            dispatch.attempts += 1
+            dispatch.last_error = str(e)
+            if dispatch.attempts >= self._max_attempts:
+                dispatch.status = DispatchStatus.FAILED
+                self._record("failed")
+            else:
+                dispatch.status = DispatchStatus.PENDING
+                dispatch.available_at = timezone.now() + timedelta(
+                    seconds=self._retry_delay * 2 ** (dispatch.attempts - 1)
+                )
+                self._record("retried")
+            dispatch.save(
+                update_fields=["status", "attempts", "last_error", "available_at"]
+            )
+            log(f"Dispatch [{dispatch.key}] failed, attempt {dispatch.attempts}: {e}")
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                # every thread has its own connection.
+                connection.close()
+
+    def drain(self, max_batches: int = None) -> int:
+        """
+        Process batches until the queue is empty or `max_batches` are processed.
+        """
+        processed, batches = 0, 0
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            while max_batches is None or batches < max_batches:
+                dispatches = NotificationDispatch.objects.claim(
+                    self._batch_size, self._lease
+                )
+                if not dispatches:
+                    break
+                list(executor.map(self.process, dispatches))
+                processed += len(dispatches)
+                batches += 1
+        return processed
+
+
+@register_metrics("notification.dispatch")
+def dispatch_metrics():
+    metrics = dict(
+        NotificationDispatch.objects.values_list("status")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    oldest = (
+        NotificationDispatch.objects.filter(status=DispatchStatus.PENDING)
+        .aggregate(oldest=Min("created_at"))
+        .get("oldest")
+    )
+    metrics["oldest_pending_age"] = (
+        (timezone.now() - oldest).total_seconds() if oldest else 0
+    )
+    return metrics
+
+
+@register_metrics("mail.outbox")
+def outbox_metrics():
+    metrics = dict(
+        EmailOutbox.objects.values_list("status").annotate(count=Count("id")).order_by()
+    )
+    oldest = (
+        EmailOutbox.objects.filter(status=MailStatus.PENDING)
+        .aggregate(oldest=Min("created_at"))
+        .get("oldest")
+    )
+    metrics["oldest_pending_age"] = (
+        (timezone.now() - oldest).total_seconds() if oldest else 0
+    )
+    return metrics
@@ -0,0 +1,114 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from app.core.jobs import DailyJob
+from app_notifications.models import (
+    Notification,
+    NotificationArchive,
+    NotificationCounter,
+    NotificationRecipient,
+    NotificationRecipientArchive,
+)
+
+
+class Job(DailyJob):
+    help = "Delete or archive expired and hidden notifications."
+    _job_method = "purge"
+
+    def archive(self, model, fields):
+        """
+        Returns a `before_delete` callback which copies a batch to `model`.
+        """
+
+        def inner(batch):
+            model.objects.bulk_create(
+                [model(**row) for row in batch.values(*fields)],
+                ignore_conflicts=True,
+            )
+
+        if not settings.NOTIFICATION_RETENTION_ARCHIVE:
+            return None
+        return inner
+
+    def release_unread(self, archive):
+        """
+        Returns a `before_delete` callback which decrements the counters of
+        the batch's unread recipients, then calls `archive` if any.
+        """
+
+        def inner(batch):
+            users = defaultdict(list)
+            for row in (
+                batch.filter(seen_at__isnull=True, is_hidden=False)
+                .values("user")
+                .annotate(count=Count("id"))
+                .order_by()
+            ):
+                users[row["count"]].append(row["user"])
+            # one UPDATE per distinct count, not per user.
+            for count, user_ids in users.items():
+                NotificationCounter.objects.adjust(user_ids, -count)
+            if archive is not None:
+                archive(batch)
+
+        return inner
+
+    def purge(self):
+        now = timezone.now()
+        expired_at = now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+        hidden_expired_at = now - timedelta(
+            days=settings.NOTIFICATION_HIDDEN_RETENTION_DAYS
+        )
+        options = dict(
+            batch_size=settings.NOTIFICATION_RETENTION_BATCH_SIZE,
+            sleep=settings.NOTIFICATION_RETENTION_SLEEP,
+        )
+
+        recipients = NotificationRecipient.objects.filter(
+            Q(created_at__lt=expired_at)
+            | Q(is_hidden=True, created_at__lt=hidden_expired_at)
+        ).order_by()
+        self.delete_in_batches(
+            recipients,
+            before_delete=self.release_unread(
+                self.archive(
+                    NotificationRecipientArchive,
+                    [
+                        "id",
+                        "user_id",
+                        "notification_id",
+                        "seen_at",
+                        "created_at",
+                        "type",
+                        "is_hidden",
+                        "is_dismissed",
+                    ],
+                )
+            ),
+            **options,
+        )
+
+        # notifications are deleted once none of their recipients is left.
+        notifications = (
+            Notification.objects.filter(
+                Q(created_at__lt=expired_at)
+                | Q(is_hidden=True, created_at__lt=hidden_expired_at)
+            )
+            .exclude(
+                Exists(
+                    NotificationRecipient.objects.filter(notification=OuterRef("pk"))
+                )
+            )
+            .order_by()
+        )
+        self.delete_in_batches(
+            notifications,
+            before_delete=self.archive(
+                NotificationArchive,
+                ["id", "type", "payload", "text", "is_hidden", "created_at"],
+            ),
+            **options,
+        )
@@ -0,0 +1,12 @@
+from app.core.jobs import HourlyJob
+from app_notifications.models import NotificationCounter
+from utils.helpers import log
+
+
+class Job(HourlyJob):
+    help = "Reconcile the unread notification counters."
+    _job_method = "reconcile"
+
+    def reconcile(self):
+        count = NotificationCounter.objects.reconcile()
+        log(f"{count} notification counters were reconciled.", "info")
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+import timeit
+import uuid
+
+from app.core.renderers import ORJSONRenderer
+from app_accounts.models import User
+from app_accounts.serializers import UserViewSerializer
+from app_notifications.models import Notification, NotificationRecipient
+from app_notifications.serializers import NotificationRecipientSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the JSON renderers on user and notification payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def get_payloads(self, rows: int):
+        """
+        In-memory instances, so only serializing and rendering is measured.
+        """
+        now = timezone.now()
+        users = [
+            User(
+                id=uuid.uuid4(),
+                title="Mr",
+                first_name=f"First {i}",
+                last_name=f"Last {i}",
+                username=f"user{i}",
+                email=f"user{i}@example.com",
+            )
+            for i in range(rows)
+        ]
+        recipients = [
+            NotificationRecipient(
+                id=uuid.uuid4(),
+                notification=Notification(
+                    id=uuid.uuid4(),
+                    type="message",
+                    payload=dict(id=str(uuid.uuid4()), tags=["a", "b"], count=i),
+                    text=f"Notification {i}",
+                    created_at=now,
+                ),
+                seen_at=now if i % 2 else None,
+            )
+            for i in range(rows)
+        ]
+        return {
+            "users": dict(results=UserViewSerializer(users, many=True).data),
+            "notifications": dict(
+                results=NotificationRecipientSerializer(recipients, many=True).data
+            ),
+        }
+
+    def handle(self, *args, **options):
+        renderers = [JSONRenderer(), ORJSONRenderer()]
+        for name, data in self.get_payloads(options["rows"]).items():
+            for renderer in renderers:
+                took = timeit.timeit(
+                    lambda: renderer.render(data), number=options["repeat"]
+                )
+                self.stdout.write(
+                    f"{name:<15} {renderer.__class__.__name__:<15} "
+                    f"{took / options['repeat'] * 1000:8.2f} ms/render, "
+                    f"{len(renderer.render(data))} bytes"
+                )
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+import time
+
+from app_notifications.handlers import NotificationDispatchHandler
+
+
+class Command(BaseCommand):
+    help = "Process the queued notification fan-outs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--max-batches", type=int, default=None)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="keep polling the queue instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="seconds to wait when queue is empty, used with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        if settings.NOTIFICATION_STREAM_BACKEND != "postgres":
+            # notifications are published in this process, not in the ASGI workers.
+            if connection.vendor == "postgresql":
+                raise CommandError(
+                    "NOTIFICATION_STREAM_BACKEND must be `postgres`, with `local` "
+                    "the streamed clients never receive the dispatched notifications."
+                )
+            self.stderr.write(
+                "Notifications are not streamed to clients without PostgreSQL."
+            )
+        handler = NotificationDispatchHandler(workers=options["workers"])
+        while True:
+            processed = handler.drain(max_batches=options["max_batches"])
+            if not options["loop"]:
+                break
+            if not processed:
+                time.sleep(options["sleep"])
+        self.stdout.write(
+            "Done: {done}, Retried: {retried}, Failed: {failed}".format(**handler.stats)
+        )
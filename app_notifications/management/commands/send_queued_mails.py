@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+import time
+
+from app_notifications.handlers import MailOutboxHandler
+
+
+class Command(BaseCommand):
+    help = "Deliver the queued emails of outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--max-batches", type=int, default=None)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="keep polling the outbox instead of exiting once it is empty.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="seconds to wait when outbox is empty, used with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        handler = MailOutboxHandler(batch_size=options["batch_size"])
+        while True:
+            processed = handler.drain(max_batches=options["max_batches"])
+            if not options["loop"]:
+                break
+            if not processed:
+                time.sleep(options["sleep"])
+        self.stdout.write(
+            "Sent: {sent}, Retried: {retried}, Failed: {failed}".format(**handler.stats)
+        )
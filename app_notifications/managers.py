@@ -1,17 +1,351 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from datetime import timedelta
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from itertools import islice
+import uuid
+
+from app.core.pagination import decode_cursor, encode_cursor
+from utils.enums import DispatchStatus, MailStatus
 
 
 class NotificationRecipientManager(models.Manager):
-    def get_notifications(self, user, type=None, limit=None):
-        filters = models.Q(notification__is_hidden=False, user=user)
+    inbox_ordering = ("-created_at", "-id")
+
+    def get_inbox(self, user, type=None, unseen=False):
+        """
+        `Description`:
+            Used to get the inbox of a user, filters and ordering are served
+            by the partial inbox indexes without a join.
+        `Arguments`:
+            user:[User|UUID] - recipient.
+            type:[str|None] - NotificationTypes enum.
+            unseen:[bool] - only unseen notifications.
+        `Returns`:
+            qs:[QuerySet]
+        """
+        filters = models.Q(is_hidden=False, user=user)
         if type:
-            filters &= models.Q(notification__type=type)
+            filters &= models.Q(type=type)
+        if unseen:
+            filters &= models.Q(seen_at__isnull=True)
+        return self.filter(filters).order_by(*self.inbox_ordering)
 
-        qs = (
-            self.select_related("notification")
-            .filter(filters)
-            .order_by("-notification__created_at")
-        )
+    def get_notifications(self, user, type=None, limit=None):
+        qs = self.get_inbox(user, type=type).select_related("notification")
         if limit:
             return qs[:limit]
         return qs
+
+    def inbox(self, user, type=None, unseen=False, cursor=None, limit=20):
+        """
+        `Description`:
+            Used to get a page of inbox with keyset paging, the cost of a page
+            doesn't depend on how deep it is.
+        `Arguments`:
+            user:[User|UUID] - recipient.
+            type:[str|None] - NotificationTypes enum.
+            unseen:[bool] - only unseen notifications.
+            cursor:[str|None] - `next` cursor of previous page.
+            limit:[int] - page size.
+        `Returns`:
+            page:[tuple] - list of recipients and the next cursor or None.
+        """
+        qs = self.get_inbox(user, type=type, unseen=unseen).select_related(
+            "notification"
+        )
+        created_at, id = self.model._meta.get_field("created_at"), self.model._meta.pk
+        if cursor:
+            position = decode_cursor(cursor)["p"]
+            if len(position) != 2:
+                raise NotFound("Invalid cursor.")
+            after, after_id = created_at.to_python(position[0]), id.to_python(
+                position[1]
+            )
+            qs = qs.filter(
+                models.Q(created_at__lt=after)
+                | models.Q(created_at=after, id__lt=after_id)
+            )
+        page = list(qs[: limit + 1])
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            last = page[-1]
+            next_cursor = encode_cursor(
+                [created_at.value_to_string(last), id.value_to_string(last)]
+            )
+        return page, next_cursor
+
+    def _mark_seen_filter(self, user, ids=None, before=None, cursor=None):
+        filters = models.Q(user=user, seen_at__isnull=True, is_hidden=False)
+        if ids is not None:
+            filters &= models.Q(pk__in=ids)
+        if before is not None:
+            filters &= models.Q(created_at__lte=before)
+        if cursor:
+            position = decode_cursor(cursor)["p"]
+            if len(position) != 2:
+                raise NotFound("Invalid cursor.")
+            created_at = self.model._meta.get_field("created_at").to_python(position[0])
+            id = self.model._meta.pk.to_python(position[1])
+            # cursor row and everything older than it.
+            filters &= models.Q(created_at__lt=created_at) | models.Q(
+                created_at=created_at, id__lte=id
+            )
+        return filters
+
+    def mark_seen(self, user, ids=None, before=None, cursor=None) -> int:
+        """
+        `Description`:
+            Used to mark the unseen notifications of a user as seen with one
+            UPDATE, all of them if no other argument is given.
+        `Arguments`:
+            user:[User|UUID] - recipient.
+            ids:[list|None] - only these recipient ids.
+            before:[datetime|None] - only notifications created up to it.
+            cursor:[str|None] - only notifications up to an inbox cursor.
+        `Returns`:
+            count:[int] - number of notifications marked as seen.
+        """
+        user_id = getattr(user, "pk", user)
+        with transaction.atomic():
+            count = self.filter(
+                self._mark_seen_filter(user_id, ids, before, cursor)
+            ).update(seen_at=timezone.now())
+            if count:
+                self._adjust_counter(user_id, -count)
+        return count
+
+    def hide(self, user, ids) -> int:
+        """
+        `Description`:
+            Used to hide the notifications of a user, the unseen ones are
+            hidden first so unread counter is adjusted without loading rows.
+        `Arguments`:
+            user:[User|UUID] - recipient.
+            ids:[list] - recipient ids.
+        `Returns`:
+            count:[int] - number of hidden notifications.
+        """
+        user_id = getattr(user, "pk", user)
+        recipients = self.filter(user=user_id, pk__in=ids, is_dismissed=False)
+        with transaction.atomic():
+            unread = recipients.filter(seen_at__isnull=True, is_hidden=False).update(
+                is_dismissed=True, is_hidden=True
+            )
+            count = unread + recipients.update(is_dismissed=True, is_hidden=True)
+            if unread:
+                self._adjust_counter(user_id, -unread)
+        return count
+
+    def _adjust_counter(self, user_id, delta: int):
+        from .models import NotificationCounter
+
+        NotificationCounter.objects.adjust([user_id], delta)
+
+
+class NotificationCounterManager(models.Manager):
+    def get_unread(self, user) -> int:
+        """
+        `Description`:
+            Used to get the unread notifications count of a user.
+        `Arguments`:
+            user:[User|UUID] - recipient.
+        `Returns`:
+            count:[int]
+        """
+        return self.filter(user=user).values_list("unread", flat=True).first() or 0
+
+    def adjust(self, users, delta: int) -> int:
+        """
+        `Description`:
+            Used to add `delta` to the counters of users with one UPDATE,
+            missing counters are created first.
+        `Arguments`:
+            users:[list|QuerySet] - user ids, a flat queryset of ids is used as subquery.
+            delta:[int] - change of unread count.
+        `Returns`:
+            count:[int] - number of updated counters.
+        """
+        if isinstance(users, models.QuerySet):
+            User = self.model._meta.get_field("user").related_model
+            missing = User.objects.filter(
+                pk__in=users, notification_counter__isnull=True
+            ).values_list("pk", flat=True)
+        else:
+            users = missing = list(users)
+            if not users:
+                return 0
+        self.bulk_create(
+            [self.model(user_id=user) for user in missing], ignore_conflicts=True
+        )
+        return self.filter(user__in=users).update(
+            unread=models.F("unread") + delta, updated_at=timezone.now()
+        )
+
+    def reconcile(self) -> int:
+        """
+        `Description`:
+            Used to recompute every counter from recipients, fixes any drift.
+        `Returns`:
+            count:[int] - number of counters which were wrong.
+        """
+        from .models import NotificationRecipient
+
+        unread = NotificationRecipient.objects.filter(
+            user=models.OuterRef("user"), seen_at__isnull=True, is_hidden=False
+        )
+        unread_count = Coalesce(
+            models.Subquery(
+                unread.values("user").annotate(count=models.Count("id")).values("count")
+            ),
+            0,
+        )
+        with transaction.atomic():
+            self.bulk_create(
+                [
+                    self.model(user_id=user)
+                    for user in NotificationRecipient.objects.filter(
+                        seen_at__isnull=True, is_hidden=False, user__isnull=False
+                    )
+                    .exclude(user__in=self.values("user"))
+                    .values_list("user", flat=True)
+                    .distinct()
+                ],
+                ignore_conflicts=True,
+            )
+            return (
+                self.annotate(actual=unread_count)
+                .exclude(unread=models.F("actual"))
+                .update(unread=unread_count, updated_at=timezone.now())
+            )
+
+
+class EmailOutboxManager(models.Manager):
+    def enqueue(self, emails, batch_size: int = None) -> int:
+        """
+        `Description`:
+            Used to queue emails, rows are written in the current transaction
+            so they are only delivered if it commits.
+        `Arguments`:
+            emails:[Iterable[EmailMessage]] - emails to queue, consumed lazily.
+            batch_size:[int] - rows per insert.
+        `Returns`:
+            count:[int] - number of queued emails.
+        """
+        batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+        emails = iter(emails)
+        count = 0
+        with transaction.atomic():
+            while True:
+                rows = [
+                    self.from_message(email) for email in islice(emails, batch_size)
+                ]
+                if not rows:
+                    break
+                self.bulk_create(rows)
+                count += len(rows)
+        return count
+
+    def from_message(self, email):
+        assert not email.attachments, "Attachments can't be queued."
+        return self.model(
+            subject=email.subject,
+            body=email.body,
+            from_email=email.from_email,
+            to=list(email.to),
+            cc=list(email.cc),
+            bcc=list(email.bcc),
+            reply_to=list(email.reply_to),
+            headers=email.extra_headers,
+            alternatives=[
+                list(alternative) for alternative in getattr(email, "alternatives", [])
+            ],
+        )
+
+    def pending(self):
+        return self.filter(status=MailStatus.PENDING, available_at__lte=timezone.now())
+
+    def claim(self, batch_size: int):
+        """
+        `Description`:
+            Used to lock a batch of pending emails, rows locked by other
+            workers are skipped. Must be called inside a transaction.
+        `Arguments`:
+            batch_size:[int] - max number of rows.
+        `Returns`:
+            qs:[QuerySet]
+        """
+        return self.pending().select_for_update(skip_locked=True)[:batch_size]
+
+
+class NotificationDispatchManager(models.Manager):
+    def enqueue(self, type, payload, text, recipients, with_bulk=True, key=None):
+        """
+        `Description`:
+            Used to queue a notification fan-out, enqueueing the same `key`
+            twice returns the already queued dispatch.
+        `Arguments`:
+            type:[str] - NotificationTypes enum.
+            payload:[dict] - payload to send with notification.
+            text:[str] - message to write in notification.
+            recipients:[list|dict] - list of recipient ids, or lookups of
+                users which are filtered at dispatch, e.g. `{"is_active": True}`,
+                querysets are refused since their ids would be queued in one row.
+            with_bulk:[bool] - if False, recipients are inserted one by one.
+            key:[str|None] - idempotency key, random if not provided.
+        `Returns`:
+            dispatch:[NotificationDispatch]
+        """
+        key = str(key or uuid.uuid4())
+        defaults = dict(
+            notification_id=uuid.uuid5(uuid.NAMESPACE_URL, f"notification:{key}"),
+            type=type,
+            payload=payload,
+            text=text,
+            with_bulk=with_bulk,
+        )
+        if isinstance(recipients, models.QuerySet):
+            raise TypeError(
+                "Queryset of recipients is not supported, pass lookups of users "
+                'instead, e.g. `{"groups__name": "admin"}`.'
+            )
+        if isinstance(recipients, dict):
+            defaults["recipients_filter"] = recipients
+        else:
+            defaults["recipients"] = [
+                getattr(recipient, "pk", recipient) for recipient in recipients
+            ]
+        return self.get_or_create(key=key, defaults=defaults)[0]
+
+    def pending(self):
+        # processing rows whose lease expired belong to a crashed worker.
+        return self.filter(
+            status__in=[DispatchStatus.PENDING, DispatchStatus.PROCESSING],
+            available_at__lte=timezone.now(),
+        )
+
+    def claim(self, batch_size: int, lease: int) -> list:
+        """
+        `Description`:
+            Used to lease a batch of pending dispatches to this worker, rows
+            leased by other workers are skipped.
+        `Arguments`:
+            batch_size:[int] - max number of rows.
+            lease:[int] - seconds after which a dispatch can be claimed again.
+        `Returns`:
+            dispatches:[list]
+        """
+        with transaction.atomic():
+            dispatches = list(
+                self.pending()
+                .select_for_update(skip_locked=True)
+                .order_by("available_at")[:batch_size]
+            )
+            self.filter(pk__in=[dispatch.pk for dispatch in dispatches]).update(
+                status=DispatchStatus.PROCESSING,
+                available_at=timezone.now() + timedelta(seconds=lease),
+            )
+        return dispatches
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:15
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('subject', models.TextField(blank=True, default='', verbose_name='subject')),
+                ('body', models.TextField(blank=True, default='', verbose_name='body')),
+                ('from_email', models.CharField(max_length=255, verbose_name='from')),
+                ('to', models.JSONField(default=list, verbose_name='to')),
+                ('cc', models.JSONField(default=list, verbose_name='cc')),
+                ('bcc', models.JSONField(default=list, verbose_name='bcc')),
+                ('reply_to', models.JSONField(default=list, verbose_name='reply to')),
+                ('headers', models.JSONField(default=dict, verbose_name='headers')),
+                ('alternatives', models.JSONField(default=list, verbose_name='alternatives')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=16, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='last error')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='available at')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+            ],
+            options={
+                'verbose_name': 'Email Outbox',
+                'db_table': 'email_outbox',
+                'ordering': ['available_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['status', 'available_at'], name='email_outbox_status_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def delete_duplicate_recipients(apps, schema_editor):
+    """
+    Keep one recipient per notification and user, the seen one if any.
+    """
+    NotificationRecipient = apps.get_model('app_notifications', 'NotificationRecipient')
+    duplicates = (
+        NotificationRecipient.objects.filter(
+            notification__isnull=False, user__isnull=False
+        )
+        .values('notification_id', 'user_id')
+        .annotate(rows=Count('pk'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    for duplicate in duplicates.iterator():
+        pks = list(
+            NotificationRecipient.objects.filter(
+                notification_id=duplicate['notification_id'],
+                user_id=duplicate['user_id'],
+            )
+            .order_by(models.F('seen_at').asc(nulls_last=True), 'pk')
+            .values_list('pk', flat=True)
+        )
+        NotificationRecipient.objects.filter(pk__in=pks[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_notifications', '0002_email_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_recipients, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notificationrecipient',
+            constraint=models.UniqueConstraint(fields=('notification', 'user'), name='notification_recipient_unique'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:17
+
+import app_notifications.models
+import django.core.serializers.json
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_notifications', '0003_notification_recipient_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDispatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='idempotency key')),
+                ('notification_id', models.UUIDField(unique=True, verbose_name='notification id')),
+                ('type', models.CharField(max_length=255, null=True, verbose_name='Notification Type')),
+                ('payload', models.JSONField(default=app_notifications.models.notification_payload_default, verbose_name='Notification Payload')),
+                ('text', models.TextField(blank=True, null=True, verbose_name='Notification Text')),
+                ('recipients', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='recipients')),
+                ('recipients_model', models.CharField(blank=True, max_length=255, null=True, verbose_name='recipients model')),
+                ('recipients_query', models.BinaryField(blank=True, null=True, verbose_name='recipients query')),
+                ('with_bulk', models.BooleanField(default=True, verbose_name='with bulk')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16, verbose_name='status')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='last error')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='available at')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='processed at')),
+            ],
+            options={
+                'verbose_name': 'Notification Dispatch',
+                'db_table': 'notification_dispatch',
+                'ordering': ['available_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificationdispatch',
+            index=models.Index(fields=['status', 'available_at'], name='notification_dispatch_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:18
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import app.core.operations
+import django.utils.timezone
+
+
+BATCH_SIZE = 1000
+
+
+def backfill_recipients(apps, schema_editor):
+    """
+    Copy the notification fields to recipients, batch by batch so no long
+    transaction or table wide lock is held.
+    """
+    Notification = apps.get_model('app_notifications', 'Notification')
+    NotificationRecipient = apps.get_model('app_notifications', 'NotificationRecipient')
+    notification = Notification.objects.filter(pk=OuterRef('notification_id'))
+    recipients = NotificationRecipient.objects.filter(
+        notification__isnull=False
+    ).order_by('pk')
+    last_pk = None
+    while True:
+        batch = recipients if last_pk is None else recipients.filter(pk__gt=last_pk)
+        pks = list(batch.values_list('pk', flat=True)[:BATCH_SIZE])
+        if not pks:
+            break
+        NotificationRecipient.objects.filter(pk__in=pks).update(
+            created_at=Subquery(notification.values('created_at')[:1]),
+            type=Subquery(notification.values('type')[:1]),
+            is_hidden=Subquery(notification.values('is_hidden')[:1]),
+        )
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    # every backfill batch is committed on its own, indexes are built
+    # concurrently.
+    atomic = False
+
+    dependencies = [
+        ('app_notifications', '0004_notification_dispatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationrecipient',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='created at'),
+        ),
+        migrations.AddField(
+            model_name='notificationrecipient',
+            name='is_hidden',
+            field=models.BooleanField(default=False, verbose_name='hidden'),
+        ),
+        migrations.AddField(
+            model_name='notificationrecipient',
+            name='type',
+            field=models.CharField(max_length=255, null=True, verbose_name='Notification Type'),
+        ),
+        migrations.RunPython(backfill_recipients, migrations.RunPython.noop),
+        app.core.operations.AddIndexConcurrently(
+            model_name='notificationrecipient',
+            index=models.Index(condition=models.Q(('is_hidden', False)), fields=['user', '-created_at', '-id'], name='notification_inbox_idx'),
+        ),
+        app.core.operations.AddIndexConcurrently(
+            model_name='notificationrecipient',
+            index=models.Index(condition=models.Q(('is_hidden', False), ('seen_at__isnull', True)), fields=['user', '-created_at', '-id'], name='notification_unseen_idx'),
+        ),
+        app.core.operations.AddIndexConcurrently(
+            model_name='notificationrecipient',
+            index=models.Index(condition=models.Q(('is_hidden', False)), fields=['user', 'type', '-created_at', '-id'], name='notification_inbox_type_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+from itertools import islice
+
+
+BATCH_SIZE = 1000
+
+
+def create_counters(apps, schema_editor):
+    NotificationCounter = apps.get_model('app_notifications', 'NotificationCounter')
+    NotificationRecipient = apps.get_model('app_notifications', 'NotificationRecipient')
+    counts = (
+        NotificationRecipient.objects.filter(
+            seen_at__isnull=True, is_hidden=False, user__isnull=False
+        )
+        .values('user')
+        .annotate(count=Count('id'))
+        .order_by()
+        .iterator()
+    )
+    while True:
+        batch = list(islice(counts, BATCH_SIZE))
+        if not batch:
+            break
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=row['user'], unread=row['count']) for row in batch]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_accounts', '0002_auto_20220604_1447'),
+        ('app_notifications', '0005_notification_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='user')),
+                ('unread', models.IntegerField(default=0, verbose_name='unread')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'Notification Counter',
+                'db_table': 'notification_counter',
+            },
+        ),
+        migrations.RunPython(create_counters, migrations.RunPython.noop),
+    ]
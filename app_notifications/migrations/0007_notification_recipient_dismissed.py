@@ -0,0 +1,18 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_notifications', '0006_notification_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationrecipient',
+            name='is_dismissed',
+            field=models.BooleanField(default=False, verbose_name='dismissed'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:24
+
+from django.db import migrations, models
+import app.core.operations
+
+
+class Migration(migrations.Migration):
+
+    # indexes are built concurrently.
+    atomic = False
+
+    dependencies = [
+        ('app_notifications', '0007_notification_recipient_dismissed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('type', models.CharField(max_length=255, null=True, verbose_name='Notification Type')),
+                ('payload', models.JSONField(default=dict, verbose_name='Notification Payload')),
+                ('text', models.TextField(blank=True, null=True, verbose_name='Notification Text')),
+                ('is_hidden', models.BooleanField(default=False, verbose_name='hidden')),
+                ('created_at', models.DateTimeField(verbose_name='created at')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='archived at')),
+            ],
+            options={
+                'verbose_name': 'Notification Archive',
+                'db_table': 'notification_archive',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationRecipientArchive',
+            fields=[
+                ('id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('user_id', models.UUIDField(db_index=True, null=True, verbose_name='user')),
+                ('notification_id', models.UUIDField(null=True, verbose_name='notification')),
+                ('seen_at', models.DateTimeField(blank=True, null=True, verbose_name='seened at')),
+                ('created_at', models.DateTimeField(verbose_name='created at')),
+                ('type', models.CharField(max_length=255, null=True, verbose_name='Notification Type')),
+                ('is_hidden', models.BooleanField(default=False, verbose_name='hidden')),
+                ('is_dismissed', models.BooleanField(default=False, verbose_name='dismissed')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='archived at')),
+            ],
+            options={
+                'verbose_name': 'Notification Recipient Archive',
+                'db_table': 'notification_recipient_archive',
+            },
+        ),
+        app.core.operations.AddIndexConcurrently(
+            model_name='notification',
+            index=models.Index(fields=['created_at'], name='notification_created_idx'),
+        ),
+        app.core.operations.AddIndexConcurrently(
+            model_name='notificationrecipient',
+            index=models.Index(fields=['created_at'], name='notification_recipient_ca_idx'),
+        ),
+    ]
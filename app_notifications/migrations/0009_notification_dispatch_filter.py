@@ -0,0 +1,41 @@
+# Generated by Django 4.0.5 on 2026-10-18 06:55
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+def fail_pickled_dispatches(apps, schema_editor):
+    """
+    Queued querysets are pickled, they are never unpickled again.
+    """
+    NotificationDispatch = apps.get_model('app_notifications', 'NotificationDispatch')
+    NotificationDispatch.objects.filter(
+        recipients_query__isnull=False, status__in=['pending', 'processing']
+    ).update(
+        status='failed',
+        last_error='Queued recipients query is no longer supported, enqueue it again.',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_notifications', '0008_notification_retention'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_pickled_dispatches, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notificationdispatch',
+            name='recipients_model',
+        ),
+        migrations.RemoveField(
+            model_name='notificationdispatch',
+            name='recipients_query',
+        ),
+        migrations.AddField(
+            model_name='notificationdispatch',
+            name='recipients_filter',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='recipients filter'),
+        ),
+    ]
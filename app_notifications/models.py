@@ -1,14 +1,26 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.utils import timezone
 import uuid
 
-from .managers import NotificationRecipientManager
+from .managers import (
+    EmailOutboxManager,
+    NotificationCounterManager,
+    NotificationDispatchManager,
+    NotificationRecipientManager,
+)
+from app.core.models import ProjectionMixin
+from utils.enums import DispatchStatus, MailStatus
 
 
 def notification_payload_default():
     return dict(id="")
 
 
-class Notification(models.Model):
+class Notification(ProjectionMixin, models.Model):
     """
     `notification` - to store app notifications.
     """
@@ -36,12 +48,16 @@ class Notification(models.Model):
         db_table = "notification"
         verbose_name = "Notification"
         ordering = ["-created_at"]
+        indexes = [
+            # used by retention job.
+            models.Index(fields=["created_at"], name="notification_created_idx"),
+        ]
 
     def __str__(self):
         return self.text
 
 
-class NotificationRecipient(models.Model):
+class NotificationRecipient(ProjectionMixin, models.Model):
     """
     `notification_recipient` - app notification's recipients.
     """
@@ -70,6 +86,17 @@ class NotificationRecipient(models.Model):
         null=True,
         blank=True,
     )
+    # denormalized from notification, so inbox is read from one index.
+    created_at = models.DateTimeField(verbose_name="created at", default=timezone.now)
+    type = models.CharField(
+        verbose_name="Notification Type",
+        max_length=255,
+        blank=False,
+        null=True,
+    )
+    is_hidden = models.BooleanField(verbose_name="hidden", default=False)
+    # hidden by the recipient, `is_hidden` is true if either is hidden.
+    is_dismissed = models.BooleanField(verbose_name="dismissed", default=False)
 
     objects = NotificationRecipientManager()
 
@@ -77,6 +104,242 @@ class NotificationRecipient(models.Model):
         db_table = "notification_recipient"
         verbose_name = "Notification Recipient"
         ordering = ["-id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["notification", "user"],
+                name="notification_recipient_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="notification_inbox_idx",
+                condition=models.Q(is_hidden=False),
+            ),
+            models.Index(
+                fields=["user", "-created_at", "-id"],
+                name="notification_unseen_idx",
+                condition=models.Q(is_hidden=False, seen_at__isnull=True),
+            ),
+            models.Index(
+                fields=["user", "type", "-created_at", "-id"],
+                name="notification_inbox_type_idx",
+                condition=models.Q(is_hidden=False),
+            ),
+            # used by retention job.
+            models.Index(fields=["created_at"], name="notification_recipient_ca_idx"),
+        ]
 
     def __str__(self):
         return self.user.full_name if self.user else None
+
+    def mark_seen(self):
+        """
+        Mark as seen and decrement the unread counter of user.
+        """
+        if self.seen_at is None and NotificationRecipient.objects.mark_seen(
+            self.user_id, ids=[self.pk]
+        ):
+            self.seen_at = timezone.now()
+
+
+class NotificationCounter(models.Model):
+    """
+    `notification_counter` - unread notifications count of each user.
+    """
+
+    user = models.OneToOneField(
+        to="app_accounts.User",
+        on_delete=models.CASCADE,
+        verbose_name="user",
+        db_column="user_id",
+        related_name="notification_counter",
+        primary_key=True,
+    )
+    unread = models.IntegerField(verbose_name="unread", default=0)
+    updated_at = models.DateTimeField(verbose_name="updated at", auto_now=True)
+
+    objects = NotificationCounterManager()
+
+    class Meta:
+        db_table = "notification_counter"
+        verbose_name = "Notification Counter"
+
+    def __str__(self):
+        return str(self.unread)
+
+
+class NotificationDispatch(models.Model):
+    """
+    `notification_dispatch` - queued notification fan-outs, processed by
+    `dispatch_notifications` command.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    key = models.CharField(verbose_name="idempotency key", max_length=255, unique=True)
+    # derived from key, so a retried dispatch reuses the same notification.
+    notification_id = models.UUIDField(verbose_name="notification id", unique=True)
+    type = models.CharField(verbose_name="Notification Type", max_length=255, null=True)
+    payload = models.JSONField(
+        verbose_name="Notification Payload",
+        default=notification_payload_default,
+    )
+    text = models.TextField(verbose_name="Notification Text", blank=True, null=True)
+    recipients = models.JSONField(
+        verbose_name="recipients", default=list, encoder=DjangoJSONEncoder
+    )
+    # lookups of users, filtered when the dispatch is processed.
+    recipients_filter = models.JSONField(
+        verbose_name="recipients filter",
+        blank=True,
+        null=True,
+        encoder=DjangoJSONEncoder,
+    )
+    with_bulk = models.BooleanField(verbose_name="with bulk", default=True)
+    status = models.CharField(
+        verbose_name="status",
+        max_length=16,
+        choices=DispatchStatus.choices,
+        default=DispatchStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(verbose_name="attempts", default=0)
+    last_error = models.TextField(verbose_name="last error", blank=True, null=True)
+    available_at = models.DateTimeField(
+        verbose_name="available at", default=timezone.now
+    )
+    created_at = models.DateTimeField(verbose_name="created at", auto_now_add=True)
+    processed_at = models.DateTimeField(
+        verbose_name="processed at", blank=True, null=True
+    )
+
+    objects = NotificationDispatchManager()
+
+    class Meta:
+        db_table = "notification_dispatch"
+        verbose_name = "Notification Dispatch"
+        ordering = ["available_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"],
+                name="notification_dispatch_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.key
+
+    def get_recipients(self):
+        """
+        Returns the queued recipient ids or the filtered users queryset.
+        """
+        if self.recipients_filter is None:
+            return self.recipients
+        return apps.get_model(settings.AUTH_USER_MODEL)._default_manager.filter(
+            **self.recipients_filter
+        )
+
+
+class EmailOutbox(models.Model):
+    """
+    `email_outbox` - queued emails, delivered by `send_queued_mails` command.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    subject = models.TextField(verbose_name="subject", blank=True, default="")
+    body = models.TextField(verbose_name="body", blank=True, default="")
+    from_email = models.CharField(verbose_name="from", max_length=255)
+    to = models.JSONField(verbose_name="to", default=list)
+    cc = models.JSONField(verbose_name="cc", default=list)
+    bcc = models.JSONField(verbose_name="bcc", default=list)
+    reply_to = models.JSONField(verbose_name="reply to", default=list)
+    headers = models.JSONField(verbose_name="headers", default=dict)
+    alternatives = models.JSONField(verbose_name="alternatives", default=list)
+    status = models.CharField(
+        verbose_name="status",
+        max_length=16,
+        choices=MailStatus.choices,
+        default=MailStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(verbose_name="attempts", default=0)
+    last_error = models.TextField(verbose_name="last error", blank=True, null=True)
+    available_at = models.DateTimeField(
+        verbose_name="available at", default=timezone.now
+    )
+    created_at = models.DateTimeField(verbose_name="created at", auto_now_add=True)
+    sent_at = models.DateTimeField(verbose_name="sent at", blank=True, null=True)
+
+    objects = EmailOutboxManager()
+
+    class Meta:
+        db_table = "email_outbox"
+        verbose_name = "Email Outbox"
+        ordering = ["available_at"]
+        indexes = [
+            models.Index(
+                fields=["status", "available_at"],
+                name="email_outbox_status_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.subject
+
+    def to_message(self, connection=None) -> EmailMultiAlternatives:
+        message = EmailMultiAlternatives(
+            self.subject,
+            self.body,
+            self.from_email,
+            self.to,
+            bcc=self.bcc,
+            connection=connection,
+            headers=self.headers,
+            cc=self.cc,
+            reply_to=self.reply_to,
+        )
+        for content, mimetype in self.alternatives:
+            message.attach_alternative(content, mimetype)
+        return message
+
+
+class NotificationArchive(models.Model):
+    """
+    `notification_archive` - notifications moved out by retention job.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    type = models.CharField(verbose_name="Notification Type", max_length=255, null=True)
+    payload = models.JSONField(verbose_name="Notification Payload", default=dict)
+    text = models.TextField(verbose_name="Notification Text", blank=True, null=True)
+    is_hidden = models.BooleanField(verbose_name="hidden", default=False)
+    created_at = models.DateTimeField(verbose_name="created at")
+    archived_at = models.DateTimeField(verbose_name="archived at", auto_now_add=True)
+
+    class Meta:
+        db_table = "notification_archive"
+        verbose_name = "Notification Archive"
+
+    def __str__(self):
+        return self.text
+
+
+class NotificationRecipientArchive(models.Model):
+    """
+    `notification_recipient_archive` - recipients moved out by retention job.
+    """
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    user_id = models.UUIDField(verbose_name="user", null=True, db_index=True)
+    notification_id = models.UUIDField(verbose_name="notification", null=True)
+    seen_at = models.DateTimeField(verbose_name="seened at", null=True, blank=True)
+    created_at = models.DateTimeField(verbose_name="created at")
+    type = models.CharField(verbose_name="Notification Type", max_length=255, null=True)
+    is_hidden = models.BooleanField(verbose_name="hidden", default=False)
+    is_dismissed = models.BooleanField(verbose_name="dismissed", default=False)
+    archived_at = models.DateTimeField(verbose_name="archived at", auto_now_add=True)
+
+    class Meta:
+        db_table = "notification_recipient_archive"
+        verbose_name = "Notification Recipient Archive"
+
+    def __str__(self):
+        return str(self.id)
@@ -0,0 +1,29 @@
+from rest_framework import serializers
+
+from .models import Notification, NotificationRecipient
+
+from app.core.serializers import AppModelSerializer, AppSerializer
+
+
+class NotificationSerializer(AppModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ["id", "type", "payload", "text", "created_at"]
+
+
+class NotificationRecipientSerializer(AppModelSerializer):
+    notification = NotificationSerializer(read_only=True)
+
+    class Meta:
+        model = NotificationRecipient
+        fields = ["id", "notification", "seen_at"]
+
+
+class NotificationSeenSerializer(AppSerializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False)
+    before = serializers.DateTimeField(required=False)
+    cursor = serializers.CharField(required=False)
+
+
+class NotificationHideSerializer(AppSerializer):
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Notification, NotificationCounter, NotificationRecipient
+
+
+@receiver(post_save, sender=Notification)
+def propagate_notification_fields(sender, instance, created, **kwargs):
+    """
+    Keep the denormalized fields of recipients in sync with notification.
+    """
+    if created:
+        return
+    recipients = NotificationRecipient.objects.filter(notification=instance)
+    if instance.is_hidden:
+        toggled = Q(is_hidden=False)
+        is_hidden = Value(True)
+    else:
+        # recipients who dismissed it stay hidden.
+        toggled = Q(is_hidden=True, is_dismissed=False)
+        is_hidden = F("is_dismissed")
+    with transaction.atomic():
+        # unseen recipients whose visibility changes, adjusted before update.
+        NotificationCounter.objects.adjust(
+            recipients.filter(
+                toggled, seen_at__isnull=True, user__isnull=False
+            ).values_list("user_id", flat=True),
+            -1 if instance.is_hidden else 1,
+        )
+        recipients.filter(toggled | ~Q(type=instance.type)).update(
+            is_hidden=is_hidden, type=instance.type
+        )
@@ -0,0 +1,268 @@
+"""
+Real-time notifications over Server-Sent Events, served by the ASGI entry
+point in `app/asgi.py`.
+
+Each connection is an idle coroutine waiting on its own queue, so one worker
+holds many of them. A published notification id is resolved against the
+users connected to this worker only, from PostgreSQL `LISTEN/NOTIFY`
+(`postgres` backend) as notifications are sent by other processes, e.g.
+`dispatch_notifications` command, or in-process (`local` backend) when the
+publisher and the clients share one process.
+"""
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, connections
+from urllib.parse import parse_qs
+import asyncio
+import json
+import select
+import threading
+import time
+
+from .models import Notification, NotificationRecipient
+from .serializers import NotificationSerializer
+from app.core.functions import authenticate_token
+from app.core.metrics import register_metrics
+from utils.helpers import log
+
+
+CHANNEL = "notifications"
+
+
+def format_event(event: str, data) -> bytes:
+    return (
+        f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n".encode()
+    )
+
+
+class NotificationBroker:
+    """
+    In-process pub/sub of notifications, keyed by user.
+    """
+
+    queue_size = 100
+    lookup_batch_size = 1000
+
+    def __init__(self) -> None:
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        # notification lookups never run on the event loop.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._listener = None
+        self.listening = threading.Event()
+        self.stats = dict(connections=0, published=0, delivered=0, dropped=0)
+
+    def subscribe(self, user_id):
+        """
+        Register a subscriber of the running event loop, returns its handle.
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers.setdefault(str(user_id), set()).add(subscriber)
+            self.stats["connections"] += 1
+        if settings.NOTIFICATION_STREAM_BACKEND == "postgres":
+            self.start_listener()
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(str(user_id), set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(str(user_id), None)
+            self.stats["connections"] -= 1
+
+    def publish(self, notification_id):
+        """
+        Publish a committed notification to its connected recipients.
+        """
+        self.stats["published"] += 1
+        if settings.NOTIFICATION_STREAM_BACKEND == "postgres":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_notify(%s, %s)", [CHANNEL, str(notification_id)]
+                )
+        else:
+            self._executor.submit(self.dispatch, notification_id)
+
+    def dispatch(self, notification_id):
+        """
+        Resolve which connected users are recipients and push the event.
+        """
+        try:
+            with self._lock:
+                users = list(self._subscribers)
+            recipients = set()
+            for i in range(0, len(users), self.lookup_batch_size):
+                recipients.update(
+                    str(user_id)
+                    for user_id in NotificationRecipient.objects.filter(
+                        notification_id=notification_id,
+                        user_id__in=users[i : i + self.lookup_batch_size],
+                        is_hidden=False,
+                    ).values_list("user_id", flat=True)
+                )
+            if not recipients:
+                return
+            notification = Notification.objects.get(pk=notification_id)
+            self.deliver(
+                recipients,
+                format_event("notification", NotificationSerializer(notification).data),
+            )
+        except Exception as e:
+            log(f"Notification [{notification_id}] dispatch failed: {e}")
+        finally:
+            close_old_connections()
+
+    def deliver(self, user_ids, event: bytes):
+        with self._lock:
+            subscribers = [
+                subscriber
+                for user_id in user_ids
+                for subscriber in self._subscribers.get(str(user_id), ())
+            ]
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._put, queue, event)
+
+    def _put(self, queue: asyncio.Queue, event: bytes):
+        if queue.full():
+            # a slow client loses its oldest event instead of growing memory.
+            queue.get_nowait()
+            self.stats["dropped"] += 1
+        queue.put_nowait(event)
+        self.stats["delivered"] += 1
+
+    def start_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(
+                    target=self._listen, name="notification-listener", daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        """
+        Forward PostgreSQL notifications to `dispatch`, reconnects on errors.
+        """
+        import psycopg2
+
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(
+                    **connections["default"].get_connection_params()
+                )
+                conn.set_session(autocommit=True)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                self.listening.set()
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._executor.submit(
+                            self.dispatch, conn.notifies.pop(0).payload
+                        )
+            except Exception as e:
+                self.listening.clear()
+                log(f"Notification listener failed: {e}")
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+
+broker = NotificationBroker()
+register_metrics("notification.stream", lambda: dict(broker.stats))
+
+
+def _authenticate(token: str):
+    try:
+        return authenticate_token(token)[0]
+    finally:
+        # connections of executor threads are recycled like a request's.
+        close_old_connections()
+
+
+async def _send_status(send, status: int, detail: str):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json")],
+        }
+    )
+    await send(
+        {"type": "http.response.body", "body": json.dumps({"detail": detail}).encode()}
+    )
+
+
+async def notification_stream(scope, receive, send):
+    """
+    `Description`:
+        ASGI app of the notifications stream, token is read from `token`
+        query param (EventSource can't set headers) or `Authorization` header.
+    """
+    token = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+    if not token:
+        header = dict(scope.get("headers", [])).get(b"authorization", b"").decode()
+        token = header.split(" ", 1)[-1] if " " in header else None
+    try:
+        user = await sync_to_async(_authenticate, thread_sensitive=False)(token)
+    except Exception as e:
+        log(e)
+        return await _send_status(send, 401, "Authentication failed.")
+    if not user.is_active:
+        return await _send_status(send, 403, "Forbidden.")
+
+    subscriber = broker.subscribe(user.pk)
+    queue = subscriber[1]
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": b": connected\n\n",
+                "more_body": True,
+            }
+        )
+        while True:
+            event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {event, disconnected},
+                timeout=settings.NOTIFICATION_STREAM_HEARTBEAT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                event.cancel()
+                break
+            if event in done:
+                body = event.result()
+            else:
+                event.cancel()
+                body = b": ping\n\n"
+            await send({"type": "http.response.body", "body": body, "more_body": True})
+    finally:
+        disconnected.cancel()
+        broker.unsubscribe(user.pk, subscriber)
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
@@ -1,3 +1,408 @@
-from django.test import TestCase
+from django.conf import settings
+from django.core import mail
+from django.db import connection
+import asyncio
+from datetime import timedelta
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+import csv
+import io
+import os
+import subprocess
+import sys
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from .handlers import (
+    MailOutboxHandler,
+    NotificationDispatchHandler,
+    NotificationHandler,
+)
+from .jobs.daily.notification_retention import Job as RetentionJob
+from .streams import broker, notification_stream
+from .models import (
+    EmailOutbox,
+    Notification,
+    NotificationCounter,
+    NotificationDispatch,
+    NotificationRecipient,
+    NotificationRecipientArchive,
+)
+from .views import NotificationExportView
+from app.core.functions import call_send_mail, call_send_notification
+from app_accounts.models import Group, User
+from utils.enums import DispatchStatus, MailStatus, Roles
+
+
+@override_settings(EMAIL_ENABLE=True, EMAILS_DEFAULT=[])
+class EmailOutboxTestCase(TestCase):
+    def queue(self):
+        call_send_mail(
+            subject="Subject",
+            from_="from@example.com",
+            to_=["to@example.com"],
+            body="Body",
+        )
+
+    def test_mails_are_queued_and_delivered(self):
+        self.queue()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(MailOutboxHandler().drain(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["to@example.com"])
+        self.assertEqual(EmailOutbox.objects.get().status, MailStatus.SENT)
+
+    def test_failed_mails_are_retried_with_backoff(self):
+        self.queue()
+        handler = MailOutboxHandler(max_attempts=2)
+        with self.settings(EMAIL_BACKEND="smtp.invalid.Backend"):
+            handler.drain()
+        row = EmailOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts), (MailStatus.PENDING, 1))
+        self.assertFalse(EmailOutbox.objects.pending().exists())
+
+    @override_settings(EMAIL_OUTBOX_BATCH_SIZE=2)
+    def test_mails_are_streamed_to_outbox(self):
+        enqueue = EmailOutbox.objects.enqueue
+        with mock.patch.object(EmailOutbox.objects, "enqueue", wraps=enqueue) as m:
+            emails = call_send_mail(
+                subject="Subject",
+                from_="from@example.com",
+                to_=[f"to{i}@example.com" for i in range(5)],
+                body="Body",
+            )
+        self.assertIsNone(emails)
+        self.assertNotIsInstance(m.call_args.args[0], (list, tuple))
+        self.assertEqual(EmailOutbox.objects.count(), 5)
+
+
+class NotificationHandlerTestCase(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(f"user{i}@example.com", "password")
+            for i in range(3)
+        ]
+
+    def test_fan_out_deduplicates_recipients(self):
+        handler = NotificationHandler("type", {}, "text")
+        handler.add_recipients_list([self.users[0].pk, self.users[0].pk])
+        handler.add_recipients_list(User.objects.all())
+        notification = handler.send(batch_size=2)
+        self.assertEqual(
+            sorted(notification.recipients.values_list("user_id", flat=True)),
+            sorted(user.pk for user in self.users),
+        )
+        self.assertEqual(NotificationRecipient.objects.count(), 3)
+
+
+class NotificationDispatchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+
+    def test_dispatch_is_idempotent(self):
+        dispatch = call_send_notification("type", {}, "text", [self.user.pk], key="k")
+        self.assertEqual(
+            call_send_notification("type", {}, "text", [self.user.pk], key="k"),
+            dispatch,
+        )
+        self.assertFalse(Notification.objects.exists())
+
+        handler = NotificationDispatchHandler(workers=1)
+        handler.process(dispatch)
+        # a retry of an already processed dispatch.
+        handler.process(NotificationDispatch.objects.get(pk=dispatch.pk))
+        self.assertEqual(Notification.objects.get().pk, dispatch.notification_id)
+        self.assertEqual(NotificationRecipient.objects.count(), 1)
+        dispatch.refresh_from_db()
+        self.assertEqual(dispatch.status, DispatchStatus.DONE)
+
+    def test_queryset_recipients_are_refused(self):
+        with self.assertRaises(TypeError):
+            call_send_notification(
+                "type", {}, "text", User.objects.filter(pk=self.user.pk)
+            )
+        self.assertFalse(NotificationDispatch.objects.exists())
+
+    def test_filter_recipients_are_queued(self):
+        inactive = User.objects.create_user("inactive@example.com", "password")
+        User.objects.filter(pk=inactive.pk).update(is_active=False)
+        dispatch = call_send_notification("type", {}, "text", {"is_active": True})
+        dispatch = NotificationDispatch.objects.get(pk=dispatch.pk)
+        self.assertEqual(list(dispatch.get_recipients()), [self.user])
+        NotificationDispatchHandler(workers=1).process(dispatch)
+        self.assertEqual(
+            list(NotificationRecipient.objects.values_list("user_id", flat=True)),
+            [self.user.pk],
+        )
+
+
+class NotificationInboxTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+        for i in range(5):
+            handler = NotificationHandler("type", {}, f"text {i}")
+            handler.add_recipient(self.user)
+            handler.send()
+
+    def test_inbox_keyset_paging(self):
+        texts, cursor = [], None
+        for _ in range(3):
+            page, cursor = NotificationRecipient.objects.inbox(
+                self.user, cursor=cursor, limit=2
+            )
+            texts += [recipient.notification.text for recipient in page]
+        self.assertIsNone(cursor)
+        self.assertEqual(texts, [f"text {i}" for i in reversed(range(5))])
+
+    def test_hidden_notification_leaves_inbox(self):
+        notification = Notification.objects.get(text="text 0")
+        notification.is_hidden = True
+        notification.save()
+        page, _ = NotificationRecipient.objects.inbox(self.user, limit=10)
+        self.assertEqual(len(page), 4)
+
+
+class NotificationCounterTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+        for text in ("first", "second"):
+            handler = NotificationHandler("type", {}, text)
+            handler.add_recipients_list([self.user.pk])
+            handler.send()
+
+    def get_unread(self):
+        return NotificationCounter.objects.get_unread(self.user)
+
+    def test_counter_follows_inbox(self):
+        self.assertEqual(self.get_unread(), 2)
+        NotificationRecipient.objects.get(notification__text="first").mark_seen()
+        self.assertEqual(self.get_unread(), 1)
+        notification = Notification.objects.get(text="second")
+        notification.is_hidden = True
+        notification.save()
+        self.assertEqual(self.get_unread(), 0)
+
+    def test_reconcile_fixes_drift(self):
+        NotificationCounter.objects.filter(user=self.user).update(unread=10)
+        self.assertEqual(NotificationCounter.objects.reconcile(), 1)
+        self.assertEqual(self.get_unread(), 2)
+
+    def test_unread_count_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            response = client.get("/api/v1/notifications/unread-count")
+        self.assertEqual(response.json()["data"]["unread"], 2)
+
+
+class NotificationBulkUpdateTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+        for i in range(4):
+            handler = NotificationHandler("type", {}, f"text {i}")
+            handler.add_recipient(self.user)
+            handler.send()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_unread(self):
+        return NotificationCounter.objects.get_unread(self.user)
+
+    def test_mark_seen_up_to_cursor(self):
+        response = self.client.get("/api/v1/notifications?size=2")
+        cursor = response.json()["next"]
+        response = self.client.post(
+            "/api/v1/notifications/seen", {"cursor": cursor}, format="json"
+        )
+        # "text 3" and "text 2" are on the first page.
+        self.assertEqual(response.json()["data"]["updated"], 3)
+        self.assertEqual(self.get_unread(), 1)
+        response = self.client.post("/api/v1/notifications/seen", {}, format="json")
+        self.assertEqual(response.json()["data"]["updated"], 1)
+        self.assertEqual(self.get_unread(), 0)
+
+    def test_hide_keeps_counter_consistent(self):
+        ids = list(
+            NotificationRecipient.objects.filter(
+                notification__text__in=["text 0", "text 1"]
+            ).values_list("pk", flat=True)
+        )
+        NotificationRecipient.objects.mark_seen(self.user, ids=ids[:1])
+        # two UPDATEs and the counter upsert, no row is loaded.
+        with self.assertNumQueries(6):
+            self.assertEqual(NotificationRecipient.objects.hide(self.user, ids), 2)
+        self.assertEqual(self.get_unread(), 2)
+
+        # unhiding the notification doesn't unhide a dismissed recipient.
+        notification = Notification.objects.get(text="text 1")
+        notification.is_hidden = True
+        notification.save()
+        notification.is_hidden = False
+        notification.save()
+        self.assertEqual(self.get_unread(), 2)
+        self.assertEqual(len(NotificationRecipient.objects.inbox(self.user)[0]), 2)
+
+
+class NotificationStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+        self.other = User.objects.create_user("other@example.com", "password")
+        handler = NotificationHandler("type", {}, "text")
+        handler.add_recipient(self.user)
+        self.notification = handler.send()
+
+    def test_event_is_pushed_to_connected_recipients(self):
+        loop = asyncio.new_event_loop()
+
+        async def subscribe(user):
+            return broker.subscribe(user.pk)
+
+        subscriber = loop.run_until_complete(subscribe(self.user))
+        other = loop.run_until_complete(subscribe(self.other))
+        try:
+            broker.dispatch(self.notification.pk)
+            event = loop.run_until_complete(asyncio.wait_for(subscriber[1].get(), 1))
+            self.assertIn(str(self.notification.pk).encode(), event)
+            self.assertTrue(other[1].empty())
+        finally:
+            broker.unsubscribe(self.user.pk, subscriber)
+            broker.unsubscribe(self.other.pk, other)
+            loop.close()
+
+    def test_stream_without_token_is_unauthorized(self):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(notification_stream({"query_string": b""}, None, send))
+        self.assertEqual(messages[0]["status"], 401)
+
+    def test_listener_connection_is_closed_on_error(self):
+        conn = mock.MagicMock()
+        conn.cursor.side_effect = RuntimeError("connection lost")
+        with mock.patch("psycopg2.connect", return_value=conn), mock.patch(
+            "app_notifications.streams.time.sleep", side_effect=KeyboardInterrupt
+        ), mock.patch.object(broker, "listening"):
+            with self.assertRaises(KeyboardInterrupt):
+                broker._listen()
+        conn.close.assert_called_once()
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY of PostgreSQL.")
+@override_settings(NOTIFICATION_STREAM_BACKEND="postgres")
+class NotificationStreamAcrossProcessesTestCase(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+        handler = NotificationHandler("type", {}, "text")
+        handler.add_recipient(self.user)
+        self.notification = handler.send()
+
+    def publish_in_other_process(self):
+        # e.g. `dispatch_notifications` command publishing a sent notification.
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.join(settings.BASE_DIR, "manage.py"),
+                "shell",
+                "-c",
+                "from app_notifications.streams import broker; "
+                f"broker.publish('{self.notification.pk}')",
+            ],
+            env={
+                **os.environ,
+                "DATABASE_NAME": connection.settings_dict["NAME"],
+                "NOTIFICATION_STREAM_BACKEND": "postgres",
+            },
+            check=True,
+            timeout=60,
+        )
+
+    def test_event_is_pushed_from_other_process(self):
+        async def receive():
+            subscriber = broker.subscribe(self.user.pk)
+            loop = asyncio.get_running_loop()
+            try:
+                self.assertTrue(
+                    await loop.run_in_executor(None, broker.listening.wait, 10)
+                )
+                await loop.run_in_executor(None, self.publish_in_other_process)
+                return await asyncio.wait_for(subscriber[1].get(), 10)
+            finally:
+                broker.unsubscribe(self.user.pk, subscriber)
+
+        event = asyncio.run(receive())
+        self.assertIn(str(self.notification.pk).encode(), event)
+
+
+@override_settings(NOTIFICATION_RETENTION_ARCHIVE=True, NOTIFICATION_RETENTION_SLEEP=0)
+class NotificationRetentionTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@example.com", "password")
+        for text in ("old", "new"):
+            handler = NotificationHandler("type", {}, text)
+            handler.add_recipient(self.user)
+            handler.send()
+        old = timezone.now() - timedelta(days=400)
+        Notification.objects.filter(text="old").update(created_at=old)
+        NotificationRecipient.objects.filter(notification__text="old").update(
+            created_at=old
+        )
+
+    def test_expired_notifications_are_archived(self):
+        RetentionJob().purge()
+        self.assertEqual(
+            list(Notification.objects.values_list("text", flat=True)), ["new"]
+        )
+        self.assertEqual(NotificationRecipient.objects.count(), 1)
+        self.assertEqual(NotificationRecipientArchive.objects.count(), 1)
+        self.assertEqual(NotificationCounter.objects.get_unread(self.user), 1)
+
+    @override_settings(NOTIFICATION_RETENTION_BATCH_SIZE=1)
+    def test_counters_are_decremented_per_batch(self):
+        other = User.objects.create_user("other@example.com", "password")
+        handler = NotificationHandler("type", {}, "seen")
+        handler.add_recipients_list([self.user, other])
+        handler.send()
+        seen = NotificationRecipient.objects.filter(notification__text="seen")
+        seen.filter(user=other).update(seen_at=timezone.now())
+        seen.update(created_at=timezone.now() - timedelta(days=400))
+        NotificationCounter.objects.filter(user=other).update(unread=0)
+        with mock.patch.object(NotificationCounter.objects, "reconcile") as reconcile:
+            RetentionJob().purge()
+        reconcile.assert_not_called()
+        self.assertEqual(NotificationCounter.objects.get_unread(self.user), 1)
+        self.assertEqual(NotificationCounter.objects.get_unread(other), 0)
+
+
+class NotificationExportTestCase(TestCase):
+    url = "/api/v1/notifications/export"
+
+    def setUp(self):
+        self.admin = User.objects.create_user("admin@example.com", "password")
+        self.admin.groups.add(Group.objects.create(name=Roles.ADMIN.value))
+        Notification.objects.create(type="alert", text="=HYPERLINK(1)")
+        Notification.objects.create(type="info", text="hello")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_csv_export_escapes_formulas(self):
+        response = self.client.get(f"{self.url}?type=alert")
+        self.assertEqual(response.status_code, 200)
+        rows = list(
+            csv.reader(io.StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(rows[0], list(NotificationExportView.export_fields))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][2], "'=HYPERLINK(1)")
+
+    def test_views_without_export_fields_are_listed(self):
+        class NotificationListView(NotificationExportView):
+            export_fields = ()
+
+        request = APIRequestFactory().get(f"{self.url}?output=csv")
+        force_authenticate(request, self.admin)
+        response = NotificationListView.as_view()(request)
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(response.data["data"]), 2)
@@ -0,0 +1,17 @@
+from django.urls import path
+
+from .views import (
+    NotificationInboxView,
+    NotificationSeenView,
+    NotificationHideView,
+    UnreadCountView,
+    NotificationExportView,
+)
+
+urlpatterns = [
+    path("notifications", NotificationInboxView.as_view()),
+    path("notifications/seen", NotificationSeenView.as_view()),
+    path("notifications/hide", NotificationHideView.as_view()),
+    path("notifications/unread-count", UnreadCountView.as_view()),
+    path("notifications/export", NotificationExportView.as_view()),
+]
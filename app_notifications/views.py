@@ -1,3 +1,120 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
 
-# Create your views here.
+from .models import Notification, NotificationCounter, NotificationRecipient
+from .serializers import (
+    NotificationSerializer,
+    NotificationRecipientSerializer,
+    NotificationSeenSerializer,
+    NotificationHideSerializer,
+)
+
+from app.core.permissions import OnlyAdmin
+from app.core.response import APIResponse
+from app.core.views import AppAPIView, AppView
+
+
+class NotificationInboxView(AppAPIView):
+    """
+    Inbox of logged in `user`, paged with `cursor`.
+    """
+
+    http_method_names = ["get"]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request: Request):
+        try:
+            size = min(
+                int(request.query_params.get("size", self.page_size)),
+                self.max_page_size,
+            )
+        except ValueError:
+            size = self.page_size
+        page, next_cursor = NotificationRecipient.objects.inbox(
+            request.user.pk,
+            type=request.query_params.get("type"),
+            unseen=request.query_params.get("unseen") in ("1", "true"),
+            cursor=request.query_params.get("cursor"),
+            limit=max(size, 1),
+        )
+        return APIResponse(
+            NotificationRecipientSerializer(page, many=True).data,
+            other_data=dict(next=next_cursor),
+        )
+
+
+class NotificationSeenView(AppAPIView):
+    """
+    Mark notifications of logged in `user` as seen, by `ids`, up to `before`
+    or `cursor`, or all of them.
+    """
+
+    http_method_names = ["post"]
+
+    def post(self, request: Request):
+        serializer = NotificationSeenSerializer(data=request.data)
+        if serializer.is_valid():
+            return APIResponse(
+                dict(
+                    updated=NotificationRecipient.objects.mark_seen(
+                        request.user.pk, **serializer.validated_data
+                    )
+                )
+            )
+        return APIResponse(
+            serializer.get_errors(),
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class NotificationHideView(AppAPIView):
+    """
+    Hide notifications of logged in `user` by `ids`.
+    """
+
+    http_method_names = ["post"]
+
+    def post(self, request: Request):
+        serializer = NotificationHideSerializer(data=request.data)
+        if serializer.is_valid():
+            return APIResponse(
+                dict(
+                    updated=NotificationRecipient.objects.hide(
+                        request.user.pk, serializer.validated_data["ids"]
+                    )
+                )
+            )
+        return APIResponse(
+            serializer.get_errors(),
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class UnreadCountView(AppAPIView):
+    """
+    Unread notifications count of logged in `user`.
+    """
+
+    http_method_names = ["get"]
+
+    def get(self, request: Request):
+        return APIResponse(
+            {"unread": NotificationCounter.objects.get_unread(request.user.pk)}
+        )
+
+
+class NotificationExportView(AppView):
+    """
+    Export `notification` table as `?output=csv` (default) or `?output=ndjson`.
+    """
+
+    model = Notification
+    permission_classes = [IsAuthenticated, OnlyAdmin]
+    serializer_view_class = NotificationSerializer
+    http_method_names = ["get"]
+    filterset_fields = ["type"]
+    search_fields = ["text"]
+    export_default_format = "csv"
+    export_fields = ("id", "type", "text", "payload", "created_at")
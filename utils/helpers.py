@@ -4,8 +4,12 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 from typing import Any, Optional, Union
 from types import FunctionType
+import functools
+import hashlib
+import inspect
 import logging
 import operator
+import time
 import jwt
 import uuid
 
@@ -145,41 +149,200 @@ def truthy(obj1: object, oper: str, obj2: object, type: object = None):
     return verify_type() and call_func(getattr(operator, oper), obj1, obj2)
 
 
-def with_cache(sec: int = 30):
+def _cache_key_part(obj: Any) -> str:
     """
     `Description`:
-        Used to `cache` the response for givent time.
+        Used to get a stable representation of an argument, which does not
+        depend on the memory address of the object, raises `TypeError` if the
+        object has no such representation.
+    """
+    from django.db import models
+
+    if isinstance(obj, models.Model):
+        return "{}:{}".format(obj._meta.label, obj.pk)
+    if isinstance(obj, models.Manager):
+        return obj.model._meta.label
+    if isinstance(obj, models.QuerySet):
+        return "{}:{}".format(obj.model._meta.label, obj.query)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        parts = [_cache_key_part(item) for item in obj]
+        return "[{}]".format(
+            ",".join(sorted(parts) if isinstance(obj, (set, frozenset)) else parts)
+        )
+    if isinstance(obj, dict):
+        return "{{{}}}".format(
+            ",".join(
+                "{}={}".format(k, _cache_key_part(v)) for k, v in sorted(obj.items())
+            )
+        )
+    value = repr(obj)
+    if " at 0x" in value:
+        # every instance of the class would share the same key.
+        raise TypeError(
+            "{} has no stable representation to be cached.".format(
+                type(obj).__qualname__
+            )
+        )
+    return value
+
+
+def make_cache_key(
+    func: FunctionType, args: tuple = (), kwargs: dict = {}, key: FunctionType = None
+) -> str:
+    """
+    `Description`:
+        Used to make the cache key of a function call from its qualified name
+        and hashed arguments, raises `TypeError` if an argument can't be part
+        of a key.
     `Arguments`:
-        sec:[int] - seconds.
+        func:[FunctionType] - function.
+        args:[tuple] - positional arguments.
+        kwargs:[dict] - keyword arguments.
+        key:[FunctionType] - called with the arguments, returns what the key
+            is made of instead of them.
+    `Returns`:
+        key:[str] - cache key.
+    """
+    part = _cache_key_part(key(*args, **kwargs) if key else [args, kwargs])
+    digest = hashlib.md5(part.encode(), usedforsecurity=False).hexdigest()
+    return "memoize:{}.{}:{}".format(func.__module__, func.__qualname__, digest)
+
+
+def memoize(
+    timeout: int = 30,
+    stale_timeout: int = 0,
+    lock_timeout: int = 10,
+    key: FunctionType = None,
+):
+    """
+    `Description`:
+        Used to `cache` the response of a function per arguments.
+        - `None` and empty results are cached too.
+        - calls with an argument which has no stable representation, e.g. an
+          object with the default `repr`, are not cached unless `key` is given.
+        - QuerySets are evaluated into lists before caching.
+        - only one worker recomputes an expired key, others wait for it
+          or get the stale value while `stale_timeout` has not passed.
+        Use `invalidate_cache` to remove the cached response of a call.
+    `Arguments`:
+        timeout:[int] - seconds for which the response is fresh.
+        stale_timeout:[int] - seconds for which a stale response can be served
+            while it is being recomputed.
+        lock_timeout:[int] - seconds to wait for the recomputing worker.
+        key:[FunctionType] - called with the arguments, returns what the cache
+            key is made of, e.g. `lambda obj: obj.id`.
     `Returns`:
         response:[Any] - method response can be anything.
     """
+    from django.db.models import QuerySet
+
+    key_func = key
 
     def inner(func: FunctionType):
-        def wrapper(*args, **kwargs):
-            result = cache.get(func.__name__)
-            if not result:
-                result = func(*args, **kwargs)
-                cache.set(func.__name__, result, sec)
-                log("Cache for {} is set!".format(func.__name__), "info")
+        def compute(key, args, kwargs):
+            result = func(*args, **kwargs)
+            if isinstance(result, QuerySet):
+                result = list(result)
+            # response is wrapped so cached `None` is not a miss.
+            cache.set(key, (time.time() + timeout, result), timeout + stale_timeout)
+            log("Cache for {} is set!".format(key), "info")
             return result
 
+        def compute_with_lock(key, args, kwargs):
+            try:
+                return compute(key, args, kwargs)
+            finally:
+                cache.delete(key + ":lock")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = make_cache_key(func, args, kwargs, key_func)
+            except TypeError as e:
+                log("Cache for {} is skipped: {}".format(func.__qualname__, e), "warn")
+                return func(*args, **kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                fresh_until, result = cached
+                if fresh_until > time.time():
+                    return result
+                if not cache.add(key + ":lock", 1, lock_timeout):
+                    # some other worker is already recomputing.
+                    return result
+                return compute_with_lock(key, args, kwargs)
+
+            if cache.add(key + ":lock", 1, lock_timeout):
+                return compute_with_lock(key, args, kwargs)
+
+            # wait for the worker which is recomputing.
+            deadline = time.time() + lock_timeout
+            while time.time() < deadline:
+                time.sleep(0.05)
+                cached = cache.get(key)
+                if cached is not None:
+                    return cached[1]
+            return compute(key, args, kwargs)
+
+        def invalidate(*args, **kwargs):
+            key = make_cache_key(func, args, kwargs, key_func)
+            cache.delete(key)
+            log("Cache for {} is removed!".format(key), "info")
+
+        wrapper.invalidate = invalidate
         return wrapper
 
     return inner
 
 
-def remove_cache(func_name: str):
+def depends_on(*fields: str):
+    """
+    `Description`:
+        Used to declare the model fields read by a computed attribute (e.g. a
+        property), so it can be evaluated from `values()` rows, placed under
+        `@property`.
+    `Arguments`:
+        fields:[tuple] - names of the model fields.
+    `Returns`:
+        func:[FunctionType] - same function with `depends_on` attribute.
+    """
+
+    def inner(func: FunctionType):
+        func.depends_on = tuple(fields)
+        return func
+
+    return inner
+
+
+def with_cache(sec: int = 30):
+    """
+    `Description`:
+        Used to `cache` the response for givent time, kept for backward
+        compatibility, use `memoize` instead.
+    `Arguments`:
+        sec:[int] - seconds.
+    `Returns`:
+        response:[Any] - method response can be anything.
+    """
+    return memoize(timeout=sec)
+
+
+def invalidate_cache(func: FunctionType, *args, **kwargs):
     """
     `Description`:
-        Used to remove `cached` function response.
+        Used to remove the `cached` response of a memoized function call,
+        bound methods can be passed directly e.g.
+        `invalidate_cache(User.objects.get_admins)`.
     `Arguments`:
-        func_name:[str] - function name.
+        func:[FunctionType] - memoized function or bound method.
+        args:[tuple] - positional arguments of the call.
+        kwargs:[dict] - keyword arguments of the call.
     `Returns`:
         None
     """
-    cache.delete(func_name) if type(func_name) == str else None
-    log("Cache for {} is removed!".format(func_name), "info")
+    if inspect.ismethod(func):
+        args = (func.__self__, *args)
+        func = func.__func__
+    func.invalidate(*args, **kwargs)
 
 
 def gen_key(n: int = 16) -> str: